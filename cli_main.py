@@ -1,5 +1,7 @@
 import argparse
 import asyncio
+import functools
+import sys
 from datetime import datetime
 from os.path import exists
 from pathlib import Path
@@ -9,10 +11,21 @@ from uploader.douyin_uploader.main import douyin_setup, DouYinVideo
 from uploader.ks_uploader.main import ks_setup, KSVideo
 from uploader.tencent_uploader.main import weixin_setup, TencentVideo
 from uploader.tk_uploader.main_chrome import tiktok_setup, TiktokVideo
-from utils.base_social_media import get_supported_social_media, get_cli_action, SOCIAL_MEDIA_DOUYIN, \
-    SOCIAL_MEDIA_TENCENT, SOCIAL_MEDIA_TIKTOK, SOCIAL_MEDIA_KUAISHOU
-from utils.constant import TencentZoneTypes
+from uploader.bilibili_uploader.main import read_cookie_json_file, extract_keys_from_json, BilibiliUploader, \
+    get_bilibili_session
+from uploader.xhs_uploader.main import get_xhs_client, upload_video_note
+from utils.base_social_media import get_supported_social_media, get_cli_action, get_fanout_social_media, \
+    SOCIAL_MEDIA_DOUYIN, SOCIAL_MEDIA_TENCENT, SOCIAL_MEDIA_TIKTOK, SOCIAL_MEDIA_KUAISHOU, SOCIAL_MEDIA_BILIBILI, \
+    SOCIAL_MEDIA_XHS
+from utils.browser_pool import run_with_browser_pool
+from utils.constant import TencentZoneTypes, VideoZoneTypes
+from utils.content_fingerprint import fingerprint_files
+from utils.cookie_precheck import precheck_cookie_file
 from utils.files_times import get_title_and_hashtags
+from utils.folder_watcher import FolderWatcher
+from utils.log import logger
+from utils.upload_ledger import UploadLedger
+from utils.upload_orchestrator import JOB_SKIPPED
 
 
 def parse_schedule(schedule_raw):
@@ -23,6 +36,176 @@ def parse_schedule(schedule_raw):
     return schedule
 
 
+def parse_platforms(platforms_raw):
+    platforms = [platform.strip() for platform in platforms_raw.split(',') if platform.strip()]
+    unknown = [platform for platform in platforms if platform not in get_fanout_social_media()]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unsupported platforms: {','.join(unknown)}")
+    return platforms
+
+
+def get_video_meta(video_file):
+    """读取视频同名 txt 中的标题和话题，没有 txt 时用文件名作为标题"""
+    if exists(str(video_file).replace(".mp4", ".txt")):
+        return get_title_and_hashtags(str(video_file))
+    return Path(video_file).stem, []
+
+
+async def setup_account(platform, account_file, **kwargs):
+    if platform == SOCIAL_MEDIA_DOUYIN:
+        return await douyin_setup(account_file, **kwargs)
+    elif platform == SOCIAL_MEDIA_TIKTOK:
+        return await tiktok_setup(account_file, **kwargs)
+    elif platform == SOCIAL_MEDIA_TENCENT:
+        return await weixin_setup(account_file, **kwargs)
+    elif platform == SOCIAL_MEDIA_KUAISHOU:
+        return await ks_setup(account_file, **kwargs)
+
+
+def create_video_app(platform, account_file, video_file, publish_date, title, tags):
+    if platform == SOCIAL_MEDIA_DOUYIN:
+        return DouYinVideo(title, video_file, tags, publish_date, account_file)
+    elif platform == SOCIAL_MEDIA_TIKTOK:
+        return TiktokVideo(title, video_file, tags, publish_date, account_file)
+    elif platform == SOCIAL_MEDIA_TENCENT:
+        category = TencentZoneTypes.LIFESTYLE.value  # 标记原创需要否则不需要传
+        return TencentVideo(title, video_file, tags, publish_date, account_file, category)
+    elif platform == SOCIAL_MEDIA_KUAISHOU:
+        return KSVideo(title, video_file, tags, publish_date, account_file)
+
+
+def get_account_file(platform, account_name):
+    return Path(BASE_DIR / "cookies" / f"{platform}_{account_name}.json")
+
+
+def upload_bilibili(account_name, video_file, title, tags, publish_date):
+    account_file = get_account_file(SOCIAL_MEDIA_BILIBILI, account_name)
+    if precheck_cookie_file(account_file, SOCIAL_MEDIA_BILIBILI) is False:
+        raise RuntimeError(f"{account_file.name} 中的 SESSDATA 已过期，请重新登录获取 cookie")
+    cookie_data = extract_keys_from_json(read_cookie_json_file(account_file))
+    dtime = int(publish_date.timestamp()) if publish_date else 0
+    uploader = BilibiliUploader(cookie_data, Path(video_file), title, title, VideoZoneTypes.LIFE_DAILY.value, tags,
+                                dtime)
+    # 同一账号共用一个会话，批量上传时只登录一次
+    if not uploader.upload(get_bilibili_session(account_file)):
+        raise RuntimeError("bilibili 提交失败")
+    return uploader.post_id
+
+
+def upload_xhs(account_name, video_file, title, tags, publish_date):
+    xhs_client = get_xhs_client(account_name)
+    post_time = publish_date.strftime("%Y-%m-%d %H:%M:%S") if publish_date else None
+    note = upload_video_note(xhs_client, title, video_file, tags, post_time=post_time)
+    return note.get("id") if isinstance(note, dict) else None
+
+
+async def get_content_hash(ledger: UploadLedger, video_file):
+    """计算(或从账本缓存读取)视频的内容指纹，读取失败时返回 None，只按路径去重"""
+    fingerprints = await asyncio.to_thread(fingerprint_files, [video_file], ledger)
+    return fingerprints.get(video_file)
+
+
+async def run_app(app):
+    """执行浏览器上传，返回发布接口得到的作品 id"""
+    await app.main()
+    return getattr(app, "post_id", None)
+
+
+async def upload_once(ledger: UploadLedger, platform, account_name, video_file, content_hash, upload) -> bool:
+    """
+    相同内容的视频已经发布到该账号时跳过，否则执行 upload() 并写入账本。
+    改名或复制到其他目录的同一个视频在打开浏览器、发起请求之前就被跳过。
+
+    Args:
+        upload: 执行上传的协程函数，返回发布后的作品 id(没有时返回 None)，一起写入账本
+
+    Returns:
+        是否执行了上传
+    """
+    if await asyncio.to_thread(ledger.find_done, video_file, platform, account_name, content_hash):
+        logger.info(f"[{platform}] {account_name} 已发布过相同内容，跳过 {video_file}")
+        return False
+    post_id = await upload()
+    await asyncio.to_thread(ledger.record_done, video_file, platform, account_name, post_id=post_id,
+                            content_hash=content_hash)
+    return True
+
+
+async def upload_to_platform(platform, account_name, video_file, title, tags, publish_date):
+    """上传到单个平台，返回作品 id"""
+    if platform == SOCIAL_MEDIA_BILIBILI:
+        # biliup 和 xhs 的上传是同步阻塞的，放到线程池里，不阻塞同时进行的 playwright 上传
+        return await asyncio.to_thread(upload_bilibili, account_name, video_file, title, tags, publish_date)
+    elif platform == SOCIAL_MEDIA_XHS:
+        return await asyncio.to_thread(upload_xhs, account_name, video_file, title, tags, publish_date)
+    else:
+        account_file = get_account_file(platform, account_name)
+        await setup_account(platform, account_file, handle=True, defer_auth=True)
+        return await run_app(create_video_app(platform, account_file, video_file, publish_date, title, tags))
+
+
+async def fan_out_upload(platforms, account_name, video_file, publish_date, ledger: UploadLedger = None):
+    """
+    同一个视频同时发布到多个平台，标题、话题、内容指纹只读取一次，总耗时接近最慢的平台。
+
+    Returns:
+        {平台: None 表示发布完成，JOB_SKIPPED 表示已发布过，异常表示发布失败}
+    """
+    ledger = UploadLedger() if ledger is None else ledger
+    title, tags = get_video_meta(video_file)
+    content_hash = await get_content_hash(ledger, video_file)
+
+    async def publish(platform):
+        uploaded = await upload_once(
+            ledger, platform, account_name, video_file, content_hash,
+            lambda: upload_to_platform(platform, account_name, video_file, title, tags, publish_date))
+        return None if uploaded else JOB_SKIPPED
+
+    results = await asyncio.gather(*(publish(platform) for platform in platforms), return_exceptions=True)
+    for platform, result in zip(platforms, results):
+        if isinstance(result, BaseException):
+            logger.error(f"[upload] {platform} 发布失败: {result!r}")
+        elif result == JOB_SKIPPED:
+            logger.info(f"[upload] {platform} 已发布过，跳过")
+        else:
+            logger.success(f"[upload] {platform} 发布完成")
+    return dict(zip(platforms, results))
+
+
+async def watch_folders(platform, account_name, folders, ledger: UploadLedger = None):
+    """
+    监听目录，新视频写入完成后立即上传；上传期间到达的视频排队依次处理。
+
+    是否已上传按账本里的内容指纹判断：重启后已有的视频不会重复上传，同一路径被写入新内容时会再次上传。
+    """
+    ledger = UploadLedger() if ledger is None else ledger
+    account_file = get_account_file(platform, account_name)
+    queue = asyncio.Queue()
+    watcher = FolderWatcher(folders)
+
+    async def produce():
+        async for video_file in watcher.watch():
+            logger.info(f"[watch] 发现新视频: {video_file}")
+            queue.put_nowait(video_file)
+
+    logger.info(f"[watch] 使用 {watcher.mode} 监听目录: {', '.join(str(folder) for folder in watcher.folders)}")
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            video_file = await queue.get()
+            try:
+                title, tags = get_video_meta(video_file)
+                app = create_video_app(platform, account_file, str(video_file), 0, title, tags)
+                content_hash = await get_content_hash(ledger, video_file)
+                await upload_once(ledger, platform, account_name, video_file, content_hash,
+                                  functools.partial(run_app, app))
+            except Exception as e:
+                logger.error(f"[watch] 上传 {video_file} 失败: {e}")
+    finally:
+        producer.cancel()
+        watcher.close()
+
+
 async def main():
     # 主解析器
     parser = argparse.ArgumentParser(description="Upload video to multiple social-media.")
@@ -42,6 +225,11 @@ async def main():
             action_parser.add_argument("-pt", "--publish_type", type=int, choices=[0, 1],
                                        help="0 for immediate, 1 for scheduled", default=0)
             action_parser.add_argument('-t', '--schedule', help='Schedule UTC time in %Y-%m-%d %H:%M format')
+            action_parser.add_argument('--platforms', type=parse_platforms,
+                                       help=f"Also publish to these platforms concurrently, comma separated: "
+                                            f"{','.join(get_fanout_social_media())}")
+        elif action == 'watch':
+            action_parser.add_argument("folders", nargs='+', help="Folders to watch for new .mp4 files")
 
     # 解析命令行参数
     args = parser.parse_args()
@@ -51,8 +239,16 @@ async def main():
             raise FileNotFoundError(f'Could not find the video file at {args["video_file"]}')
         if args.publish_type == 1 and not args.schedule:
             parser.error("The schedule must must be specified for scheduled publishing.")
+        if args.platforms and args.platform not in get_fanout_social_media():
+            parser.error(f"--platforms is not supported for {args.platform}")
+    elif args.action == 'watch':
+        if args.platform not in (SOCIAL_MEDIA_DOUYIN, SOCIAL_MEDIA_TENCENT, SOCIAL_MEDIA_TIKTOK, SOCIAL_MEDIA_KUAISHOU):
+            parser.error(f"watch is not supported for {args.platform}")
+        for folder in args.folders:
+            if not Path(folder).is_dir():
+                parser.error(f"Could not find the folder at {folder}")
 
-    account_file = Path(BASE_DIR / "cookies" / f"{args.platform}_{args.account_name}.json")
+    account_file = get_account_file(args.platform, args.account_name)
     account_file.parent.mkdir(exist_ok=True)
 
     # 根据 action 处理不同的逻辑
@@ -67,7 +263,6 @@ async def main():
         elif args.platform == SOCIAL_MEDIA_KUAISHOU:
             await ks_setup(str(account_file), handle=True)
     elif args.action == 'upload':
-        title, tags = get_title_and_hashtags(args.video_file)
         video_file = args.video_file
 
         if args.publish_type == 0:
@@ -77,25 +272,34 @@ async def main():
             print("Scheduling videos...")
             publish_date = parse_schedule(args.schedule)
 
-        if args.platform == SOCIAL_MEDIA_DOUYIN:
-            await douyin_setup(account_file, handle=False)
-            app = DouYinVideo(title, video_file, tags, publish_date, account_file)
-        elif args.platform == SOCIAL_MEDIA_TIKTOK:
-            await tiktok_setup(account_file, handle=True)
-            app = TiktokVideo(title, video_file, tags, publish_date, account_file)
-        elif args.platform == SOCIAL_MEDIA_TENCENT:
-            await weixin_setup(account_file, handle=True)
-            category = TencentZoneTypes.LIFESTYLE.value  # 标记原创需要否则不需要传
-            app = TencentVideo(title, video_file, tags, publish_date, account_file, category)
-        elif args.platform == SOCIAL_MEDIA_KUAISHOU:
-            await ks_setup(account_file, handle=True)
-            app = KSVideo(title, video_file, tags, publish_date, account_file)
-        else:
+        ledger = UploadLedger()
+        if args.platforms:
+            platforms = list(dict.fromkeys([args.platform] + args.platforms))
+            results = await fan_out_upload(platforms, args.account_name, video_file, publish_date, ledger)
+            failed = [platform for platform, result in results.items() if isinstance(result, BaseException)]
+            if failed:
+                # 有平台发布失败时以非 0 状态退出，方便定时任务判断
+                print(f"Failed to publish to: {','.join(failed)}")
+                sys.exit(1)
+            return
+
+        title, tags = get_video_meta(video_file)
+        app = create_video_app(args.platform, account_file, video_file, publish_date, title, tags)
+        if app is None:
             print("Wrong platform, please check your input")
             exit()
 
-        await app.main()
+        async def upload():
+            # defer_auth: cookie 有效性在上传页加载时顺带检测，失效时上传流程会自动回退到扫码登录
+            await setup_account(args.platform, account_file, handle=True, defer_auth=True)
+            return await run_app(app)
+
+        content_hash = await get_content_hash(ledger, video_file)
+        await upload_once(ledger, args.platform, args.account_name, video_file, content_hash, upload)
+    elif args.action == 'watch':
+        await setup_account(args.platform, account_file, handle=True, defer_auth=True)
+        await watch_folders(args.platform, args.account_name, args.folders)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(run_with_browser_pool(main()))
@@ -1,5 +1,107 @@
+import os
 from pathlib import Path
 
 BASE_DIR = Path(__file__).parent.resolve()
+# 日志目录，设置环境变量 SAU_LOG_DIR 可以写到其他位置(测试时指向临时目录，不弄脏仓库里的 logs/)
+LOG_DIR = Path(os.environ.get("SAU_LOG_DIR") or BASE_DIR / "logs")
 XHS_SERVER = "http://127.0.0.1:11901"
 LOCAL_CHROME_PATH = ""   # change me necessary！ for example C:/Program Files/Google/Chrome/Application/chrome.exe
+
+# 共享浏览器池：同时存活的浏览器上限、单个浏览器累计提供多少个上下文后回收、浏览器进程树内存上限(MB，0 表示不检查)
+BROWSER_POOL_MAX_BROWSERS = 2
+BROWSER_POOL_MAX_CONTEXTS_PER_BROWSER = 20
+BROWSER_POOL_MAX_RSS_MB = 1536
+
+# cookie 文件在这个秒数内更新过且关键 cookie 未过期时，跳过浏览器里的 cookie 校验，0 表示每次都校验
+COOKIE_PRECHECK_FRESH_TTL = 6 * 3600
+
+# cookie 校验方式："browser" 用无头浏览器打开创作者页面；"http" 先请求平台的已登录接口，无法判断时再回退到浏览器
+COOKIE_AUTH_STRATEGY = "browser"
+SESSION_PROBE_TIMEOUT = 5
+
+# cookie 校验结果缓存：cookie 文件未变化且在 TTL(秒) 内时复用上次的校验结果，TTL 为 0 表示该平台不缓存
+COOKIE_CACHE_FILE = BASE_DIR / "cookies" / "validation_cache.json"
+COOKIE_CACHE_DEFAULT_TTL = 3600
+COOKIE_CACHE_TTL = {
+    "douyin": 6 * 3600,
+    "tencent": 3600,
+    "kuaishou": 6 * 3600,
+    "tiktok": 6 * 3600,
+    "zhihu": 12 * 3600,
+}
+# 校验失败的结果只缓存这么多秒(且不超过平台 TTL)，一次超时或网络抖动不会让 cookie 长时间被当作已失效
+COOKIE_CACHE_NEGATIVE_TTL = 60
+
+# watch 命令在 inotify 不可用时的轮询间隔(秒)
+FOLDER_WATCH_POLL_INTERVAL = 1
+# 文件最后修改时间距今超过这个秒数，且没有 doing.txt / <文件名>.lock 标记时，认为文件已经写完
+FILE_READY_STABLE_SECONDS = 10
+
+# 上传账本(SQLite)，记录每个文件在各平台、各账号上的上传状态
+UPLOAD_LEDGER_DB = BASE_DIR / "data" / "upload_ledger.db"
+# 文件内容指纹：不超过这个大小的文件计算完整 sha256，更大的文件只对开头、中间、结尾各取一段再加上文件大小计算哈希
+FINGERPRINT_FULL_HASH_LIMIT = 64 * 1024 * 1024
+FINGERPRINT_SAMPLE_SIZE = 1024 * 1024
+# 批量计算指纹的进程数，None 表示按 CPU 核数
+FINGERPRINT_WORKERS = None
+
+# 多账号并发上传：全局同时进行的上传数，以及每个平台的上限(未配置的平台只受全局限制)
+UPLOAD_MAX_CONCURRENCY = 4
+UPLOAD_PLATFORM_CONCURRENCY = {
+    "douyin": 2,
+    "tencent": 2,
+    "kuaishou": 2,
+    "tiktok": 2,
+}
+
+# 失败诊断：内存中保留最近几帧低分辨率截图，步骤失败时才写到 DIAGNOSTICS_DIR，每次运行最多写 DIAGNOSTICS_DISK_BUDGET_MB
+DIAGNOSTICS_DIR = LOG_DIR / "diagnostics"
+DIAGNOSTICS_FRAMES = 8
+DIAGNOSTICS_INTERVAL = 2
+DIAGNOSTICS_QUALITY = 40
+DIAGNOSTICS_MAX_WIDTH = 640
+DIAGNOSTICS_DISK_BUDGET_MB = 50
+
+# 话题、地点等联想弹窗的最长等待时间(秒)，弹窗出现后立即继续，不再固定 sleep
+TEXT_SUGGESTION_TIMEOUT = 3
+
+# 知乎文章 Markdown 渲染后的 HTML 缓存目录，按文件内容哈希命名
+ZHIHU_HTML_CACHE_DIR = BASE_DIR / "data" / "zhihu_html_cache"
+
+# 知乎文章本地图片上传：编辑器图片接口、最大并发数、单张超时(秒)，以及按图片内容哈希缓存上传地址的文件
+ZHIHU_IMAGE_UPLOAD_URL = "https://zhuanlan.zhihu.com/api/uploaded_images"
+ZHIHU_IMAGE_UPLOAD_CONCURRENCY = 4
+ZHIHU_IMAGE_UPLOAD_TIMEOUT = 60
+ZHIHU_IMAGE_CACHE_FILE = BASE_DIR / "data" / "zhihu_image_cache.json"
+
+# 小红书本地签名：每个 a1 保留一个常驻签名页，页面加载超过 TTL(秒) 后在后台刷新，最多保留的页面数，以及页面加载/签名超时(秒)
+XHS_SIGNER_PAGE_TTL = 30 * 60
+XHS_SIGNER_MAX_PAGES = 4
+XHS_SIGNER_TIMEOUT = 20
+
+# 小红书签名服务(python -m uploader.xhs_uploader.sign_server)：浏览器数量、最多同时在处理或排队的请求数，
+# 以及客户端请求超时(秒)和遇到 502/503/504 时的重试次数
+XHS_SIGN_SERVER_WORKERS = 2
+XHS_SIGN_SERVER_MAX_PENDING = 32
+XHS_SIGN_CLIENT_TIMEOUT = 30
+XHS_SIGN_CLIENT_RETRIES = 3
+
+# 小红书话题联想缓存：所有账号共用，查到话题的结果保留 TTL(秒)，没有话题的 tag 保留较短的负缓存 TTL(秒)
+XHS_TOPIC_CACHE_FILE = BASE_DIR / "data" / "xhs_topic_cache.json"
+XHS_TOPIC_CACHE_TTL = 7 * 24 * 3600
+XHS_TOPIC_NEGATIVE_TTL = 24 * 3600
+
+# B 站可续传分片上传：是否启用，进度清单目录，清单有效期(秒，超过后上传会话可能已失效，重新上传)，
+# 单个分片的最大尝试次数和请求超时(秒)
+BILIBILI_RESUMABLE_UPLOAD = True
+BILIBILI_UPLOAD_MANIFEST_DIR = BASE_DIR / "data" / "bilibili_uploads"
+BILIBILI_UPLOAD_MANIFEST_TTL = 24 * 3600
+BILIBILI_CHUNK_RETRIES = 5
+BILIBILI_CHUNK_TIMEOUT = 60
+
+# B 站分片并发按实测吞吐量在 [MIN, MAX] 之间自动调整；测速选出的线路缓存 TTL(秒)；每次上传的 MB/s 追加到 jsonl 文件
+BILIBILI_UPLOAD_TASKS_MIN = 1
+BILIBILI_UPLOAD_TASKS_MAX = 8
+BILIBILI_LINE_CACHE_FILE = BASE_DIR / "data" / "bilibili_line.json"
+BILIBILI_LINE_CACHE_TTL = 6 * 3600
+BILIBILI_THROUGHPUT_LOG = LOG_DIR / "bilibili_throughput.jsonl"
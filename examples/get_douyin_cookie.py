@@ -3,7 +3,8 @@ from pathlib import Path
 
 from conf import BASE_DIR
 from uploader.douyin_uploader.main import douyin_setup
+from utils.browser_pool import run_with_browser_pool
 
 if __name__ == '__main__':
     account_file = Path(BASE_DIR / "cookies" / "douyin_uploader" / "account.json")
-    cookie_setup = asyncio.run(douyin_setup(str(account_file), handle=True))
+    cookie_setup = asyncio.run(run_with_browser_pool(douyin_setup(str(account_file), handle=True)))
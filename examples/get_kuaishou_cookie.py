@@ -3,7 +3,8 @@ from pathlib import Path
 
 from conf import BASE_DIR
 from uploader.ks_uploader.main import ks_setup
+from utils.browser_pool import run_with_browser_pool
 
 if __name__ == '__main__':
     account_file = Path(BASE_DIR / "cookies" / "ks_uploader" / "account.json")
-    cookie_setup = asyncio.run(ks_setup(str(account_file), handle=True))
+    cookie_setup = asyncio.run(run_with_browser_pool(ks_setup(str(account_file), handle=True)))
@@ -3,7 +3,8 @@ from pathlib import Path
 
 from conf import BASE_DIR
 from uploader.tencent_uploader.main import weixin_setup
+from utils.browser_pool import run_with_browser_pool
 
 if __name__ == '__main__':
     account_file = Path(BASE_DIR / "cookies" / "tencent_uploader" / "account.json")
-    cookie_setup = asyncio.run(weixin_setup(str(account_file), handle=True))
+    cookie_setup = asyncio.run(run_with_browser_pool(weixin_setup(str(account_file), handle=True)))
@@ -3,7 +3,8 @@ from pathlib import Path
 
 from conf import BASE_DIR
 from uploader.tk_uploader.main_chrome import tiktok_setup
+from utils.browser_pool import run_with_browser_pool
 
 if __name__ == '__main__':
     account_file = Path(BASE_DIR / "cookies" / "tk_uploader" / "account.json")
-    cookie_setup = asyncio.run(tiktok_setup(str(account_file), handle=True))
+    cookie_setup = asyncio.run(run_with_browser_pool(tiktok_setup(str(account_file), handle=True)))
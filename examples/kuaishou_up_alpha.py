@@ -2,31 +2,32 @@ import os
 import sys
 import time
 import glob
-import datetime
 import asyncio
 import argparse
 from pathlib import Path
 
 from conf import BASE_DIR
 from uploader.ks_uploader.main import ks_setup, KSVideo
+from utils.base_social_media import SOCIAL_MEDIA_KUAISHOU
+from utils.browser_pool import run_with_browser_pool
 from utils.files_times import generate_schedule_time_next_day, get_title_and_hashtags
+from utils.folder_watcher import folder_is_busy, is_file_ready, wait_for_removed
+from utils.content_fingerprint import fingerprint_files
+from utils.upload_ledger import UploadLedger
 
 
 def wait_for_doing_file(video_path):
     """
-    循环检测指定目录下doing.txt文件是否存在，如果存在则等待。
+    检测指定目录下doing.txt文件是否存在，如果存在则等待，doing.txt被删除时立即返回。
 
     Args:
         video_path (str): 视频文件所在的绝对路径。
     """
     doing_file_path = os.path.join(video_path, 'doing.txt') # doing.txt 文件路径，在指定的 video_path 目录下
 
-    while True: # 无限循环，持续检测文件
-        if os.path.exists(doing_file_path): # 检查doing.txt文件是否存在
-            print(f"发现 {doing_file_path} 文件，等待5分钟...") # 打印等待信息
-            time.sleep(5 * 60) # 睡眠5分钟 (5 * 60 秒)
-        else:
-            break # doing.txt 文件不存在，跳出循环
+    if os.path.exists(doing_file_path): # 检查doing.txt文件是否存在
+        print(f"发现 {doing_file_path} 文件，等待其被删除...") # 打印等待信息
+        wait_for_removed(doing_file_path) # 文件被删除时立即唤醒，不再每5分钟轮询
 
 
 def get_mp4_files(video_path):
@@ -43,51 +44,6 @@ def get_mp4_files(video_path):
     video_files = glob.glob(mp4_pattern) # 使用glob查找所有匹配的文件
     return sorted(video_files) # 对文件名进行排序并返回
 
-def update_up_done_file(filename, video_path_name):
-    """
-    将成功处理的文件名写入updone.txt文件。
-    Args:
-        filename (str): 成功处理的mp4文件名（不包含路径，仅文件名）。
-    """
-    up_done_file_path = video_path_name + '_updone.txt' # updone.txt 文件路径，相对于脚本所在目录
-    try:
-        with open(up_done_file_path, 'a', encoding='utf-8') as f: # 以追加模式打开updone.txt文件
-            f.write(filename + '\n') # 将文件名写入文件，并添加换行符
-    except Exception as e: # 捕获文件写入可能发生的异常
-        print(f"警告: 写入 {up_done_file_path} 文件时发生错误: {e}") # 打印警告信息
-
-def load_up_done_files(video_path_name):
-    """
-    加载updone.txt文件中已处理的文件名到集合中。如果文件不存在则创建。
-    Returns:
-        set: 已处理的文件名集合。
-    """
-    up_done_file = video_path_name + '_updone.txt' # updone.txt 文件路径，相对于脚本所在目录
-    up_done_files = set() # 初始化一个空的集合，用于存储已处理的文件名
-
-    if os.path.exists(up_done_file): # 检查updone.txt文件是否存在
-        try:
-            with open(up_done_file, 'r', encoding='utf-8') as f: # 以只读模式打开文件，指定UTF-8编码
-                for line in f: # 逐行读取文件内容
-                    filename = line.strip() # 去除行尾的换行符和空白字符
-                    if filename: # 确保文件名非空
-                        up_done_files.add(filename) # 将文件名添加到集合中
-        except Exception as e: # 捕获文件读取可能发生的异常
-            print(f"警告: 读取 {up_done_file} 文件时发生错误: {e}") # 打印警告信息
-    else:
-        try:
-            current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S") # 获取当前时间并格式化
-            with open(up_done_file, 'w', encoding='utf-8') as f: # 创建新的updone.txt文件
-                f.write(f"Doing task started at: {current_time}\n") # 写入包含开始时间的文本
-
-            print(f"{up_done_file} 文件不存在，已创建。时间：{current_time}") # 打印文件创建信息
-            up_done_files.add(current_time)
-        except Exception as e: # 捕获文件创建可能发生的异常
-            print(f"错误: 创建 {up_done_file} 文件时发生错误: {e}") # 打印错误信息
-
-    return up_done_files # 返回已处理的文件名集合
-    
-
 def parse_config_file(config_file_path):
     """
     解析配置文件，将要上传的视频文件路径存储到set中。
@@ -173,7 +129,9 @@ if __name__ == '__main__':
     #sleep_time = 23976 # 设置休眠时间为23976秒 (约6.66Hour)
 
     account_file = Path(BASE_DIR / "cookies" / "ks_uploader" / "account.json")
-    cookie_setup = asyncio.run(ks_setup(account_file, handle=True))
+    ledger = UploadLedger() # 上传记录保存在 SQLite 账本中，替代 <目录名>_updone.txt
+    account_name = Path(account_file).stem
+    cookie_setup = asyncio.run(run_with_browser_pool(ks_setup(account_file, handle=True)))
     if not cookie_setup:
         print("KS cookie setup failed, program exit.")
         sys.exit(2)
@@ -183,18 +141,17 @@ if __name__ == '__main__':
     print(f" -- sleeptime:{sleep_time} ----tags：{tags}")
     print(f"-----程序启动，config: {config_file_path} -- video_path:{video_path_set}----")
     while True: # 无限循环，持续执行文件上传逻辑
-        for video_path in video_path_set:
+        for video_path in sorted(video_path_set, key=folder_is_busy): # 先处理没有doing.txt的目录，正在写入的目录放到最后
             wait_for_doing_file(video_path)   # 检测doing.txt文件是否存在，存在则等待
             folder_path = Path(video_path)    # 获取视频目录 
             # 获取文件夹中的所有文件
             video_files = list(folder_path.glob("*.mp4"))
             file_num = len(video_files)
             #publish_datetimes = generate_schedule_time_next_day(file_num, 1, daily_times=[16])
-            video_path_name = generate_filename_from_path(video_path) # 根据路径生成文件名 
-            up_done_files = load_up_done_files(video_path_name) # 读取updone.txt，加载已处理的文件名列表
-            if not up_done_files:
-                print("updone.txt 文件创建失败，程序退出。")
-                sys.exit(3)
+            video_path_name = generate_filename_from_path(video_path) # 根据路径生成文件名
+            ledger.import_updone_file(video_path_name + '_updone.txt', video_path, SOCIAL_MEDIA_KUAISHOU, account_name) # 旧的updone.txt只在第一次遇到时导入账本
+            # 内容指纹在进程池里批量计算并缓存在账本中，改名或复制到其他目录的同一个文件不会重复上传
+            fingerprints = fingerprint_files([f for f in video_files if not f.name.startswith("._") and is_file_ready(f)], ledger)
  
             print(f"\n-------process video_path：{video_path}-----start-------\n")
             for index, video_file in enumerate(video_files):
@@ -202,14 +159,16 @@ if __name__ == '__main__':
                 if filename.startswith("._"): # 检查文件名是否以"._"开头
                     #print(f"文件 {filename} 是临时文件，跳过。") # 打印临时文件信息
                     continue
+                if not is_file_ready(video_file): # 文件还在写入(有.lock或刚修改过)，留到下一轮，同目录其他文件照常上传
+                    continue
 
-                if filename not in up_done_files: # 检查文件是否已处理过
+                if not ledger.find_done(video_file, SOCIAL_MEDIA_KUAISHOU, account_name, fingerprints.get(video_file)): # 检查文件是否已上传过
                     title = "热舞"
                     #title = filename.replace(".mp4", "")
                     print(f"-------上传视频文件名：{filename} -----标题：{title} ------------")
                     app = KSVideo(title, video_file, tags, None, account_file)
-                    asyncio.run(app.main(), debug=True)
-                    update_up_done_file(filename, video_path_name) # 处理成功，更新updone.txt文件
+                    asyncio.run(run_with_browser_pool(app.main()), debug=True)
+                    ledger.record_done(video_file, SOCIAL_MEDIA_KUAISHOU, account_name, content_hash=fingerprints.get(video_file), post_id=getattr(app, "post_id", None)) # 处理成功，写入上传账本
                     # life is beautiful don't so rush. be kind be patience
                     print(f"---------wait to process next file--------sleep time：{sleep_time}-----")
                     time.sleep(sleep_time)
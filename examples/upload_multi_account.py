@@ -0,0 +1,50 @@
+import asyncio
+from pathlib import Path
+
+from conf import BASE_DIR
+from uploader.douyin_uploader.main import DouYinVideo
+from uploader.ks_uploader.main import KSVideo
+from uploader.tencent_uploader.main import TencentVideo
+from uploader.tk_uploader.main_chrome import TiktokVideo
+from utils.base_social_media import SOCIAL_MEDIA_DOUYIN, SOCIAL_MEDIA_KUAISHOU, SOCIAL_MEDIA_TENCENT, \
+    SOCIAL_MEDIA_TIKTOK
+from utils.browser_pool import run_with_browser_pool
+from utils.constant import TencentZoneTypes
+from utils.files_times import get_title_and_hashtags
+from utils.upload_ledger import UploadLedger
+from utils.upload_orchestrator import UploadJob, UploadOrchestrator
+
+# 每个平台的 cookie 目录，目录下的每个 json 文件对应一个账号
+PLATFORM_COOKIE_DIRS = {
+    SOCIAL_MEDIA_DOUYIN: "douyin_uploader",
+    SOCIAL_MEDIA_KUAISHOU: "ks_uploader",
+    SOCIAL_MEDIA_TENCENT: "tencent_uploader",
+    SOCIAL_MEDIA_TIKTOK: "tk_uploader",
+}
+
+
+def create_app(platform, title, file, tags, account_file):
+    if platform == SOCIAL_MEDIA_DOUYIN:
+        return DouYinVideo(title, file, tags, 0, account_file)
+    elif platform == SOCIAL_MEDIA_KUAISHOU:
+        return KSVideo(title, file, tags, 0, account_file)
+    elif platform == SOCIAL_MEDIA_TENCENT:
+        return TencentVideo(title, file, tags, 0, account_file, TencentZoneTypes.LIFESTYLE.value)
+    elif platform == SOCIAL_MEDIA_TIKTOK:
+        return TiktokVideo(title, file, tags, 0, account_file)
+
+
+if __name__ == '__main__':
+    # 把 videos 目录中的视频上传到 cookies 目录下的所有账号，不同账号、不同平台并发进行
+    files = sorted((Path(BASE_DIR) / "videos").glob("*.mp4"))
+    jobs = []
+    for platform, cookie_dir in PLATFORM_COOKIE_DIRS.items():
+        for account_file in sorted(Path(BASE_DIR / "cookies" / cookie_dir).glob("*.json")):
+            for file in files:
+                title, tags = get_title_and_hashtags(str(file))
+                # 账号名带上 cookie 目录，例如 douyin_uploader/account，不同目录下同名的 cookie 文件不会混在一起
+                account = account_file.relative_to(BASE_DIR / "cookies").with_suffix("").as_posix()
+                jobs.append(UploadJob(platform, create_app(platform, title, file, tags, account_file), account))
+    print(f"共 {len(jobs)} 个上传任务")
+    orchestrator = UploadOrchestrator(ledger=UploadLedger())
+    asyncio.run(run_with_browser_pool(orchestrator.run(jobs)))
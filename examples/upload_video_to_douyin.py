@@ -3,6 +3,7 @@ from pathlib import Path
 
 from conf import BASE_DIR
 from uploader.douyin_uploader.main import douyin_setup, DouYinVideo
+from utils.browser_pool import run_with_browser_pool
 from utils.files_times import generate_schedule_time_next_day, get_title_and_hashtags
 
 
@@ -15,7 +16,7 @@ if __name__ == '__main__':
     files = list(folder_path.glob("*.mp4"))
     file_num = len(files)
     publish_datetimes = generate_schedule_time_next_day(file_num, 1, daily_times=[16])
-    cookie_setup = asyncio.run(douyin_setup(account_file, handle=False))
+    cookie_setup = asyncio.run(run_with_browser_pool(douyin_setup(account_file, handle=False)))
     for index, file in enumerate(files):
         title, tags = get_title_and_hashtags(str(file))
         thumbnail_path = file.with_suffix('.png')
@@ -28,4 +29,4 @@ if __name__ == '__main__':
             # app = DouYinVideo(title, file, tags, publish_datetimes[index], account_file, thumbnail_path=thumbnail_path)
         # else:
         app = DouYinVideo(title, file, tags, publish_datetimes[index], account_file)
-        asyncio.run(app.main(), debug=False)
+        asyncio.run(run_with_browser_pool(app.main()), debug=False)
@@ -3,6 +3,7 @@ from pathlib import Path
 
 from conf import BASE_DIR
 from uploader.ks_uploader.main import ks_setup, KSVideo
+from utils.browser_pool import run_with_browser_pool
 from utils.files_times import generate_schedule_time_next_day, get_title_and_hashtags
 
 
@@ -15,7 +16,7 @@ if __name__ == '__main__':
     files = list(folder_path.glob("*.mp4"))
     file_num = len(files)
     publish_datetimes = generate_schedule_time_next_day(file_num, 1, daily_times=[16])
-    cookie_setup = asyncio.run(ks_setup(account_file, handle=False))
+    cookie_setup = asyncio.run(run_with_browser_pool(ks_setup(account_file, handle=False)))
     for index, file in enumerate(files):
         title, tags = get_title_and_hashtags(str(file))
         # 打印视频文件名、标题和 hashtag
@@ -23,4 +24,4 @@ if __name__ == '__main__':
         print(f"标题：{title}")
         print(f"Hashtag：{tags}")
         app = KSVideo(title, file, tags, publish_datetimes[index], account_file)
-        asyncio.run(app.main(), debug=False)
+        asyncio.run(run_with_browser_pool(app.main()), debug=False)
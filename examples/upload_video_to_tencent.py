@@ -3,6 +3,7 @@ from pathlib import Path
 
 from conf import BASE_DIR
 from uploader.tencent_uploader.main import weixin_setup, TencentVideo
+from utils.browser_pool import run_with_browser_pool
 from utils.constant import TencentZoneTypes
 from utils.files_times import generate_schedule_time_next_day, get_title_and_hashtags
 
@@ -16,7 +17,7 @@ if __name__ == '__main__':
     files = list(folder_path.glob("*.mp4"))
     file_num = len(files)
     publish_datetimes = generate_schedule_time_next_day(file_num, 1, daily_times=[16])
-    cookie_setup = asyncio.run(weixin_setup(account_file, handle=True))
+    cookie_setup = asyncio.run(run_with_browser_pool(weixin_setup(account_file, handle=True)))
     category = TencentZoneTypes.LIFESTYLE.value  # 标记原创需要否则不需要传
     for index, file in enumerate(files):
         title, tags = get_title_and_hashtags(str(file))
@@ -25,4 +26,4 @@ if __name__ == '__main__':
         print(f"标题：{title}")
         print(f"Hashtag：{tags}")
         app = TencentVideo(title, file, tags, publish_datetimes[index], account_file, category)
-        asyncio.run(app.main(), debug=False)
+        asyncio.run(run_with_browser_pool(app.main()), debug=False)
@@ -4,30 +4,30 @@ import os
 import sys
 import time
 import glob
-import datetime
 import asyncio
 import argparse
 from pathlib import Path
 
 from conf import BASE_DIR
 from uploader.zhihu_uploader.main import zhihu_setup, ZhihuArticle
+from utils.base_social_media import SOCIAL_MEDIA_ZHIHU
 from utils.files_times import generate_filename_from_path
+from utils.folder_watcher import folder_is_busy, is_file_ready, wait_for_removed
+from utils.content_fingerprint import fingerprint_files
+from utils.upload_ledger import UploadLedger
 
 
 def wait_for_doing_file(article_path):
     """
-    循环检测指定目录下doing.txt文件是否存在，如果存在则等待。
+    检测指定目录下doing.txt文件是否存在，如果存在则等待，doing.txt被删除时立即返回。
     Args:
         article_path (str): 文章文件所在的绝对路径。
     """
     doing_file_path = os.path.join(article_path, 'doing.txt')
 
-    while True:
-        if os.path.exists(doing_file_path):
-            print(f"发现 {doing_file_path} 文件，等待5分钟...")
-            time.sleep(5 * 60)
-        else:
-            break
+    if os.path.exists(doing_file_path):
+        print(f"发现 {doing_file_path} 文件，等待其被删除...")
+        wait_for_removed(doing_file_path)
 
 
 def get_md_files(article_path):
@@ -43,55 +43,6 @@ def get_md_files(article_path):
     return sorted(article_files)
 
 
-def update_up_done_file(filename, article_path_name):
-    """
-    将成功处理的文件名写入updone.txt文件。
-    Args:
-        filename (str): 成功处理的md文件名（不包含路径，仅文件名）。
-        article_path_name (str): 文件路径名称，用于生成updone文件名。
-    """
-    up_done_file_path = article_path_name + '_updone.txt'
-    try:
-        with open(up_done_file_path, 'a', encoding='utf-8') as f:
-            f.write(filename + '\n')
-    except Exception as e:
-        print(f"警告: 写入 {up_done_file_path} 文件时发生错误: {e}")
-
-
-def load_up_done_files(article_path_name):
-    """
-    加载updone.txt文件中已处理的文件名到集合中。如果文件不存在则创建。
-    Args:
-        article_path_name (str): 文件路径名称，用于生成updone文件名。
-    Returns:
-        set: 已处理的文件名集合。
-    """
-    up_done_file = article_path_name + '_updone.txt'
-    up_done_files = set()
-
-    if os.path.exists(up_done_file):
-        try:
-            with open(up_done_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    filename = line.strip()
-                    if filename:
-                        up_done_files.add(filename)
-        except Exception as e:
-            print(f"警告: 读取 {up_done_file} 文件时发生错误: {e}")
-    else:
-        try:
-            current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            with open(up_done_file, 'w', encoding='utf-8') as f:
-                f.write(f"Doing task started at: {current_time}\n")
-
-            print(f"{up_done_file} 文件不存在，已创建。时间：{current_time}")
-            up_done_files.add(current_time)
-        except Exception as e:
-            print(f"错误: 创建 {up_done_file} 文件时发生错误: {e}")
-
-    return up_done_files
-
-
 def parse_config_file(config_file_path):
     """
     解析配置文件，将要上传的文章文件路径存储到set中。
@@ -168,6 +119,8 @@ if __name__ == '__main__':
     cookies_dir = Path(BASE_DIR / "cookies" / "zhihu_uploader")
     cookies_dir.mkdir(parents=True, exist_ok=True)
     account_file = cookies_dir / "account.json"
+    ledger = UploadLedger() # 上传记录保存在 SQLite 账本中，替代 <目录名>_updone.txt
+    account_name = Path(account_file).stem
     
     # 设置cookie
     cookie_setup = asyncio.run(zhihu_setup(account_file, handle=True))
@@ -182,7 +135,7 @@ if __name__ == '__main__':
     print(f"-----程序启动，config: {config_file_path} -- article_path:{article_path_set}----")
     
     while True:  # 无限循环，持续执行文件上传逻辑
-        for article_path in article_path_set:
+        for article_path in sorted(article_path_set, key=folder_is_busy): # 先处理没有doing.txt的目录，正在写入的目录放到最后
             wait_for_doing_file(article_path)  # 检测doing.txt文件是否存在，存在则等待
             folder_path = Path(article_path)  # 获取文章目录
             
@@ -199,19 +152,20 @@ if __name__ == '__main__':
                 print(f"警告: 在目录 {article_path} 中未找到Markdown文件，跳过")
                 continue
                 
-            article_path_name = generate_filename_from_path(article_path)  # 根据路径生成文件名
-            up_done_files = load_up_done_files(article_path_name)  # 读取updone.txt，加载已处理的文件名列表
-            if not up_done_files:
-                print("updone.txt 文件创建失败，程序退出。")
-                sys.exit(3)
+            article_path_name = generate_filename_from_path(article_path) # 根据路径生成文件名
+            ledger.import_updone_file(article_path_name + '_updone.txt', article_path, SOCIAL_MEDIA_ZHIHU, account_name) # 旧的updone.txt只在第一次遇到时导入账本
+            # 内容指纹在进程池里批量计算并缓存在账本中，改名或复制到其他目录的同一个文件不会重复上传
+            fingerprints = fingerprint_files([f for f in article_files if not f.name.startswith("._") and is_file_ready(f)], ledger)
 
             print(f"\n-------process article_path：{article_path}-----start-------\n")
             for index, article_file in enumerate(article_files):
                 filename = os.path.basename(article_file)  # 提取文件名 (不包含路径)
                 if filename.startswith("._"):  # 检查文件名是否以"._"开头
                     continue
+                if not is_file_ready(article_file):  # 文件还在写入(有.lock或刚修改过)，留到下一轮
+                    continue
 
-                if filename not in up_done_files:  # 检查文件是否已处理过
+                if not ledger.find_done(article_file, SOCIAL_MEDIA_ZHIHU, account_name, fingerprints.get(article_file)):  # 检查文件是否已上传过
                     # 从文章文件中获取标题
                     title = get_article_title_from_file(article_file)
                     print(f"-------上传文章文件名：{filename} -----标题：{title} ------------")
@@ -221,7 +175,7 @@ if __name__ == '__main__':
                     asyncio.run(app.main())
                     
                     # 更新已处理文件记录
-                    update_up_done_file(filename, article_path_name)
+                    ledger.record_done(article_file, SOCIAL_MEDIA_ZHIHU, account_name, content_hash=fingerprints.get(article_file), post_id=getattr(app, "post_id", None))
                     
                     # 等待一段时间再处理下一个文件
                     print(f"---------wait to process next file--------sleep time：{sleep_time}-----")
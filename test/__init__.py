@@ -0,0 +1,9 @@
+import atexit
+import os
+import shutil
+import tempfile
+
+# 测试产生的日志写到临时目录，不写入仓库里的 logs/；必须在导入 conf 之前设置
+if not os.environ.get("SAU_LOG_DIR"):
+    os.environ["SAU_LOG_DIR"] = tempfile.mkdtemp(prefix="sau-test-logs-")
+    atexit.register(shutil.rmtree, os.environ["SAU_LOG_DIR"], True)
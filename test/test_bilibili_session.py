@@ -0,0 +1,113 @@
+import unittest
+import os
+import sys
+import json
+import tempfile
+from pathlib import Path
+
+# 添加项目根目录到Python路径，确保可以导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from uploader.bilibili_uploader.main import BilibiliSession, BilibiliUploader, is_auth_error
+
+
+class FakeBili(object):
+    """记录登录、上传和提交；expired 为 True 时模拟登录失效"""
+    instances = []
+
+    def __init__(self, video):
+        self.video = video
+        self.access_token = None
+        self.cookies = None
+        self.closed = False
+        self.expired = False
+        self.submitted = []
+        FakeBili.instances.append(self)
+
+    def login_by_cookies(self, cookie):
+        self.cookies = cookie
+
+    def upload_file(self, filepath, lines='AUTO', tasks=3):
+        if self.expired:
+            raise Exception({'code': -101, 'message': '账号未登录'})
+        return {'filename': Path(filepath).stem, 'title': '', 'desc': ''}
+
+    def submit(self):
+        if self.expired:
+            return {'code': -111, 'message': 'csrf 校验失败'}
+        self.submitted.append(self.video.title)
+        self.submitted_parts = [(part['filename'], part['title']) for part in self.video.videos]
+        return {'code': 0, 'data': {'bvid': f'BV{len(self.submitted)}'}}
+
+    def close(self):
+        self.closed = True
+
+
+class TestBilibiliSession(unittest.TestCase):
+    def setUp(self):
+        FakeBili.instances = []
+
+    def test_batch_logs_in_once(self):
+        with BilibiliSession({'SESSDATA': 's'}, bili_factory=FakeBili, resumable=False) as session:
+            for index in range(3):
+                uploader = BilibiliUploader({'SESSDATA': 's'}, Path(f'/videos/{index}.mp4'), f'title {index}',
+                                            'desc', 21, ['tag'], None)
+                self.assertTrue(uploader.upload(session))
+                self.assertEqual(uploader.post_id, f'BV{index + 1}')
+        self.assertEqual(len(FakeBili.instances), 1)
+        self.assertEqual(session.logins, 1)
+        self.assertEqual(FakeBili.instances[0].submitted, ['title 0', 'title 1', 'title 2'])
+        self.assertTrue(FakeBili.instances[0].closed)
+
+    def test_relogin_on_auth_failure(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            account_file = Path(tmpdir) / 'account.json'
+            account_file.write_text(json.dumps({
+                'cookie_info': {'cookies': [{'name': 'SESSDATA', 'value': 'new'}]},
+                'token_info': {'access_token': 'token'},
+            }), encoding='utf-8')
+            session = BilibiliSession({'SESSDATA': 'old'}, account_file=account_file, bili_factory=FakeBili,
+                                      resumable=False)
+            session.login().expired = True
+            part = session.upload_file('/videos/a.mp4')
+            self.assertEqual(part['filename'], 'a')
+            self.assertEqual(session.logins, 2)
+            self.assertTrue(FakeBili.instances[0].closed)
+            self.assertEqual(session.bili.cookies, {'SESSDATA': 'new', 'access_token': 'token'})
+
+            session.bili.expired = True
+            uploader = BilibiliUploader(None, Path('/videos/b.mp4'), 'b', 'b', 21, ['tag'], None)
+            self.assertTrue(uploader.upload(session))
+            # 上传时重新登录一次，提交沿用新的会话
+            self.assertEqual(session.logins, 3)
+            self.assertEqual(session.bili.submitted, ['b'])
+            session.close()
+
+    def test_other_errors_are_not_retried(self):
+        class BrokenBili(FakeBili):
+            def upload_file(self, filepath, lines='AUTO', tasks=3):
+                raise NotImplementedError('kodo')
+
+        session = BilibiliSession({'SESSDATA': 's'}, bili_factory=BrokenBili, resumable=False)
+        with self.assertRaises(NotImplementedError):
+            session.upload_file('/videos/a.mp4')
+        self.assertEqual(session.logins, 1)
+
+    def test_multi_part_submitted_once_in_order(self):
+        with BilibiliSession({'SESSDATA': 's'}, bili_factory=FakeBili, resumable=False) as session:
+            files = [Path(f'/videos/part{index}.mp4') for index in range(1, 6)]
+            uploader = BilibiliUploader({'SESSDATA': 's'}, files, 'series', 'desc', 21, ['tag'], None,
+                                        part_titles=[f'P{index}' for index in range(1, 6)])
+            self.assertTrue(uploader.upload(session))
+            bili = FakeBili.instances[0]
+        self.assertEqual(bili.submitted, ['series'])
+        self.assertEqual(bili.submitted_parts, [(f'part{index}', f'P{index}') for index in range(1, 6)])
+
+    def test_is_auth_error(self):
+        self.assertTrue(is_auth_error({'code': -101}))
+        self.assertTrue(is_auth_error(Exception({'code': -111})))
+        self.assertFalse(is_auth_error({'code': 21070}))
+        self.assertFalse(is_auth_error(Exception('timeout')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径，确保可以导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from uploader.bilibili_uploader.main import BilibiliSession
+from uploader.bilibili_uploader.throughput import AdaptiveConcurrency, LineCache
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestAdaptiveConcurrency(unittest.TestCase):
+    def run_window(self, concurrency, clock, seconds, nbytes=1000 * 1000):
+        """按当前并发数完成一个窗口的分片，整个窗口用时 seconds"""
+        starts = [concurrency.acquire() for _ in range(concurrency.limit)]
+        clock.now += seconds
+        for started in starts:
+            concurrency.release(started, nbytes)
+
+    def test_additive_increase_while_throughput_grows(self):
+        clock = FakeClock()
+        concurrency = AdaptiveConcurrency(2, minimum=1, maximum=4, clock=clock)
+        self.run_window(concurrency, clock, 1)  # 2MB/s，第一个窗口直接加 1
+        self.assertEqual(concurrency.limit, 3)
+        self.run_window(concurrency, clock, 1)  # 3MB/s
+        self.assertEqual(concurrency.limit, 4)
+        self.run_window(concurrency, clock, 1)  # 已到上限
+        self.assertEqual(concurrency.limit, 4)
+        self.assertEqual(concurrency.stats["max_limit"], 4)
+
+    def test_hold_on_plateau_and_halve_on_drop(self):
+        clock = FakeClock()
+        concurrency = AdaptiveConcurrency(4, minimum=1, maximum=8, clock=clock)
+        self.run_window(concurrency, clock, 1)  # 4MB/s -> 5
+        self.run_window(concurrency, clock, 1.22)  # 5/1.22 ≈ 4.1MB/s，提升不足 5%，保持
+        self.assertEqual(concurrency.limit, 5)
+        self.run_window(concurrency, clock, 2)  # 2.5MB/s，明显下降，减半
+        self.assertEqual(concurrency.limit, 2)
+        self.assertEqual(concurrency.stats["decreases"], 1)
+
+    def test_congestion_halves_and_respects_minimum(self):
+        concurrency = AdaptiveConcurrency(6, minimum=2, maximum=8)
+        concurrency.congestion()
+        self.assertEqual(concurrency.limit, 3)
+        concurrency.congestion()
+        concurrency.congestion()
+        self.assertEqual(concurrency.limit, 2)
+        self.assertEqual(concurrency.stats["errors"], 3)
+
+    def test_acquire_blocks_at_limit(self):
+        concurrency = AdaptiveConcurrency(1, minimum=1, maximum=1)
+        started = concurrency.acquire()
+        acquired = threading.Event()
+
+        def worker():
+            concurrency.acquire()
+            acquired.set()
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        self.assertFalse(acquired.wait(0.1))
+        concurrency.release(started, 100)
+        self.assertTrue(acquired.wait(2))
+        thread.join()
+
+
+class FakeBili(object):
+    def __init__(self, video):
+        self.probes = 0
+
+    def probe(self):
+        self.probes += 1
+        return {"os": "upos", "query": "upcdn=bda2&probe_version=20221109", "cost": 0.1}
+
+    def close(self):
+        pass
+
+
+class TestLineCache(unittest.TestCase):
+    def test_ttl_and_shared_file(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache_file = Path(tmpdir) / "line.json"
+            LineCache(cache_file, ttl=100).set("upcdn=ws", 0.2, now=time.time() - 50)
+            self.assertEqual(LineCache(cache_file, ttl=100).get(), "upcdn=ws")
+            self.assertIsNone(LineCache(cache_file, ttl=10).get())
+            cache = LineCache(cache_file, ttl=100)
+            cache.invalidate()
+            self.assertIsNone(cache.get())
+            self.assertFalse(cache_file.exists())
+
+    def test_session_probes_once_within_ttl(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache_file = Path(tmpdir) / "line.json"
+            bili = FakeBili(None)
+            session = BilibiliSession({}, line_cache=LineCache(cache_file, ttl=100))
+            self.assertEqual(session._select_line(bili, 'AUTO'), "upcdn=bda2&probe_version=20221109")
+            self.assertEqual(session._select_line(bili, 'AUTO'), "upcdn=bda2&probe_version=20221109")
+            # 另一个会话(另一个进程)读取缓存，不再测速
+            other = BilibiliSession({}, line_cache=LineCache(cache_file, ttl=100))
+            other._select_line(bili, 'AUTO')
+            self.assertEqual(bili.probes, 1)
+            self.assertEqual(session._select_line(bili, 'ws'), "upcdn=ws&probe_version=20221109")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,193 @@
+import unittest
+import os
+import sys
+import json
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+# 添加项目根目录到Python路径，确保可以导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from uploader.bilibili_uploader import upos
+from uploader.bilibili_uploader.throughput import AdaptiveConcurrency
+from uploader.bilibili_uploader.upos import ManifestStore, ResumableUposUpload, UploadSessionError, upload_parts
+
+CHUNK_SIZE = 1000
+
+
+class UposStandIn(BaseHTTPRequestHandler):
+    """preupload、申请上传、分片 PUT、合并分片的替身服务"""
+    protocol_version = "HTTP/1.1"
+
+    def _json(self, body, status=200):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        state = self.server.state
+        state["preuploads"] += 1
+        name = Path(parse_qs(urlparse(self.path).query)["name"][0]).stem
+        self._json({"chunk_size": CHUNK_SIZE, "auth": "auth", "biz_id": 1,
+                    "endpoint": f"//127.0.0.1:{self.server.server_address[1]}",
+                    "upos_uri": f"upos://ugc/n-{name}.mp4"})
+
+    def do_PUT(self):
+        state = self.server.state
+        query = parse_qs(urlparse(self.path).query)
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        index = int(query["chunk"][0])
+        if query["uploadId"][0] not in state["valid_ids"]:
+            self._json({"error": "no such upload"}, status=404)
+            return
+        if index in state["fail_chunks"]:
+            self._json({"error": "boom"}, status=500)
+            return
+        name = Path(urlparse(self.path).path).stem
+        state["puts"].append(index)
+        state["timeline"].append(name)
+        state["parts"].setdefault(name, {})[index] = body
+        self._json({})
+
+    def do_POST(self):
+        state = self.server.state
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if "uploads" in urlparse(self.path).query:
+            upload_id = f"U{state['preuploads']}"
+            if not state["reject_new"]:
+                state["valid_ids"].add(upload_id)
+            self._json({"upload_id": upload_id})
+        else:
+            state["completed"] += 1
+            self._json({"OK": 1})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestResumableUpload(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.file = Path(self.tmpdir.name) / "video.mp4"
+        self.content = os.urandom(CHUNK_SIZE * 7 + 123)
+        self.file.write_bytes(self.content)
+        self.store = ManifestStore(Path(self.tmpdir.name) / "manifests", ttl=3600)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), UposStandIn)
+        self.server.state = {"preuploads": 0, "puts": [], "parts": {}, "fail_chunks": set(),
+                             "valid_ids": set(), "reject_new": False, "completed": 0, "timeline": []}
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.http = requests.Session()
+        # 分片失败不重试、不等待
+        patcher = mock.patch.multiple(upos, BILIBILI_CHUNK_RETRIES=1)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.http.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmpdir.cleanup()
+
+    def upload(self, tasks=3, throughput_log=None):
+        return ResumableUposUpload(self.http, self.file, "upcdn=bda2", tasks=tasks, max_tasks=tasks, account="42",
+                                   store=self.store, throughput_log=throughput_log,
+                                   preupload_url=f"http://127.0.0.1:{self.server.server_address[1]}/preupload")
+
+    def assembled(self, name="n-video") -> bytes:
+        parts = self.server.state["parts"][name]
+        return b"".join(parts[index] for index in sorted(parts))
+
+    def test_upload_all_chunks(self):
+        throughput_log = Path(self.tmpdir.name) / "throughput.jsonl"
+        part = self.upload(throughput_log=throughput_log).run()
+        self.assertEqual(part, {"title": "video", "filename": "n-video", "desc": ""})
+        self.assertEqual(self.assembled(), self.content)
+        self.assertEqual(sorted(self.server.state["puts"]), list(range(8)))
+        self.assertEqual(list(self.store.manifest_dir.glob("*.json")), [])
+        record = json.loads(throughput_log.read_text(encoding="utf-8"))
+        self.assertEqual(record["bytes"], len(self.content))
+        self.assertEqual(record["line"], "upcdn=bda2")
+        self.assertGreater(record["mbps"], 0)
+
+    def test_resume_after_interruption(self):
+        state = self.server.state
+        state["fail_chunks"] = {5}
+        with self.assertRaises(IOError):
+            self.upload(tasks=1).run()
+        manifest = self.store.load(self.file, "42")
+        self.assertEqual(manifest.done, {0, 1, 2, 3, 4})
+
+        state["fail_chunks"] = set()
+        state["puts"] = []
+        upload_task = self.upload()
+        upload_task.run()
+        # 续传只上传缺少的分片，不重新申请上传
+        self.assertEqual(sorted(state["puts"]), [5, 6, 7])
+        self.assertEqual(state["preuploads"], 1)
+        self.assertEqual(upload_task.uploaded_bytes, CHUNK_SIZE * 2 + 123)
+        self.assertEqual(self.assembled(), self.content)
+        self.assertIsNone(self.store.load(self.file, "42"))
+
+    def test_expired_session_restarts(self):
+        state = self.server.state
+        state["fail_chunks"] = {3}
+        with self.assertRaises(IOError):
+            self.upload(tasks=1).run()
+        state["fail_chunks"] = set()
+        state["valid_ids"].clear()
+        state["puts"] = []
+        self.upload().run()
+        self.assertEqual(sorted(state["puts"]), list(range(8)))
+        self.assertEqual(state["preuploads"], 2)
+        self.assertEqual(self.assembled(), self.content)
+
+    def test_new_session_rejected_raises(self):
+        # 新申请的上传会话被拒绝时不再重试，直接抛出
+        self.server.state["reject_new"] = True
+        with self.assertRaises(UploadSessionError):
+            self.upload().run()
+        self.assertEqual(self.server.state["preuploads"], 1)
+
+    def test_manifest_ignored_when_file_changes(self):
+        self.server.state["fail_chunks"] = {2}
+        with self.assertRaises(IOError):
+            self.upload(tasks=1).run()
+        self.assertIsNotNone(self.store.load(self.file, "42"))
+        self.assertIsNone(self.store.load(self.file, "other-account"))
+        os.utime(self.file, ns=(0, 0))
+        self.assertIsNone(self.store.load(self.file, "42"))
+
+    def test_multi_part_shares_workers(self):
+        files = []
+        for index, size in enumerate((CHUNK_SIZE * 4, CHUNK_SIZE * 2 + 1, CHUNK_SIZE * 3)):
+            path = Path(self.tmpdir.name) / f"P{index + 1}.mp4"
+            path.write_bytes(os.urandom(size))
+            files.append(path)
+        concurrency = AdaptiveConcurrency(3, minimum=1, maximum=3)
+        uploads = [ResumableUposUpload(self.http, path, "upcdn=bda2", account="42", store=self.store,
+                                       concurrency=concurrency, throughput_log=None,
+                                       preupload_url=f"http://127.0.0.1:{self.server.server_address[1]}/preupload")
+                   for path in files]
+        parts = upload_parts(uploads, concurrency)
+        # 分P顺序与传入顺序一致，每个文件内容完整
+        self.assertEqual([part["filename"] for part in parts], ["n-P1", "n-P2", "n-P3"])
+        for path in files:
+            self.assertEqual(self.assembled(f"n-{path.stem}"), path.read_bytes())
+        # 分片交替排队：最后一个分P不用等第一个分P传完就开始上传(不依赖线程调度的先后顺序)
+        timeline = self.server.state["timeline"]
+        self.assertLess(timeline.index("n-P3"), len(timeline) - 1 - timeline[::-1].index("n-P1"))
+        self.assertEqual(self.server.state["completed"], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
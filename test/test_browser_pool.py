@@ -0,0 +1,114 @@
+import unittest
+import os
+import sys
+from unittest import mock
+
+# 添加项目根目录到Python路径，确保可以导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import browser_pool
+from utils.browser_pool import BrowserPool
+
+
+class FakeContext(object):
+    def __init__(self):
+        self.closed = False
+
+    async def add_init_script(self, path=None):
+        pass
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeBrowser(object):
+    def __init__(self, options):
+        self.options = options
+        self.closed = False
+
+    def is_connected(self):
+        return not self.closed
+
+    async def new_context(self, **options):
+        return FakeContext()
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeBrowserType(object):
+    def __init__(self):
+        self.launched = []
+
+    async def launch(self, **options):
+        browser = FakeBrowser(options)
+        self.launched.append(browser)
+        return browser
+
+
+class FakePlaywright(object):
+    def __init__(self):
+        self.chromium = FakeBrowserType()
+        self.stopped = False
+
+    async def stop(self):
+        self.stopped = True
+
+
+class FakeAsyncPlaywright(object):
+    def __init__(self):
+        self.playwright = FakePlaywright()
+
+    async def start(self):
+        return self.playwright
+
+
+class TestBrowserPool(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.driver = FakeAsyncPlaywright()
+        patcher = mock.patch.object(browser_pool, "async_playwright", lambda: self.driver)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_reuse_browser_for_same_options(self):
+        """相同启动参数的上下文复用同一个浏览器"""
+        pool = BrowserPool(max_browsers=2, max_contexts_per_browser=0, max_rss_mb=0)
+        async with pool.context(headless=True, storage_state="a.json") as context:
+            self.assertIsInstance(context, FakeContext)
+        async with pool.context(headless=True, storage_state="b.json"):
+            pass
+        stats = pool.get_stats()
+        self.assertEqual(stats["launches"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["active_contexts"], 0)
+        await pool.close()
+        self.assertTrue(self.driver.playwright.stopped)
+
+    async def test_recycle_after_max_contexts(self):
+        """浏览器累计提供的上下文达到上限后被回收"""
+        pool = BrowserPool(max_browsers=1, max_contexts_per_browser=2, max_rss_mb=0)
+        for _ in range(3):
+            async with pool.context(headless=True):
+                pass
+        launched = self.driver.playwright.chromium.launched
+        self.assertEqual(len(launched), 2)
+        self.assertTrue(launched[0].closed)
+        self.assertEqual(pool.get_stats()["recycles"], 1)
+        await pool.close()
+
+    async def test_evict_idle_browser_when_full(self):
+        """浏览器数量达到上限时关闭空闲的浏览器再启动新的"""
+        pool = BrowserPool(max_browsers=1, max_contexts_per_browser=0, max_rss_mb=0)
+        async with pool.context(headless=True):
+            pass
+        async with pool.context(headless=False):
+            pass
+        launched = self.driver.playwright.chromium.launched
+        self.assertEqual(len(launched), 2)
+        self.assertTrue(launched[0].closed)
+        self.assertEqual(pool.get_stats()["browsers"], 1)
+        await pool.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,178 @@
+import unittest
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+# 添加项目根目录到Python路径，确保可以导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import cli_main
+from utils.upload_ledger import UploadLedger
+
+
+class TestFanOutUpload(unittest.IsolatedAsyncioTestCase):
+    async def test_platforms_run_concurrently(self):
+        """标题只读取一次，各平台并发发布，单个平台失败不影响其他平台"""
+        calls = []
+
+        async def fake_upload(platform, account_name, video_file, title, tags, publish_date):
+            calls.append((platform, title, tuple(tags)))
+            await asyncio.sleep(0.2)
+            if platform == "bilibili":
+                raise RuntimeError("submit failed")
+            return f"{platform}-1"
+
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                mock.patch.object(cli_main, "get_video_meta", return_value=("标题", ["tag"])) as get_meta, \
+                mock.patch.object(cli_main, "upload_to_platform", fake_upload):
+            ledger = UploadLedger(os.path.join(tmp_dir, "ledger.db"))
+            video = os.path.join(tmp_dir, "a.mp4")
+            with open(video, 'wb') as f:
+                f.write(b"video")
+            started = time.monotonic()
+            results = await cli_main.fan_out_upload(["douyin", "kuaishou", "bilibili"], "test", video, 0, ledger)
+            elapsed = time.monotonic() - started
+            self.assertEqual(ledger.get_job(video, "douyin", "test")["post_id"], "douyin-1")
+            self.assertFalse(ledger.is_done(video, "bilibili", "test"))
+            ledger.close()
+
+        get_meta.assert_called_once_with(video)
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual([call[0] for call in calls], ["douyin", "kuaishou", "bilibili"])
+        self.assertIsNone(results["douyin"])
+        self.assertIsInstance(results["bilibili"], RuntimeError)
+
+    async def test_published_content_skipped(self):
+        """同一个视频(包括改名、复制到其他目录的副本)已发布过的平台直接跳过，只重试其余平台"""
+        calls = []
+
+        async def fake_upload(platform, account_name, video_file, title, tags, publish_date):
+            calls.append((platform, video_file))
+
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                mock.patch.object(cli_main, "upload_to_platform", fake_upload):
+            ledger = UploadLedger(os.path.join(tmp_dir, "ledger.db"))
+            first, copy = Path(tmp_dir) / "a.mp4", Path(tmp_dir) / "other" / "renamed.mp4"
+            copy.parent.mkdir()
+            for path in (first, copy):
+                path.write_bytes(b"same video")
+            ledger.record_done(first, "douyin", "test", content_hash=await cli_main.get_content_hash(ledger, first))
+            results = await cli_main.fan_out_upload(["douyin", "kuaishou"], "test", copy, 0, ledger)
+            self.assertEqual(results, {"douyin": cli_main.JOB_SKIPPED, "kuaishou": None})
+            results = await cli_main.fan_out_upload(["douyin", "kuaishou"], "test", first, 0, ledger)
+            self.assertEqual(results, {"douyin": cli_main.JOB_SKIPPED, "kuaishou": cli_main.JOB_SKIPPED})
+            ledger.close()
+        self.assertEqual(calls, [("kuaishou", copy)])
+
+    async def test_platforms_rejected_for_unsupported_primary(self):
+        """主平台不能同时发布时(例如 zhihu)直接报错，不会开始上传"""
+        with tempfile.NamedTemporaryFile(suffix=".mp4") as video, \
+                mock.patch.object(sys, "argv", ["cli_main.py", "zhihu", "test", "upload", video.name,
+                                                "--platforms", "douyin"]), \
+                mock.patch.object(cli_main, "fan_out_upload") as fan_out, \
+                mock.patch("sys.stderr"):
+            with self.assertRaises(SystemExit):
+                await cli_main.main()
+        fan_out.assert_not_called()
+
+    async def test_exit_status_when_platform_fails(self):
+        """有平台发布失败时 CLI 以非 0 状态退出"""
+        async def fake_fan_out(platforms, account_name, video_file, publish_date, ledger):
+            return {"douyin": None, "bilibili": RuntimeError("submit failed")}
+
+        with tempfile.NamedTemporaryFile(suffix=".mp4") as video, \
+                mock.patch.object(sys, "argv", ["cli_main.py", "douyin", "test", "upload", video.name,
+                                                "--platforms", "bilibili"]), \
+                mock.patch.object(cli_main, "UploadLedger"), \
+                mock.patch.object(cli_main, "fan_out_upload", fake_fan_out), \
+                mock.patch("sys.stdout"):
+            with self.assertRaises(SystemExit) as exit_info:
+                await cli_main.main()
+        self.assertEqual(exit_info.exception.code, 1)
+
+    def test_parse_platforms(self):
+        self.assertEqual(cli_main.parse_platforms("douyin, bilibili,xhs"), ["douyin", "bilibili", "xhs"])
+        with self.assertRaises(Exception):
+            cli_main.parse_platforms("douyin,unknown")
+
+
+class FakeWatcher(object):
+    """依次返回给定的文件，然后一直等待"""
+    def __init__(self, paths):
+        self.paths = paths
+        self.mode = "fake"
+        self.folders = []
+
+    async def watch(self):
+        for path in self.paths:
+            yield path
+        await asyncio.Event().wait()
+
+    def close(self):
+        pass
+
+
+class FakeVideoApp(object):
+    def __init__(self, uploaded, video_file):
+        self.uploaded = uploaded
+        self.video_file = video_file
+
+    async def main(self):
+        self.uploaded.append(self.video_file)
+        self.post_id = f"post-{len(self.uploaded)}"
+
+
+class TestWatchFolders(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.folder = Path(self.tmp_dir.name)
+        self.ledger = UploadLedger(self.folder / "ledger.db")
+        self.uploaded = []
+
+    async def asyncTearDown(self):
+        self.ledger.close()
+        self.tmp_dir.cleanup()
+
+    def write(self, name, data: bytes) -> Path:
+        path = self.folder / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        return path
+
+    async def watch(self, paths):
+        """运行一轮 watch_folders，返回这一轮上传的文件"""
+        self.uploaded = []
+        app = lambda platform, account_file, video_file, publish_date, title, tags: \
+            FakeVideoApp(self.uploaded, video_file)
+        with mock.patch.object(cli_main, "FolderWatcher", lambda folders: FakeWatcher(paths)), \
+                mock.patch.object(cli_main, "create_video_app", app):
+            task = asyncio.create_task(cli_main.watch_folders("douyin", "test", [], ledger=self.ledger))
+            await asyncio.sleep(0.3)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+        return self.uploaded
+
+    async def test_restart_does_not_reupload(self):
+        """重启后已有的视频不会再次上传，同一路径写入新内容时再次上传"""
+        video = self.write("a.mp4", b"first")
+        self.assertEqual(await self.watch([video, video]), [str(video)])
+        self.assertEqual(await self.watch([video]), [])
+        self.assertEqual(self.ledger.get_job(video, "douyin", "test")["post_id"], "post-1")
+        video.write_bytes(b"second")
+        self.assertEqual(await self.watch([video]), [str(video)])
+
+    async def test_copy_in_second_folder_skipped(self):
+        """同一个视频复制到第二个监听目录或改名后不会再次上传"""
+        video = self.write("a/x.mp4", b"same video")
+        copy = self.write("b/x.mp4", b"same video")
+        renamed = self.write("b/renamed.mp4", b"same video")
+        other = self.write("b/other.mp4", b"other video")
+        self.assertEqual(await self.watch([video, copy, renamed, other]), [str(video), str(other)])
+
+
+if __name__ == '__main__':
+    unittest.main()
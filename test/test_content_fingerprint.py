@@ -0,0 +1,77 @@
+import unittest
+import hashlib
+import os
+import sys
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+# 添加项目根目录到Python路径，确保可以导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import content_fingerprint
+from utils.content_fingerprint import file_fingerprint, fingerprint_files
+from utils.upload_ledger import UploadLedger
+
+
+class TestContentFingerprint(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.folder = Path(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write(self, name, data: bytes) -> Path:
+        path = self.folder / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        return path
+
+    def test_small_file_full_hash(self):
+        data = os.urandom(5000)
+        path = self.write("a.mp4", data)
+        self.assertEqual(file_fingerprint(path), f"sha256:{hashlib.sha256(data).hexdigest()}")
+        self.assertEqual(file_fingerprint(self.write("empty.mp4", b"")),
+                         f"sha256:{hashlib.sha256().hexdigest()}")
+
+    def test_large_file_sampled(self):
+        data = bytearray(os.urandom(10000))
+        path = self.write("big.mp4", bytes(data))
+        fingerprint = file_fingerprint(path, full_hash_limit=1000, sample_size=100)
+        self.assertTrue(fingerprint.startswith("sample:10000:"))
+        # 改名、复制到其他目录后指纹不变
+        copy = self.write("other/renamed.mp4", bytes(data))
+        self.assertEqual(file_fingerprint(copy, full_hash_limit=1000, sample_size=100), fingerprint)
+        # 抽样区域内的改动和大小变化都会改变指纹
+        for offset in (0, 4950, 9999):
+            changed = bytearray(data)
+            changed[offset] ^= 0xFF
+            self.write("changed.mp4", bytes(changed))
+            self.assertNotEqual(file_fingerprint(self.folder / "changed.mp4", 1000, 100), fingerprint)
+        self.write("longer.mp4", bytes(data) + b"\0")
+        self.assertNotEqual(file_fingerprint(self.folder / "longer.mp4", 1000, 100), fingerprint)
+
+    def test_batch_uses_process_pool_and_ledger_cache(self):
+        paths = [self.write(f"{index}.mp4", os.urandom(3000 + index)) for index in range(4)]
+        missing = self.folder / "missing.mp4"
+        ledger = UploadLedger(self.folder / "ledger.db")
+        try:
+            fingerprints = fingerprint_files(paths + [missing], ledger, max_workers=2)
+            self.assertEqual(fingerprints, {path: file_fingerprint(path) for path in paths})
+
+            # 大小和修改时间没变时直接使用账本里的指纹
+            with mock.patch.object(content_fingerprint, "_fingerprint_or_none") as compute:
+                self.assertEqual(fingerprint_files(paths, ledger), fingerprints)
+                compute.assert_not_called()
+
+            # 文件改动后重新计算
+            paths[0].write_bytes(b"changed")
+            updated = fingerprint_files(paths, ledger, max_workers=1)
+            self.assertEqual(updated[paths[0]], file_fingerprint(paths[0]))
+            self.assertEqual(updated[paths[1]], fingerprints[paths[1]])
+        finally:
+            ledger.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+import json
+import os
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到Python路径，确保可以导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.cookie_cache import CookieValidationCache
+
+
+class TestCookieValidationCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.account_file = os.path.join(self.tmp_dir.name, "account.json")
+        self.cache_file = os.path.join(self.tmp_dir.name, "cache.json")
+        self.write_account("a")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_account(self, value):
+        with open(self.account_file, 'w', encoding='utf-8') as f:
+            json.dump({"cookies": [{"name": "sessionid", "value": value}], "origins": []}, f)
+
+    def test_hit_and_persist(self):
+        """缓存结果写入文件，新进程加载后仍可命中"""
+        cache = CookieValidationCache(self.cache_file, {"douyin": 3600})
+        self.assertIsNone(cache.get(self.account_file, "douyin"))
+        cache.set(self.account_file, "douyin", True)
+        self.assertIs(cache.get(self.account_file, "douyin"), True)
+
+        reloaded = CookieValidationCache(self.cache_file, {"douyin": 3600})
+        self.assertIs(reloaded.get(self.account_file, "douyin"), True)
+        self.assertEqual(cache.get_stats()["hits"], 1)
+        self.assertEqual(cache.get_stats()["misses"], 1)
+
+    def test_stale_when_file_changes_or_ttl_expires(self):
+        """cookie 文件内容变化或超过 TTL 后结果过期"""
+        cache = CookieValidationCache(None, {"douyin": 3600})
+        cache.set(self.account_file, "douyin", True)
+        self.write_account("b")
+        self.assertIsNone(cache.get(self.account_file, "douyin"))
+
+        cache.set(self.account_file, "douyin", False)
+        self.assertIsNone(cache.get(self.account_file, "douyin", now=time.time() + 3600))
+        self.assertEqual(cache.get_stats()["stale"], 2)
+
+    def test_failed_check_expires_quickly(self):
+        """校验失败的结果只缓存 negative_ttl，不会在整个平台 TTL 内都当作已失效"""
+        cache = CookieValidationCache(None, {"douyin": 3600}, negative_ttl=60)
+        now = time.time()
+        cache.set(self.account_file, "douyin", False, now=now)
+        self.assertIs(cache.get(self.account_file, "douyin", now=now + 30), False)
+        self.assertIsNone(cache.get(self.account_file, "douyin", now=now + 61))
+        cache.set(self.account_file, "douyin", True, now=now)
+        self.assertIs(cache.get(self.account_file, "douyin", now=now + 61), True)
+
+        disabled = CookieValidationCache(None, {"douyin": 3600}, negative_ttl=0)
+        disabled.set(self.account_file, "douyin", False)
+        self.assertIsNone(disabled.get(self.account_file, "douyin"))
+
+    def test_invalidate_and_disabled_platform(self):
+        """遇到登录页时删除缓存，TTL 为 0 的平台不缓存"""
+        cache = CookieValidationCache(self.cache_file, {"douyin": 3600, "tencent": 0})
+        cache.set(self.account_file, "douyin", True)
+        cache.invalidate(self.account_file)
+        self.assertIsNone(cache.get(self.account_file, "douyin"))
+        self.assertIsNone(CookieValidationCache(self.cache_file).get(self.account_file, "douyin"))
+
+        cache.set(self.account_file, "tencent", True)
+        self.assertIsNone(cache.get(self.account_file, "tencent"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+import json
+import os
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到Python路径，确保可以导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.cookie_precheck import precheck_cookie_file
+
+
+def write_storage(path, cookies, mtime=None):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"cookies": cookies, "origins": []}, f)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+class TestCookiePrecheck(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.account_file = os.path.join(self.tmp_dir.name, "account.json")
+        self.now = time.time()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_expired_session_cookie(self):
+        """关键 cookie 已过期时直接判定失效"""
+        write_storage(self.account_file, [
+            {"name": "sessionid", "value": "x", "domain": ".douyin.com", "expires": self.now - 10},
+            {"name": "sid_guard", "value": "x", "domain": ".douyin.com", "expires": self.now + 86400 * 30},
+        ])
+        self.assertIs(precheck_cookie_file(self.account_file, "douyin", now=self.now), False)
+
+    def test_fresh_file_skips_browser(self):
+        """文件在 TTL 内更新且 cookie 远未过期时判定有效"""
+        write_storage(self.account_file, [
+            {"name": "sessionid", "value": "x", "domain": ".douyin.com", "expires": self.now + 86400 * 30},
+        ], mtime=self.now - 60)
+        self.assertIs(precheck_cookie_file(self.account_file, "douyin", fresh_ttl=3600, now=self.now), True)
+
+    def test_stale_file_is_inconclusive(self):
+        """文件超过 TTL 未更新时交给浏览器检查"""
+        write_storage(self.account_file, [
+            {"name": "sessionid", "value": "x", "domain": ".douyin.com", "expires": self.now + 86400 * 30},
+        ], mtime=self.now - 7200)
+        self.assertIsNone(precheck_cookie_file(self.account_file, "douyin", fresh_ttl=3600, now=self.now))
+        self.assertIsNone(precheck_cookie_file(self.account_file, "douyin", fresh_ttl=0, now=self.now))
+
+    def test_other_domain_and_missing_cookies(self):
+        """其他域名的同名 cookie 不参与判断，没有关键 cookie 时无法判断"""
+        write_storage(self.account_file, [
+            {"name": "sessionid", "value": "x", "domain": ".example.com", "expires": self.now - 10},
+        ])
+        self.assertIsNone(precheck_cookie_file(self.account_file, "douyin", now=self.now))
+        self.assertIsNone(precheck_cookie_file(os.path.join(self.tmp_dir.name, "missing.json"), "douyin"))
+
+    def test_biliup_cookie_format(self):
+        """兼容 biliup 登录生成的 cookie 文件"""
+        with open(self.account_file, 'w', encoding='utf-8') as f:
+            json.dump({"cookie_info": {"cookies": [{"name": "SESSDATA", "value": "x", "expires": int(self.now) - 10}]},
+                       "token_info": {}}, f)
+        self.assertIs(precheck_cookie_file(self.account_file, "bilibili", now=self.now), False)
+
+
+if __name__ == '__main__':
+    unittest.main()
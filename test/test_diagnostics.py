@@ -0,0 +1,98 @@
+import unittest
+import asyncio
+import base64
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# 添加项目根目录到Python路径，确保可以导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.diagnostics import DiagnosticsRecorder, DiskBudget, MODE_SCREENCAST, MODE_SCREENSHOT
+
+
+class FakeCDPSession(object):
+    def __init__(self):
+        self.handlers = {}
+        self.sent = []
+
+    def on(self, event, callback):
+        self.handlers[event] = callback
+
+    async def send(self, method, params=None):
+        self.sent.append(method)
+
+    async def detach(self):
+        self.sent.append("detach")
+
+
+class FakeContext(object):
+    def __init__(self, cdp):
+        self.cdp = cdp
+
+    async def new_cdp_session(self, page):
+        if self.cdp is None:
+            raise RuntimeError("CDP session is only available in Chromium")
+        return self.cdp
+
+
+class FakePage(object):
+    url = "https://example.com/upload"
+
+    def __init__(self, cdp=None):
+        self.context = FakeContext(cdp)
+        self.screenshots = 0
+
+    async def screenshot(self, **kwargs):
+        self.screenshots += 1
+        return b"jpeg-" + str(self.screenshots).encode() * 100
+
+
+class TestDiagnosticsRecorder(unittest.IsolatedAsyncioTestCase):
+    async def test_screenshot_rate_limit_and_ring_buffer(self):
+        page = FakePage()
+        recorder = await DiagnosticsRecorder(page, "douyin", capacity=3, interval=0).start()
+        self.assertEqual(recorder.mode, MODE_SCREENSHOT)
+        for _ in range(5):
+            await recorder.capture()
+        self.assertEqual(len(recorder.frames), 3)
+        # 间隔内的 capture 不截图
+        recorder.interval = 60
+        await recorder.capture()
+        self.assertEqual(page.screenshots, 5)
+
+    async def test_screencast_frames(self):
+        cdp = FakeCDPSession()
+        recorder = await DiagnosticsRecorder(FakePage(cdp), "tiktok", interval=0).start()
+        self.assertEqual(recorder.mode, MODE_SCREENCAST)
+        cdp.handlers["Page.screencastFrame"]({"sessionId": 1, "data": base64.b64encode(b"frame").decode()})
+        await asyncio.sleep(0)
+        self.assertEqual(recorder.frames[0][2], b"frame")
+        self.assertIn("Page.screencastFrameAck", cdp.sent)
+        await recorder.stop()
+        self.assertIn("Page.stopScreencast", cdp.sent)
+
+    async def test_flush_on_failure_with_budget(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            budget = DiskBudget(tmp_dir, budget_mb=0.001)
+            with self.assertRaises(RuntimeError):
+                async with DiagnosticsRecorder(FakePage(), "kuaishou", interval=0, budget=budget) as recorder:
+                    for _ in range(20):
+                        await recorder.capture()
+                    raise RuntimeError("publish failed")
+            files = list(Path(tmp_dir).rglob("*"))
+            self.assertTrue(any(path.suffix == ".txt" for path in files))
+            self.assertLessEqual(budget.used, budget.budget)
+            self.assertIn("publish failed", next(path for path in files if path.suffix == ".txt").read_text())
+
+    async def test_no_flush_on_success(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            budget = DiskBudget(tmp_dir)
+            async with DiagnosticsRecorder(FakePage(), "tencent", interval=0, budget=budget) as recorder:
+                await recorder.capture()
+            self.assertEqual(budget.used, 0)
+            self.assertEqual(list(Path(tmp_dir).iterdir()), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import unittest
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径，确保可以导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.folder_watcher import FolderWatcher, is_file_ready, wait_for_removed
+
+
+class TestFolderWatcher(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.folder = Path(self.tmp_dir.name).resolve()
+        (self.folder / "a.mp4").write_bytes(b"old")
+        (self.folder / "note.txt").write_text("x")
+
+    async def asyncTearDown(self):
+        self.tmp_dir.cleanup()
+
+    async def collect(self, watcher, count):
+        found = []
+        async for path in watcher.watch():
+            found.append(path)
+            if len(found) == 1:
+                # 已有文件返回后再写入新文件和一个被移入的文件
+                (self.folder / "b.mp4").write_bytes(b"new")
+                (self.folder / "._c.mp4").write_bytes(b"mac")
+                tmp_file = self.folder / "c.part"
+                tmp_file.write_bytes(b"moved")
+                os.rename(tmp_file, self.folder / "c.mp4")
+            if len(found) == count:
+                break
+        return found
+
+    async def check_mode(self, use_inotify):
+        watcher = FolderWatcher([self.folder], poll_interval=0.05, stable_seconds=0, use_inotify=use_inotify)
+        try:
+            found = await asyncio.wait_for(self.collect(watcher, 3), timeout=5)
+        finally:
+            watcher.close()
+        self.assertEqual(found[0], self.folder / "a.mp4")
+        self.assertEqual(sorted(found[1:]), [self.folder / "b.mp4", self.folder / "c.mp4"])
+        return watcher
+
+    async def test_polling(self):
+        """轮询模式能发现新写入和移入的文件，忽略不匹配的文件"""
+        watcher = await self.check_mode(False)
+        self.assertEqual(watcher.mode, "polling")
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "inotify 只在 Linux 上可用")
+    async def test_inotify(self):
+        """inotify 模式能发现新写入和移入的文件，忽略不匹配的文件"""
+        watcher = await self.check_mode(None)
+        self.assertEqual(watcher.mode, "inotify")
+
+    async def check_gates(self, use_inotify):
+        (self.folder / "doing.txt").write_text("")
+        (self.folder / "b.mp4.lock").write_text("")
+        (self.folder / "b.mp4").write_bytes(b"new")
+        watcher = FolderWatcher([self.folder], poll_interval=0.05, stable_seconds=0, use_inotify=use_inotify)
+        found = []
+
+        async def collect():
+            async for path in watcher.watch():
+                found.append(path)
+                if len(found) == 2:
+                    break
+
+        task = asyncio.create_task(collect())
+        try:
+            await asyncio.sleep(0.3)
+            self.assertEqual(found, [])
+            # 删除 doing.txt 后没有 .lock 的文件放行，删除 .lock 后其余文件放行
+            os.remove(self.folder / "doing.txt")
+            await asyncio.sleep(0.3)
+            self.assertEqual(found, [self.folder / "a.mp4"])
+            os.remove(self.folder / "b.mp4.lock")
+            await asyncio.wait_for(task, timeout=5)
+        finally:
+            task.cancel()
+            watcher.close()
+        self.assertEqual(found, [self.folder / "a.mp4", self.folder / "b.mp4"])
+
+    async def test_gates_polling(self):
+        """轮询模式下 doing.txt 和 .lock 删除后才返回被挡住的文件"""
+        await self.check_gates(False)
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "inotify 只在 Linux 上可用")
+    async def test_gates_inotify(self):
+        """inotify 模式下 doing.txt 和 .lock 删除后才返回被挡住的文件"""
+        await self.check_gates(None)
+
+
+class TestFileReady(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.folder = Path(self.tmp_dir.name)
+        self.video = self.folder / "a.mp4"
+        self.video.write_bytes(b"x")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_is_file_ready(self):
+        """刚写入的文件要等 mtime 稳定，.lock 和 doing.txt 存在时不可用"""
+        self.assertFalse(is_file_ready(self.video, stable_seconds=60))
+        self.assertTrue(is_file_ready(self.video, stable_seconds=0))
+        (self.folder / "a.mp4.lock").write_text("")
+        self.assertFalse(is_file_ready(self.video, stable_seconds=0))
+        os.remove(self.folder / "a.mp4.lock")
+        (self.folder / "doing.txt").write_text("")
+        self.assertFalse(is_file_ready(self.video, stable_seconds=0))
+
+    def test_wait_for_removed(self):
+        """文件被删除时立即返回，超时返回 False"""
+        doing_file = self.folder / "doing.txt"
+        doing_file.write_text("")
+        self.assertFalse(wait_for_removed(doing_file, timeout=0.1, poll_interval=0.05))
+        timer = threading.Timer(0.1, os.remove, args=(doing_file,))
+        timer.start()
+        started = time.monotonic()
+        self.assertTrue(wait_for_removed(doing_file, timeout=5, poll_interval=0.05))
+        self.assertLess(time.monotonic() - started, 2)
+        timer.join()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import unittest
+import asyncio
+import os
+import sys
+from unittest import mock
+
+# 添加项目根目录到Python路径，确保可以导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from uploader.tk_uploader import main_chrome
+from utils.page_state import BINDING_NAME, PageStateWatcher, wait_for_page_state
+
+
+class FakeFrame(object):
+    """记录注入的脚本，observer 的回调由测试手动触发"""
+
+    def __init__(self, page):
+        self.page = page
+        self.observers = {}
+        self.disconnected = []
+
+    async def evaluate(self, script, arg=None):
+        if isinstance(arg, list):
+            binding_name, token, states = arg
+            self.observers[token] = states
+        else:
+            self.disconnected.append(arg)
+
+    def fire(self, token, state):
+        self.page.bindings[BINDING_NAME](None, token, state)
+
+
+class FakePage(object):
+    def __init__(self):
+        self.bindings = {}
+        self.expose_calls = 0
+        self.main_frame = FakeFrame(self)
+
+    async def expose_binding(self, name, callback):
+        self.expose_calls += 1
+        self.bindings[name] = callback
+
+
+class TestPageStateWatcher(unittest.IsolatedAsyncioTestCase):
+    async def test_states_routed_to_watcher(self):
+        """页面推送的状态只进入对应 token 的队列，绑定每个页面只注册一次"""
+        page = FakePage()
+        async with PageStateWatcher(page, {"done": {"css": "button", "text": "发表"}}) as first, \
+                PageStateWatcher(page, {"error": [{"text": "上传失败"}]}) as second:
+            self.assertEqual(page.expose_calls, 1)
+            self.assertEqual(page.main_frame.observers[first.token], [["done", [{"css": "button", "text": "发表"}]]])
+            page.main_frame.fire(second.token, "error")
+            page.main_frame.fire(first.token, "done")
+            self.assertEqual(await first.next(timeout=1), "done")
+            self.assertEqual(await second.next(timeout=1), "error")
+        self.assertEqual(sorted(page.main_frame.disconnected), sorted([first.token, second.token]))
+        # 已停止的 watcher 不再接收状态
+        page.main_frame.fire(first.token, "done")
+        self.assertTrue(first.queue.empty())
+
+    async def test_custom_frame(self):
+        """状态在 iframe 里时 observer 注入到该 frame"""
+        page = FakePage()
+        frame = FakeFrame(page)
+        async with PageStateWatcher(page, {"done": {"css": "button"}}, frame=frame) as watcher:
+            self.assertIn(watcher.token, frame.observers)
+            self.assertNotIn(watcher.token, page.main_frame.observers)
+
+    async def test_wait_for_page_state_timeout(self):
+        page = FakePage()
+        with self.assertRaises(asyncio.TimeoutError):
+            await wait_for_page_state(page, {"done": {"text": "上传中", "absent": True}}, timeout=0.05)
+        self.assertEqual(len(page.main_frame.disconnected), 1)
+
+
+class ScriptedWatcher(object):
+    """依次返回预先给定的状态"""
+    def __init__(self, states):
+        self.states = list(states)
+
+    def __call__(self, page, states, frame=None):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        pass
+
+    async def next(self, timeout=None):
+        return self.states.pop(0)
+
+
+class FakeLocatorBase(object):
+    def __init__(self, counts):
+        self.counts = list(counts)
+
+    def locator(self, selector):
+        return self
+
+    async def count(self):
+        return self.counts.pop(0)
+
+
+class TestTiktokUploadStatus(unittest.IsolatedAsyncioTestCase):
+    async def detect(self, states, counts):
+        video = main_chrome.TiktokVideo("title", "a.mp4", [], 0, "account.json")
+        video.locator_base = FakeLocatorBase(counts)
+        retries = []
+
+        async def handle_upload_error(page):
+            retries.append(page)
+
+        video.handle_upload_error = handle_upload_error
+        with mock.patch.object(main_chrome, "PageStateWatcher", ScriptedWatcher(states)), \
+                mock.patch.object(main_chrome, "TIKTOK_UPLOAD_ERROR_GRACE", 0.05):
+            await video.detect_upload_status("page")
+        return retries
+
+    async def test_select_button_left_over_after_choosing_file(self):
+        """刚选完文件时残留的 Select file 按钮在宽限时间后已消失，不当作上传出错"""
+        self.assertEqual(await self.detect(["error", "done"], [0]), [])
+
+    async def test_real_error_retried(self):
+        """宽限时间后按钮仍在才重新选择文件"""
+        self.assertEqual(await self.detect(["error", "done"], [1]), ["page"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+import asyncio
+import os
+import sys
+
+# 添加项目根目录到Python路径，确保可以导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.base_social_media import PublishFailedError
+from utils.publish_confirm import PublishApi, PublishConfirmation, parse_publish_response
+
+API = PublishApi("/web/api/media/aweme/create", "status_code", (0,), ("item_id",))
+
+
+class FakeRequest(object):
+    def __init__(self, url, method="POST"):
+        self.url = url
+        self.method = method
+
+
+class FakeResponse(object):
+    def __init__(self, url, data, status=200):
+        self.url = url
+        self.request = FakeRequest(url)
+        self.status = status
+        self._data = data
+
+    async def json(self):
+        return self._data
+
+
+class FakePage(object):
+    def __init__(self):
+        self.listeners = {}
+        self.url_reached = asyncio.Event()
+
+    def on(self, event, callback):
+        self.listeners.setdefault(event, []).append(callback)
+
+    def remove_listener(self, event, callback):
+        self.listeners[event].remove(callback)
+
+    def emit(self, event, payload):
+        for callback in list(self.listeners.get(event, [])):
+            callback(payload)
+
+    async def wait_for_url(self, url, timeout=None):
+        await self.url_reached.wait()
+
+
+class TestParsePublishResponse(unittest.TestCase):
+    def test_success_with_nested_id(self):
+        result = parse_publish_response(API, 200, {"status_code": 0, "data": {"item_id": "7301"}})
+        self.assertTrue(result.success)
+        self.assertEqual(result.post_id, "7301")
+
+    def test_failure(self):
+        result = parse_publish_response(API, 200, {"status_code": 8, "status_msg": "标题包含敏感词"})
+        self.assertFalse(result.success)
+        self.assertEqual(result.message, "标题包含敏感词")
+        self.assertFalse(parse_publish_response(API, 502, None).success)
+
+
+class TestPublishConfirmation(unittest.IsolatedAsyncioTestCase):
+    async def test_response_resolves_with_post_id(self):
+        page = FakePage()
+        url = "https://creator.douyin.com/web/api/media/aweme/create/?a=1"
+        async with PublishConfirmation(page, API) as publish:
+            page.emit("request", FakeRequest(url))
+            self.assertTrue(publish.request_sent)
+            # 其他接口和 GET 请求不影响结果
+            page.emit("response", FakeResponse("https://creator.douyin.com/web/api/other", {"status_code": 1}))
+            page.emit("response", FakeResponse(url, {"status_code": 0, "item_id": "42"}))
+            result = await publish.wait(timeout=1, fallback_url="https://creator.douyin.com/manage**")
+        self.assertEqual((result.success, result.post_id, result.source), (True, "42", "response"))
+        self.assertEqual(page.listeners, {"request": [], "response": []})
+
+    async def test_failure_raises(self):
+        page = FakePage()
+        url = "https://creator.douyin.com/web/api/media/aweme/create/"
+        async with PublishConfirmation(page, API) as publish:
+            page.emit("response", FakeResponse(url, {"status_code": 4, "status_msg": "发布过于频繁"}))
+            with self.assertRaises(PublishFailedError):
+                await publish.wait(timeout=1)
+
+    async def test_timeout_and_fallback(self):
+        page = FakePage()
+        async with PublishConfirmation(page, API) as publish:
+            # 请求还没发出，超时后返回 None 由调用方重新点击
+            self.assertIsNone(await publish.wait(timeout=0.05, fallback_url="https://x/manage**"))
+            page.url_reached.set()
+            result = await publish.wait(timeout=1, fallback_url="https://x/manage**")
+        self.assertEqual((result.success, result.post_id, result.source), (True, None, "fallback"))
+
+
+if __name__ == '__main__':
+    unittest.main()
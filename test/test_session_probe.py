@@ -0,0 +1,101 @@
+import unittest
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 添加项目根目录到Python路径，确保可以导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.session_probe import probe_session, SESSION_PROBES
+
+
+class FakeCreatorHandler(BaseHTTPRequestHandler):
+    """模拟平台的已登录接口：携带 sessionid=good 时返回用户信息"""
+
+    def do_GET(self):
+        if self.path == "/error":
+            self.send_response(502)
+            self.end_headers()
+            return
+        if self.path == "/redirect":
+            self.send_response(302)
+            self.send_header("Location", "https://example.com/login?next=/")
+            self.end_headers()
+            return
+        if "sessionid=good" in self.headers.get("Cookie", ""):
+            body = {"status_code": 0, "user": {"uid": "1"}}
+        else:
+            body = {"status_code": 8, "status_msg": "not login"}
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestSessionProbe(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeCreatorHandler)
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.account_file = os.path.join(self.tmp_dir.name, "account.json")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_cookie(self, value, expires=-1, domain=".douyin.com"):
+        with open(self.account_file, 'w', encoding='utf-8') as f:
+            json.dump({"cookies": [{"name": "sessionid", "value": value, "domain": domain, "expires": expires}],
+                       "origins": []}, f)
+
+    def test_logged_in(self):
+        """接口返回用户信息时判定有效"""
+        self.write_cookie("good")
+        self.assertIs(probe_session(self.account_file, "douyin", url=self.base_url + "/user"), True)
+
+    def test_logged_out(self):
+        """接口返回未登录时判定失效"""
+        self.write_cookie("bad")
+        self.assertIs(probe_session(self.account_file, "douyin", url=self.base_url + "/user"), False)
+
+    def test_expired_or_foreign_cookie_not_sent(self):
+        """过期的 cookie 和其他域名的 cookie 不会被发送"""
+        self.write_cookie("good", expires=time.time() - 10)
+        self.assertEqual(SESSION_PROBES["douyin"].build_cookie_header(self.account_file), "")
+        self.assertIs(probe_session(self.account_file, "douyin", url=self.base_url + "/user"), False)
+        self.write_cookie("good", domain=".example.com")
+        self.assertEqual(SESSION_PROBES["douyin"].build_cookie_header(self.account_file), "")
+
+    def test_inconclusive(self):
+        """服务端错误、非登录跳转、缺少文件和没有探测接口的平台都交给浏览器检查"""
+        self.write_cookie("good")
+        self.assertIsNone(probe_session(self.account_file, "douyin", url=self.base_url + "/error"))
+        self.assertIsNone(probe_session(self.account_file, "bilibili"))
+        self.assertIsNone(probe_session(os.path.join(self.tmp_dir.name, "missing.json"), "douyin",
+                                        url=self.base_url + "/user"))
+
+    def test_login_redirect(self):
+        """被重定向到登录页时判定失效"""
+        self.write_cookie("good")
+        self.assertIs(probe_session(self.account_file, "douyin", url=self.base_url + "/redirect"), False)
+
+
+if __name__ == '__main__':
+    unittest.main()
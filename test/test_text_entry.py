@@ -0,0 +1,91 @@
+import unittest
+import os
+import sys
+
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+# 添加项目根目录到Python路径，确保可以导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.text_entry import add_hashtags, insert_text, type_with_suggestion
+
+
+class FakeKeyboard(object):
+    def __init__(self, calls):
+        self.calls = calls
+
+    async def insert_text(self, text):
+        self.calls.append(("insert", text))
+
+    async def type(self, text):
+        self.calls.append(("type", text))
+
+    async def press(self, key):
+        self.calls.append(("press", key))
+
+
+class FakeLocator(object):
+    def __init__(self, page):
+        self.page = page
+        self.first = self
+
+    async def wait_for(self, state=None, timeout=None):
+        self.page.calls.append(("wait", timeout))
+        if not self.page.popup:
+            raise PlaywrightTimeoutError("popup not shown")
+
+
+class FakePage(object):
+    def __init__(self, popup=True):
+        self.calls = []
+        self.popup = popup
+        self.keyboard = FakeKeyboard(self.calls)
+
+    def locator(self, selector):
+        return FakeLocator(self)
+
+
+class TestTextEntry(unittest.IsolatedAsyncioTestCase):
+    async def test_insert_text(self):
+        page = FakePage()
+        await insert_text(page, "标题", clear=True)
+        self.assertEqual(page.calls, [("press", "Control+KeyA"), ("press", "Delete"), ("insert", "标题")])
+
+    async def test_hashtags_without_suggestion(self):
+        """不需要联想弹窗的平台整段写入，不产生逐字按键"""
+        page = FakePage()
+        self.assertEqual(await add_hashtags(page, ["美食", "旅行"]), 2)
+        self.assertEqual(page.calls, [("insert", "#美食"), ("press", "Space"),
+                                      ("insert", "#旅行"), ("press", "Space")])
+
+    async def test_hashtags_with_suggestion(self):
+        """只有最后一个字符用按键输入，等弹窗出现后再确认"""
+        page = FakePage()
+        await add_hashtags(page, ["美食"], suggestion="div.popup", timeout=2)
+        self.assertEqual(page.calls, [("insert", "#美"), ("type", "食"), ("wait", 2000), ("press", "Space")])
+
+    async def test_suggestion_timeout(self):
+        page = FakePage(popup=False)
+        self.assertFalse(await type_with_suggestion(page, "杭州市", "div.listbox", timeout=0.1))
+        self.assertEqual(page.calls[:2], [("insert", "杭州"), ("type", "市")])
+
+    async def test_missing_popup_falls_back(self):
+        """弹窗一次都没出现时只等待一次，后面的话题按键输入后直接确认"""
+        page = FakePage(popup=False)
+        self.assertEqual(await add_hashtags(page, ["美食", "旅行", "日常"], suggestion="div.popup", timeout=1), 3)
+        self.assertEqual([call for call in page.calls if call[0] == "wait"], [("wait", 1000)])
+        self.assertEqual(page.calls[-3:], [("insert", "#日"), ("type", "常"), ("press", "Space")])
+
+    async def test_suggestion_inside_frame(self):
+        """表单在 iframe 里时在对应的 frame 中等待弹窗，不会每个话题都等到超时"""
+        page = FakePage(popup=False)
+        frame = FakePage(popup=True)
+        frame.calls = page.calls
+        await add_hashtags(page, ["美食", "旅行"], suggestion="div.popup", timeout=3, root=frame)
+        self.assertEqual(page.calls, [("insert", "#美"), ("type", "食"), ("wait", 3000), ("press", "Space"),
+                                      ("insert", "#旅"), ("type", "行"), ("wait", 3000), ("press", "Space")])
+        self.assertTrue(await type_with_suggestion(page, "#美食", "div.popup", timeout=3, root=frame))
+        self.assertFalse(await type_with_suggestion(page, "#美食", "div.popup", timeout=3))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+import os
+import sys
+import tempfile
+import threading
+
+# 添加项目根目录到Python路径，确保可以导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.upload_ledger import UploadLedger, STATUS_DONE, STATUS_FAILED
+
+
+class TestUploadLedger(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, "ledger.db")
+        self.ledger = UploadLedger(self.db_path)
+
+    def tearDown(self):
+        self.ledger.close()
+        self.tmp_dir.cleanup()
+
+    def test_job_lifecycle(self):
+        """失败后重试会累加尝试次数，成功后记录帖子 id"""
+        video = os.path.join(self.tmp_dir.name, "a.mp4")
+        job_id = self.ledger.start(video, "douyin", "xiaoA", content_hash="h1")
+        self.ledger.mark_failed(job_id, "timeout")
+        self.assertEqual(self.ledger.get_job(video, "douyin", "xiaoA")["status"], STATUS_FAILED)
+        self.assertFalse(self.ledger.is_done(video, "douyin", "xiaoA"))
+
+        self.assertEqual(self.ledger.start(video, "douyin", "xiaoA"), job_id)
+        self.ledger.mark_done(job_id, post_id="123")
+        job = self.ledger.get_job(video, "douyin", "xiaoA")
+        self.assertEqual((job["status"], job["attempts"], job["post_id"], job["content_hash"]),
+                         (STATUS_DONE, 2, "123", "h1"))
+        self.assertTrue(self.ledger.is_done(video, "douyin", "xiaoA"))
+        # 不同平台、账号互不影响
+        self.assertFalse(self.ledger.is_done(video, "kuaishou", "xiaoA"))
+        self.assertFalse(self.ledger.is_done(video, "douyin", "xiaoB"))
+        self.assertEqual(self.ledger.find_done_by_hash("h1", "douyin", "xiaoA")["id"], job_id)
+
+    def test_find_done_by_path_or_content(self):
+        """改名或复制到其他目录的文件按内容哈希识别为已上传"""
+        self.ledger.record_done("/videos/a.mp4", "bilibili", "xiaoA", content_hash="h1")
+        self.assertIsNotNone(self.ledger.find_done("/videos/a.mp4", "bilibili", "xiaoA"))
+        self.assertEqual(self.ledger.find_done("/other/b.mp4", "bilibili", "xiaoA", "h1")["file_path"],
+                         os.path.abspath("/videos/a.mp4"))
+        self.assertIsNone(self.ledger.find_done("/other/b.mp4", "bilibili", "xiaoA"))
+        self.assertIsNone(self.ledger.find_done("/other/b.mp4", "bilibili", "xiaoB", "h1"))
+        # 同一路径写入了新内容
+        self.assertIsNone(self.ledger.find_done("/videos/a.mp4", "bilibili", "xiaoA", "h2"))
+        self.ledger.record_done("/videos/old.mp4", "bilibili", "xiaoA")
+        self.assertIsNotNone(self.ledger.find_done("/videos/old.mp4", "bilibili", "xiaoA", "h3"))
+
+    def test_published_hash_survives_path_reuse(self):
+        """同一路径写入新内容并上传后，旧内容改名后的副本仍被识别为已上传"""
+        self.ledger.record_done("/videos/a.mp4", "bilibili", "xiaoA", content_hash="h1")
+        self.ledger.record_done("/videos/a.mp4", "bilibili", "xiaoA", content_hash="h2")
+        self.assertEqual(self.ledger.get_job("/videos/a.mp4", "bilibili", "xiaoA")["content_hash"], "h2")
+        for content_hash in ("h1", "h2"):
+            self.assertIsNotNone(self.ledger.find_done("/videos/copy.mp4", "bilibili", "xiaoA", content_hash))
+        # 上传失败的内容不算已发布
+        job_id = self.ledger.start("/videos/b.mp4", "bilibili", "xiaoA", content_hash="h3")
+        self.ledger.mark_failed(job_id, "timeout")
+        self.assertIsNone(self.ledger.find_done_by_hash("h3", "bilibili", "xiaoA"))
+
+    def test_fingerprint_cache(self):
+        """文件大小或修改时间变化后缓存的指纹失效"""
+        self.ledger.save_fingerprints([("/videos/a.mp4", 10, 100, "sha256:x")])
+        self.assertEqual(self.ledger.get_fingerprint("/videos/a.mp4", 10, 100), "sha256:x")
+        self.assertIsNone(self.ledger.get_fingerprint("/videos/a.mp4", 10, 101))
+        self.ledger.save_fingerprints([("/videos/a.mp4", 11, 101, "sha256:y")])
+        self.assertEqual(self.ledger.get_fingerprint("/videos/a.mp4", 11, 101), "sha256:y")
+
+    def test_import_updone_file_once(self):
+        """旧的 updone.txt 只导入一次，忽略创建时写入的时间行"""
+        updone_file = os.path.join(self.tmp_dir.name, "sun_updone.txt")
+        with open(updone_file, 'w', encoding='utf-8') as f:
+            f.write("Doing task started at: 2024-01-01 00:00:00\na.mp4\n\nb.mp4\n")
+        folder = os.path.join(self.tmp_dir.name, "videos")
+        self.assertEqual(self.ledger.import_updone_file(updone_file, folder, "bilibili", "account"), 2)
+        self.assertEqual(self.ledger.import_updone_file(updone_file, folder, "bilibili", "account"), 0)
+        self.assertTrue(self.ledger.is_done(os.path.join(folder, "b.mp4"), "bilibili", "account"))
+        self.assertEqual(self.ledger.count(platform="bilibili", status=STATUS_DONE), 2)
+        self.assertEqual(self.ledger.import_updone_file(os.path.join(folder, "missing.txt"), folder, "bilibili",
+                                                        "account"), 0)
+
+    def test_concurrent_writers(self):
+        """多个连接同时写入同一个账本"""
+        def write(index):
+            ledger = UploadLedger(self.db_path)
+            for i in range(20):
+                ledger.record_done(f"/videos/{index}_{i}.mp4", "douyin", "xiaoA")
+            ledger.close()
+
+        threads = [threading.Thread(target=write, args=(index,)) for index in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.ledger.count(status=STATUS_DONE), 80)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import unittest
+import asyncio
+import os
+import sys
+import tempfile
+
+# 添加项目根目录到Python路径，确保可以导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.upload_ledger import UploadLedger
+from utils.upload_orchestrator import UploadJob, UploadOrchestrator, JOB_DONE, JOB_FAILED, JOB_SKIPPED
+
+
+class FakeApp(object):
+    """记录同时运行的任务数，模拟 DouYinVideo 等上传对象"""
+    running = []
+    peak = 0
+
+    def __init__(self, account_file, file_path, fail=False):
+        self.account_file = account_file
+        self.file_path = file_path
+        self.fail = fail
+
+    async def main(self):
+        FakeApp.running.append(self)
+        FakeApp.peak = max(FakeApp.peak, len(FakeApp.running))
+        try:
+            # 同一个账号不能同时有两个任务
+            accounts = [app.account_file for app in FakeApp.running]
+            assert accounts.count(self.account_file) == 1
+            await asyncio.sleep(0.02)
+            if self.fail:
+                raise RuntimeError("upload failed")
+        finally:
+            FakeApp.running.remove(self)
+
+
+class TestUploadOrchestrator(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        FakeApp.running = []
+        FakeApp.peak = 0
+
+    async def test_limits_and_account_mutex(self):
+        """全局并发受限，同一账号的任务串行执行"""
+        jobs = [UploadJob("douyin", FakeApp(f"/cookies/{index % 3}.json", f"/videos/{index}.mp4"))
+                for index in range(9)]
+        orchestrator = UploadOrchestrator(max_concurrency=2, platform_limits={})
+        await orchestrator.run(jobs)
+        self.assertTrue(all(job.status == JOB_DONE for job in jobs))
+        self.assertEqual(FakeApp.peak, 2)
+
+    async def test_platform_limit(self):
+        """每个平台的并发数单独受限"""
+        jobs = [UploadJob("douyin" if index % 2 else "kuaishou",
+                          FakeApp(f"/cookies/{index}.json", f"/videos/{index}.mp4")) for index in range(8)]
+        await UploadOrchestrator(max_concurrency=8, platform_limits={"douyin": 1, "kuaishou": 1}).run(jobs)
+        self.assertEqual(FakeApp.peak, 2)
+
+    async def test_failure_and_ledger(self):
+        """失败的任务不影响其他任务，账本中已完成的文件会被跳过"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            ledger = UploadLedger(os.path.join(tmp_dir, "ledger.db"))
+            ledger.record_done("/videos/0.mp4", "douyin", "a")
+            jobs = [UploadJob("douyin", FakeApp("/cookies/a.json", "/videos/0.mp4"), "a"),
+                    UploadJob("douyin", FakeApp("/cookies/a.json", "/videos/1.mp4", fail=True), "a"),
+                    UploadJob("douyin", FakeApp("/cookies/a.json", "/videos/2.mp4"), "a")]
+            await UploadOrchestrator(ledger=ledger).run(jobs)
+            self.assertEqual([job.status for job in jobs], [JOB_SKIPPED, JOB_FAILED, JOB_DONE])
+            self.assertEqual(ledger.get_job("/videos/1.mp4", "douyin", "a")["status"], "failed")
+            self.assertTrue(ledger.is_done("/videos/2.mp4", "douyin", "a"))
+            ledger.close()
+
+    async def test_duplicate_content_skipped(self):
+        """改名、复制到其他目录的同一个视频只上传一次，不同账号各自上传"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            ledger = UploadLedger(os.path.join(tmp_dir, "ledger.db"))
+            paths = {}
+            for name, data in (("old.mp4", b"old"), ("a/x.mp4", b"same"), ("b/x.mp4", b"same"),
+                               ("b/renamed.mp4", b"old")):
+                paths[name] = os.path.join(tmp_dir, name)
+                os.makedirs(os.path.dirname(paths[name]), exist_ok=True)
+                with open(paths[name], 'wb') as f:
+                    f.write(data)
+            orchestrator = UploadOrchestrator(ledger=ledger)
+            await orchestrator.run([UploadJob("douyin", FakeApp("/cookies/a.json", paths["old.mp4"]), "a")])
+            jobs = [UploadJob("douyin", FakeApp("/cookies/a.json", paths["a/x.mp4"]), "a"),
+                    UploadJob("douyin", FakeApp("/cookies/a.json", paths["b/x.mp4"]), "a"),
+                    UploadJob("douyin", FakeApp("/cookies/b.json", paths["b/x.mp4"]), "b"),
+                    UploadJob("douyin", FakeApp("/cookies/a.json", paths["b/renamed.mp4"]), "a")]
+            await orchestrator.run(jobs)
+            self.assertEqual([job.status for job in jobs], [JOB_DONE, JOB_SKIPPED, JOB_DONE, JOB_SKIPPED])
+            self.assertEqual(ledger.get_job(paths["a/x.mp4"], "douyin", "a")["content_hash"], jobs[0].content_hash)
+            self.assertIsNone(ledger.get_job(paths["b/x.mp4"], "douyin", "a"))
+            ledger.close()
+
+    async def test_same_cookie_name_in_different_dirs(self):
+        """不传账号名时按 cookie 文件的绝对路径区分账号，不同目录下的 account.json 互不影响"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            ledger = UploadLedger(os.path.join(tmp_dir, "ledger.db"))
+            jobs = [UploadJob("douyin", FakeApp("/cookies/first/account.json", "/videos/0.mp4")),
+                    UploadJob("douyin", FakeApp("/cookies/second/account.json", "/videos/0.mp4"))]
+            self.assertNotEqual(jobs[0].account, jobs[1].account)
+            await UploadOrchestrator(max_concurrency=2, platform_limits={}, ledger=ledger).run(jobs)
+            self.assertEqual([job.status for job in jobs], [JOB_DONE, JOB_DONE])
+            self.assertEqual(FakeApp.peak, 2)
+            self.assertEqual(UploadJob("douyin", FakeApp("/cookies/a.json", "/videos/0.mp4"), "xiaoA").account,
+                             "xiaoA")
+            ledger.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+import asyncio
+import os
+import sys
+
+# 添加项目根目录到Python路径，确保可以导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.upload_steps import StepPipeline
+
+
+class TestStepPipeline(unittest.IsolatedAsyncioTestCase):
+    async def test_form_filled_during_transfer(self):
+        """表单步骤在传输期间执行且依次进行，发布等所有步骤完成"""
+        events = []
+        transfer_done = asyncio.Event()
+        running = []
+
+        async def transfer():
+            events.append("transfer start")
+            await transfer_done.wait()
+            events.append("transfer done")
+
+        def form_step(name):
+            async def step():
+                running.append(name)
+                self.assertEqual(len(running), 1)
+                await asyncio.sleep(0.01)
+                events.append(name)
+                running.remove(name)
+                if name == "schedule":
+                    transfer_done.set()
+            return step
+
+        async def publish():
+            events.append("publish")
+
+        pipeline = StepPipeline("test")
+        pipeline.add("transfer", transfer, exclusive=False)
+        pipeline.add("title", form_step("title"))
+        pipeline.add("tags", form_step("tags"), after=("title",))
+        pipeline.add("schedule", form_step("schedule"))
+        pipeline.add("publish", publish, after=tuple(pipeline.steps))
+        durations = await pipeline.run()
+
+        self.assertLess(events.index("title"), events.index("transfer done"))
+        self.assertLess(events.index("title"), events.index("tags"))
+        self.assertEqual(events[-1], "publish")
+        self.assertEqual(set(durations), {"transfer", "title", "tags", "schedule", "publish"})
+
+    async def test_failure_cancels_other_steps(self):
+        cancelled = asyncio.Event()
+
+        async def transfer():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        async def broken():
+            raise RuntimeError("selector not found")
+
+        async def publish():
+            self.fail("publish must not run")
+
+        pipeline = StepPipeline("test")
+        pipeline.add("transfer", transfer, exclusive=False)
+        pipeline.add("title", broken)
+        pipeline.add("publish", publish, after=("transfer", "title"))
+        with self.assertRaises(RuntimeError):
+            await pipeline.run()
+        self.assertTrue(cancelled.is_set())
+
+    async def test_invalid_dependencies(self):
+        async def noop():
+            pass
+
+        with self.assertRaises(ValueError):
+            await StepPipeline("test").add("publish", noop, after=("missing",)).run()
+        with self.assertRaises(ValueError):
+            await StepPipeline("test").add("a", noop, after=("b",)).add("b", noop, after=("a",)).run()
+        with self.assertRaises(ValueError):
+            StepPipeline("test").add("a", noop).add("a", noop)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import unittest
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import requests
+
+# 添加项目根目录到Python路径，确保可以导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from uploader.xhs_uploader import main as xhs_main
+from uploader.xhs_uploader.sign_server import LatencyHistogram, create_server
+from uploader.xhs_uploader.signer import XhsSigner
+
+
+class StubSigner(XhsSigner):
+    """不启动浏览器，直接在调用线程里返回签名；blocker 被设置前签名会阻塞"""
+
+    def __init__(self, blocker: threading.Event = None):
+        super().__init__()
+        self.blocker = blocker
+        self.calls = []
+
+    def sign(self, uri, data=None, a1="", web_session=""):
+        self.calls.append(a1)
+        if self.blocker is not None:
+            self.blocker.wait(5)
+        if uri == "/boom":
+            raise RuntimeError("window._webmsxyw is not a function")
+        return {"x-s": f"{a1}:{uri}", "x-t": "1700000000"}
+
+    def close(self):
+        pass
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    def test_buckets_and_quantiles(self):
+        histogram = LatencyHistogram(buckets=(10, 100))
+        for ms in (1, 2, 3, 50, 5000):
+            histogram.observe(ms)
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot["count"], 5)
+        self.assertEqual(snapshot["buckets"], {"le_10": 3, "le_100": 1, "le_inf": 1})
+        self.assertEqual(snapshot["p50_ms"], 10)
+        self.assertIsNone(snapshot["p99_ms"])
+        self.assertIsNone(LatencyHistogram().quantile(0.5))
+
+
+class TestSignServer(unittest.TestCase):
+    def start_server(self, workers=2, max_pending=8, blocker=None):
+        server = create_server("127.0.0.1", 0, workers=workers, max_pending=max_pending,
+                               signer_factory=lambda: StubSigner(blocker))
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+
+        def stop():
+            if blocker is not None:
+                blocker.set()
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+        self.addCleanup(stop)
+        return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+    def test_sign_routes_a1_to_the_same_worker(self):
+        server, url = self.start_server(workers=3)
+        with mock.patch.object(xhs_main, "XHS_SERVER", url):
+            for _ in range(3):
+                for a1 in ("a", "b", "c"):
+                    self.assertEqual(xhs_main.sign("/api/x", {"k": 1}, a1=a1),
+                                     {"x-s": f"{a1}:/api/x", "x-t": "1700000000"})
+        for signer in server.pool.signers:
+            # 每个 a1 只出现在一个 worker 里
+            self.assertTrue(all(a1 not in other.calls
+                                for other in server.pool.signers if other is not signer
+                                for a1 in set(signer.calls)))
+        metrics = requests.get(f"{url}/metrics", timeout=5).json()
+        self.assertEqual(metrics["requests"], 9)
+        self.assertEqual(metrics["latency"]["count"], 9)
+        self.assertEqual(metrics["workers"], 3)
+
+    def test_rejects_when_queue_full(self):
+        blocker = threading.Event()
+        server, url = self.start_server(workers=1, max_pending=2, blocker=blocker)
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            pending = [pool.submit(requests.post, f"{url}/sign", json={"uri": "/api", "a1": "a"}, timeout=10)
+                       for _ in range(2)]
+            while len(server.pool.signers[0].calls) < 2:
+                blocker.wait(0.01)
+            response = requests.post(f"{url}/sign", json={"uri": "/api", "a1": "a"}, timeout=10)
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response.headers["Retry-After"], "1")
+            blocker.set()
+            self.assertEqual([future.result().status_code for future in pending], [200, 200])
+        metrics = requests.get(f"{url}/metrics", timeout=5).json()
+        self.assertEqual(metrics["rejected"], 1)
+
+    def test_errors_and_bad_requests(self):
+        server, url = self.start_server()
+        self.assertEqual(requests.post(f"{url}/sign", json={"uri": "/boom"}, timeout=5).status_code, 500)
+        self.assertEqual(requests.post(f"{url}/sign", data=b"not json", timeout=5).status_code, 400)
+        self.assertEqual(requests.get(f"{url}/health", timeout=5).json(), {"status": "ok"})
+        self.assertEqual(server.pool.metrics()["errors"], 1)
+
+    def test_client_retries_busy_server(self):
+        server, url = self.start_server(workers=1)
+        # 第一次排队已满返回 503，客户端按 Retry-After 退避后重试成功
+        busy_then_ok = [None, {"x-s": "s", "x-t": "t"}]
+        with mock.patch.object(server.pool, "try_sign", side_effect=busy_then_ok) as try_sign, \
+                mock.patch.object(xhs_main, "XHS_SERVER", url):
+            self.assertEqual(xhs_main.sign("/api", a1="a"), {"x-s": "s", "x-t": "t"})
+        self.assertEqual(try_sign.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# 添加项目根目录到Python路径，确保可以导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from uploader.xhs_uploader.signer import SignPage, XhsSigner
+
+
+class FakeSigner(XhsSigner):
+    """用假的页面代替浏览器，记录每次调用所在的线程"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.threads = set()
+        self.fail_next = 0
+        self.closed = []
+
+    def _start_browser(self):
+        self.threads.add(threading.get_ident())
+
+    def _stop_browser(self):
+        self.threads.add(threading.get_ident())
+
+    def _open_page(self, a1):
+        self.threads.add(threading.get_ident())
+        return SignPage(a1, context=None, page=None)
+
+    def _reload_page(self, sign_page):
+        self.threads.add(threading.get_ident())
+        sign_page.loaded_at = time.monotonic()
+
+    def _close_page(self, sign_page):
+        self.closed.append(sign_page.a1)
+
+    def _evaluate(self, sign_page, uri, data):
+        self.threads.add(threading.get_ident())
+        if self.fail_next:
+            self.fail_next -= 1
+            raise RuntimeError("window._webmsxyw is not a function")
+        return {"X-s": f"{sign_page.a1}:{uri}", "X-t": 1700000000}
+
+
+class TestXhsSigner(unittest.TestCase):
+    def test_warm_page_per_a1_from_many_threads(self):
+        signer = FakeSigner(max_pages=2)
+        try:
+            with ThreadPoolExecutor(8) as pool:
+                results = list(pool.map(lambda index: signer.sign(f"/api/{index}", a1=f"a1-{index % 2}"), range(40)))
+            self.assertEqual(results[3], {"x-s": "a1-1:/api/3", "x-t": "1700000000"})
+            # 每个 a1 只打开一次页面，所有浏览器操作都在同一个签名线程里
+            self.assertEqual(signer.stats["page_loads"], 2)
+            self.assertEqual(signer.stats["signs"], 40)
+            self.assertEqual(len(signer.threads), 1)
+            self.assertNotIn(threading.get_ident(), signer.threads)
+            # 超过 max_pages 时关闭最久未使用的页面
+            signer.sign("/api/x", a1="a1-2")
+            self.assertEqual(len(signer.pages), 2)
+            self.assertEqual(len(signer.closed), 1)
+        finally:
+            signer.close()
+        self.assertEqual(len(signer.pages), 0)
+
+    def test_stale_page_reloaded_and_retry(self):
+        signer = FakeSigner()
+        try:
+            signer.sign("/api/1", a1="a")
+            # 签名失败时刷新页面重试
+            signer.fail_next = 1
+            self.assertEqual(signer.sign("/api/2", a1="a")["x-s"], "a:/api/2")
+            self.assertEqual(signer.stats["reloads"], 1)
+            # 全部失败时抛出异常
+            signer.fail_next = 10
+            with self.assertRaises(Exception):
+                signer.sign("/api/3", a1="a")
+            # 过期的页面在签名前刷新
+            signer.fail_next = 0
+            signer.page_ttl = -1
+            signer.sign("/api/4", a1="a")
+            self.assertGreaterEqual(signer.stats["reloads"], 2)
+        finally:
+            signer.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
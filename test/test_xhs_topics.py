@@ -0,0 +1,77 @@
+import unittest
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径，确保可以导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from uploader.xhs_uploader.topics import TopicCache, resolve_topics
+
+
+class FakeClient(object):
+    def __init__(self, topics: dict, fail: set = None):
+        self.topics = topics
+        self.fail = fail or set()
+        self.calls = []
+
+    def get_suggest_topic(self, keyword):
+        self.calls.append(keyword)
+        if keyword in self.fail:
+            raise ConnectionError("timeout")
+        topic = self.topics.get(keyword)
+        return [{"id": f"id-{keyword}", "name": topic}] if topic else []
+
+
+class TestTopicCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache_file = Path(self.tmpdir.name) / "topics.json"
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_distinct_tags_resolved_once_and_persisted(self):
+        client = FakeClient({"旅行": "旅行日记"})
+        cache = TopicCache(self.cache_file)
+        topics = resolve_topics(client, ["旅行", "#旅行", "不存在", "旅行"], cache)
+        self.assertEqual(topics["旅行"], {"id": "id-旅行", "name": "旅行日记", "type": "topic"})
+        self.assertIsNone(topics["不存在"])
+        self.assertEqual(client.calls, ["旅行", "不存在"])
+
+        # 另一个进程(另一个账号)读取同一缓存文件，正负结果都不再请求
+        other = FakeClient({})
+        topics = resolve_topics(other, ["旅行", "不存在"], TopicCache(self.cache_file))
+        self.assertEqual(topics["旅行"]["name"], "旅行日记")
+        self.assertIsNone(topics["不存在"])
+        self.assertEqual(other.calls, [])
+
+    def test_ttl_and_negative_ttl(self):
+        cache = TopicCache(None, ttl=100, negative_ttl=10)
+        now = time.time()
+        cache.set("a", {"name": "A"}, now=now - 50)
+        cache.set("b", None, now=now - 50)
+        client = FakeClient({"a": "A2", "b": "B"})
+        topics = resolve_topics(client, ["a", "b"], cache)
+        self.assertEqual(topics["a"], {"name": "A"})
+        self.assertEqual(topics["b"]["name"], "B")
+        self.assertEqual(client.calls, ["b"])
+
+    def test_failed_lookup_not_cached(self):
+        cache = TopicCache(None)
+        client = FakeClient({"a": "A"}, fail={"a"})
+        self.assertEqual(resolve_topics(client, ["a"], cache), {"a": None})
+        client.fail.clear()
+        self.assertEqual(resolve_topics(client, ["a"], cache)["a"]["name"], "A")
+        self.assertEqual(client.calls, ["a", "a"])
+
+    def test_cached_topic_is_a_copy(self):
+        cache = TopicCache(None)
+        client = FakeClient({"a": "A"})
+        resolve_topics(client, ["a"], cache)["a"]["name"] = "changed"
+        self.assertEqual(resolve_topics(client, ["a"], cache)["a"]["name"], "A")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# 添加项目根目录到Python路径，确保可以导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from uploader.zhihu_uploader.content import HtmlCache, render_markdown, sanitize_html
+
+
+class TestZhihuContent(unittest.TestCase):
+    def test_render_markdown(self):
+        html = render_markdown("# 标题\n\n正文 **加粗**\n\n- 一\n- 二\n\n```\ncode <x>\n```\n")
+        self.assertIn("<h1>标题</h1>", html)
+        self.assertIn("<strong>加粗</strong>", html)
+        self.assertIn("<li>一</li>", html)
+        self.assertIn("code &lt;x&gt;", html)
+
+    def test_sanitize(self):
+        html = sanitize_html('<p onclick="x()">a<script>alert(1)</script><a href="javascript:alert(1)">b</a>'
+                             '<img src="images/c.png" onerror="x()"><div>d</div></p>')
+        self.assertEqual(html, '<p>a<a>b</a><img src="images/c.png">d</p>')
+        self.assertEqual(sanitize_html('<a href="https://zhihu.com" target="_blank">z</a>'),
+                         '<a href="https://zhihu.com">z</a>')
+
+    def test_cache_by_content_hash(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            article = Path(tmp_dir) / "article.md"
+            article.write_text("hello *world*", encoding="utf-8")
+            cache = HtmlCache(Path(tmp_dir) / "cache")
+            first = cache.get(article)
+            # 内容不变时命中缓存，即使文件被改名
+            renamed = article.rename(Path(tmp_dir) / "renamed.md")
+            self.assertEqual(cache.get(renamed), first)
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+            renamed.write_text("changed", encoding="utf-8")
+            self.assertEqual(cache.get(renamed), "<p>changed</p>")
+            self.assertEqual(cache.misses, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
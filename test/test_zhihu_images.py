@@ -0,0 +1,125 @@
+import unittest
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# 添加项目根目录到Python路径，确保可以导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from uploader.zhihu_uploader.images import ImageUrlCache, ZhihuImageUploader, find_local_images, \
+    rewrite_image_refs, upload_article_images
+
+
+class FakeImageHandler(BaseHTTPRequestHandler):
+    """模拟知乎的图片上传接口：记录请求数和最大并发数，返回以文件名命名的图片地址"""
+    lock = threading.Lock()
+    active = 0
+    peak = 0
+    uploads = []
+
+    def do_POST(self):
+        cls = FakeImageHandler
+        with cls.lock:
+            cls.active += 1
+            cls.peak = max(cls.peak, cls.active)
+        try:
+            length = int(self.headers["Content-Length"])
+            body = self.rfile.read(length)
+            time.sleep(0.05)
+            if b'filename="broken.png"' in body or "_xsrf=token" not in self.headers.get("Cookie", ""):
+                self.send_response(500)
+                self.end_headers()
+                return
+            name = body.split(b'filename="', 1)[1].split(b'"', 1)[0].decode()
+            with cls.lock:
+                cls.uploads.append(name)
+            data = json.dumps({"src": f"https://pic.example.com/{name}"}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        finally:
+            with cls.lock:
+                cls.active -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestZhihuImages(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeImageHandler)
+        cls.endpoint = f"http://127.0.0.1:{cls.server.server_address[1]}/api/uploaded_images"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        FakeImageHandler.active = 0
+        FakeImageHandler.peak = 0
+        FakeImageHandler.uploads = []
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        (self.root / "images").mkdir()
+        for index in range(6):
+            (self.root / "images" / f"{index}.png").write_bytes(f"image-{index}".encode())
+        # 内容和 0.png 相同
+        (self.root / "images" / "copy.png").write_bytes(b"image-0")
+        (self.root / "images" / "broken.png").write_bytes(b"broken")
+        self.account_file = self.root / "account.json"
+        self.account_file.write_text(json.dumps({"cookies": [
+            {"name": "_xsrf", "value": "token", "domain": ".zhihu.com"},
+            {"name": "z_c0", "value": "abc", "domain": ".zhihu.com"}]}))
+        lines = [f"![图{index}](images/{index}.png)" for index in range(6)]
+        lines += ['![副本](images/copy.png "copy")', "![坏图](images/broken.png)",
+                  "![网络图](https://example.com/a.png)", "![不存在](images/missing.png)",
+                  '<img src="images/1.png">']
+        self.article = self.root / "article.md"
+        self.article.write_text("\n\n".join(lines), encoding="utf-8")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_uploader(self, max_workers=3):
+        cache = ImageUrlCache(self.root / "cache.json")
+        return ZhihuImageUploader(self.account_file, endpoint=self.endpoint, max_workers=max_workers, cache=cache)
+
+    def test_find_and_rewrite(self):
+        images = find_local_images(self.article.read_text(encoding="utf-8"), self.root)
+        self.assertEqual(len(images), 8)
+        self.assertNotIn("https://example.com/a.png", images)
+        self.assertNotIn("images/missing.png", images)
+        text = rewrite_image_refs('![a](images/1.png "t") <img src="images/1.png">',
+                                  {"images/1.png": "https://pic/1.png"})
+        self.assertEqual(text, '![a](https://pic/1.png "t") <img src="https://pic/1.png">')
+
+    def test_concurrent_upload_with_cache(self):
+        uploader = self.make_uploader(max_workers=3)
+        urls = asyncio.run(upload_article_images(self.article, self.account_file, uploader))
+        # 7 个文件里 copy.png 和 0.png 内容相同，broken.png 上传失败
+        self.assertEqual(len(FakeImageHandler.uploads), 6)
+        self.assertLessEqual(FakeImageHandler.peak, 3)
+        self.assertGreater(FakeImageHandler.peak, 1)
+        self.assertEqual(urls["images/copy.png"], urls["images/0.png"])
+        self.assertNotIn("images/broken.png", urls)
+
+        # 再次发布时已上传过的图片直接使用缓存的地址
+        FakeImageHandler.uploads = []
+        uploader = self.make_uploader()
+        self.assertEqual(asyncio.run(upload_article_images(self.article, self.account_file, uploader)), urls)
+        self.assertEqual(FakeImageHandler.uploads, [])
+        uploader.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,17 @@
 import json
 import pathlib
 import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import requests
 from biliup.plugins.bili_webup import BiliBili, Data
+from requests.adapters import HTTPAdapter
 
+from conf import BILIBILI_RESUMABLE_UPLOAD, BILIBILI_UPLOAD_TASKS_MAX
+from uploader.bilibili_uploader.throughput import AdaptiveConcurrency, LineCache
+from uploader.bilibili_uploader.upos import ManifestStore, ResumableUposUpload, UPOS_LINES, upload_parts
 from utils.log import bilibili_logger
 
 
@@ -39,18 +48,216 @@ def random_emoji():
     return random.choice(emoji_list)
 
 
+# 未登录(-101)、csrf 校验失败(-111)，出现时重新登录后重试一次
+AUTH_ERROR_CODES = {-101, -111}
+
+
+def is_auth_error(result) -> bool:
+    """result 为接口返回的 dict，或 biliup 以接口返回值抛出的异常"""
+    if isinstance(result, Exception):
+        result = result.args[0] if result.args else None
+    return isinstance(result, dict) and result.get('code') in AUTH_ERROR_CODES
+
+
+class BilibiliSession(object):
+    """
+    长期保持的 B 站会话：只登录一次，连接池在多次上传之间复用，可以连续提交多个 Data。
+    上传或提交返回登录失效时，重新读取 cookie 登录并重试一次。
+
+    Args:
+        cookie_data: extract_keys_from_json 得到的 cookie
+        account_file: cookie 文件，重新登录时从这里重新读取，None 表示沿用 cookie_data
+        bili_factory: 创建 biliup 会话的函数，测试时可以替换
+        resumable: 是否使用可续传的分片上传，False 时使用 biliup 的 upload_file
+        store: 可续传上传的进度清单目录
+        line_cache: 测速选出的线路缓存
+    """
+
+    def __init__(self, cookie_data=None, account_file=None, bili_factory=BiliBili,
+                 resumable: bool = BILIBILI_RESUMABLE_UPLOAD, store: ManifestStore = None,
+                 line_cache: LineCache = None):
+        self.cookie_data = cookie_data
+        self.account_file = account_file
+        self.bili_factory = bili_factory
+        self.resumable = resumable
+        self.store = store
+        self.line_cache = line_cache or LineCache()
+        self.bili = None
+        self.http = None
+        self.line = None
+        # 上一个文件结束时的分片并发数，下一个文件从这里开始调整
+        self.tasks = None
+        self.last_throughput = None
+        self.logins = 0
+        self._lock = threading.RLock()
+
+    def _create_http(self) -> requests.Session:
+        """可续传上传使用的 requests 会话，带账号 cookie，连接池在多个文件之间复用"""
+        http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        http.mount('https://', adapter)
+        http.mount('http://', adapter)
+        http.headers.update({
+            'user-agent': "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 Chrome/63.0.3239.108",
+            'referer': "https://www.bilibili.com/",
+        })
+        cookies = {name: value for name, value in self.cookie_data.items() if name != 'access_token'}
+        requests.utils.add_dict_to_cookiejar(http.cookies, cookies)
+        return http
+
+    def login(self) -> BiliBili:
+        with self._lock:
+            if self.bili is not None:
+                return self.bili
+            if self.account_file is not None:
+                self.cookie_data = extract_keys_from_json(read_cookie_json_file(self.account_file))
+            bili = self.bili_factory(Data())
+            try:
+                bili.login_by_cookies(self.cookie_data)
+            except Exception:
+                bili.close()
+                raise
+            bili.access_token = self.cookie_data.get('access_token')
+            self.bili = bili
+            self.http = self._create_http()
+            self.logins += 1
+            return bili
+
+    def _close_connections(self):
+        if self.bili is not None:
+            self.bili.close()
+            self.bili = None
+        if self.http is not None:
+            self.http.close()
+            self.http = None
+
+    def relogin(self) -> BiliBili:
+        with self._lock:
+            self._close_connections()
+            bilibili_logger.info('[-] 登录已失效，重新登录')
+            return self.login()
+
+    def _call(self, func):
+        bili = self.login()
+        try:
+            result = func(bili)
+        except Exception as e:
+            if not is_auth_error(e):
+                raise
+            return func(self.relogin())
+        if is_auth_error(result):
+            return func(self.relogin())
+        return result
+
+    def _select_line(self, bili: BiliBili, lines: str) -> str:
+        """返回 upos 线路参数，AUTO 时测速选出的线路在 BILIBILI_LINE_CACHE_TTL 内沿用"""
+        if lines in UPOS_LINES:
+            return UPOS_LINES[lines]
+        if self.line is None:
+            self.line = self.line_cache.get()
+        if self.line is None:
+            line = bili.probe()
+            if not line or line.get('os') != 'upos':
+                raise NotImplementedError(f"不支持的上传线路: {line}")
+            bilibili_logger.info(f"线路选择 => {line['query']}. time: {line.get('cost')}")
+            self.line = line['query']
+            self.line_cache.set(self.line, line.get('cost'))
+        return self.line
+
+    def upload_file(self, file, lines='AUTO', tasks=3) -> dict:
+        """上传一个视频文件，返回可以 append 到 Data 的分P信息"""
+        return self.upload_files([file], lines=lines, tasks=tasks)[0]
+
+    def upload_files(self, files: List, lines='AUTO', tasks=3) -> List[dict]:
+        """
+        同时上传同一稿件的多个分P，所有分P的分片共用一份并发额度，总用时接近最大的分P而不是所有分P之和。
+
+        Returns:
+            与 files 顺序一致的分P信息
+        """
+        if not self.resumable:
+            def upload_one(file):
+                return self._call(lambda bili: bili.upload_file(str(file), lines=lines, tasks=tasks))
+
+            # biliup 每个文件各自开 tasks 个连接，按总额度限制同时上传的文件数
+            workers = min(len(files), max(1, BILIBILI_UPLOAD_TASKS_MAX // tasks))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bili-part") as pool:
+                return list(pool.map(upload_one, files))
+
+        def upload(bili):
+            query = self._select_line(bili, lines)
+            concurrency = AdaptiveConcurrency(self.tasks or tasks)
+            account = str(self.cookie_data.get('DedeUserID', ''))
+            uploads = [ResumableUposUpload(self.http, file, query, account=account, store=self.store,
+                                           concurrency=concurrency) for file in files]
+            try:
+                parts = upload_parts(uploads, concurrency)
+            except (IOError, requests.RequestException):
+                if lines not in UPOS_LINES:
+                    # 缓存的线路可能已经不可用，下次重新测速
+                    self.line = None
+                    self.line_cache.invalidate()
+                raise
+            self.tasks = concurrency.limit
+            self.last_throughput = [upload_task.throughput for upload_task in uploads]
+            return parts
+
+        return self._call(upload)
+
+    def submit(self, data: Data) -> dict:
+        def submit(bili):
+            # biliup 的 submit 提交的是 bili.video，同一个会话上的提交需要串行
+            with self._lock:
+                bili.video = data
+                return bili.submit()
+
+        return self._call(submit)
+
+    def close(self):
+        with self._lock:
+            self._close_connections()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+_sessions: Dict[str, BilibiliSession] = {}
+_sessions_lock = threading.Lock()
+
+
+def get_bilibili_session(account_file) -> BilibiliSession:
+    """进程内按 cookie 文件共享的会话，同一账号的多次上传只登录一次"""
+    key = str(pathlib.Path(account_file).resolve())
+    with _sessions_lock:
+        if key not in _sessions:
+            _sessions[key] = BilibiliSession(account_file=account_file)
+        return _sessions[key]
+
+
 class BilibiliUploader(object):
-    def __init__(self, cookie_data, file: pathlib.Path, title, desc, tid, tags, dtime):
-        self.upload_thread_num = 3
+    """
+    Args:
+        file: 视频文件；传入文件列表时作为同一稿件的多个分P，按列表顺序排列，同时上传后一次提交
+        part_titles: 多P时各分P的标题，默认使用文件名
+    """
+
+    def __init__(self, cookie_data, file: pathlib.Path, title, desc, tid, tags, dtime, part_titles: List[str] = None):
+        self.upload_thread_num = 3  # 初始分片并发数，上传时按吞吐量自动调整
         self.copyright = 1
         self.lines = 'AUTO'
         self.cookie_data = cookie_data
-        self.file = file
+        self.files = [pathlib.Path(f) for f in file] if isinstance(file, (list, tuple)) else [pathlib.Path(file)]
+        self.file = self.files[0]
+        self.part_titles = part_titles
         self.title = title
         self.desc = desc
         self.tid = tid
         self.tags = tags
         self.dtime = dtime
+        self.post_id = None  # 提交成功后由接口返回的 bvid，写入上传账本
         self._init_data()
 
     def _init_data(self):
@@ -62,18 +269,30 @@ class BilibiliUploader(object):
         self.data.set_tag(self.tags)
         self.data.dtime = self.dtime
 
-    def upload(self):
-        with BiliBili(self.data) as bili:
-            bili.login_by_cookies(self.cookie_data)
-            bili.access_token = self.cookie_data.get('access_token')
-            video_part = bili.upload_file(str(self.file), lines=self.lines,
-                                          tasks=self.upload_thread_num)  # 上传视频，默认线路AUTO自动选择，线程数量3。
-            video_part['title'] = self.title
-            self.data.append(video_part)
-            ret = bili.submit()  # 提交视频
-            if ret.get('code') == 0:
-                bilibili_logger.success(f'[+] {self.file.name}上传 成功')
-                return True
+    def upload(self, session: BilibiliSession = None):
+        """
+        Args:
+            session: 批量上传时传入同一个会话，不再每个文件重新登录；None 表示用 cookie_data 临时登录
+        """
+        if session is None:
+            with BilibiliSession(self.cookie_data) as session:
+                return self.upload(session)
+        video_parts = session.upload_files(self.files, lines=self.lines,
+                                           tasks=self.upload_thread_num)  # 上传视频，默认线路AUTO自动选择
+        for index, video_part in enumerate(video_parts):
+            if len(video_parts) == 1:
+                video_part['title'] = self.title
+            elif self.part_titles:
+                video_part['title'] = self.part_titles[index]
             else:
-                bilibili_logger.error(f'[-] {self.file.name}上传 失败, error messge: {ret.get("message")}')
-                return False
+                video_part['title'] = self.files[index].stem
+            self.data.append(video_part)
+        ret = session.submit(self.data)  # 提交视频
+        name = self.file.name if len(self.files) == 1 else f'{self.file.name} 等 {len(self.files)} 个分P'
+        if ret.get('code') == 0:
+            self.post_id = (ret.get('data') or {}).get('bvid')
+            bilibili_logger.success(f'[+] {name}上传 成功 {self.post_id or ""}')
+            return True
+        else:
+            bilibili_logger.error(f'[-] {name}上传 失败, error messge: {ret.get("message")}')
+            return False
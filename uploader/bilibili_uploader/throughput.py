@@ -0,0 +1,166 @@
+"""
+B 站上传的吞吐量相关：按实测吞吐量调整分片并发数(AIMD)、缓存测速选出的线路、导出每次上传的 MB/s。
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from conf import BILIBILI_UPLOAD_TASKS_MIN, BILIBILI_UPLOAD_TASKS_MAX, BILIBILI_LINE_CACHE_FILE, \
+    BILIBILI_LINE_CACHE_TTL, BILIBILI_THROUGHPUT_LOG
+from utils.log import bilibili_logger
+
+# 一个窗口的吞吐量比上一个窗口高出这个比例才继续加并发，低于这个比例时减半
+INCREASE_THRESHOLD = 1.05
+DECREASE_THRESHOLD = 0.8
+
+
+class AdaptiveConcurrency(object):
+    """
+    AIMD 方式调整同时上传的分片数。
+
+    每完成 limit 个分片算一个窗口，窗口吞吐量比上一个窗口明显提高时并发数加 1，明显下降或分片上传出错时减半，
+    其余情况保持不变。上传线程在每个分片前 acquire，完成后 release。
+
+    Args:
+        initial: 初始并发数
+        minimum: 最小并发数
+        maximum: 最大并发数，也是上传线程数
+        clock: 计时函数，测试时可以替换
+    """
+
+    def __init__(self, initial: int = 3, minimum: int = BILIBILI_UPLOAD_TASKS_MIN,
+                 maximum: int = BILIBILI_UPLOAD_TASKS_MAX, clock=time.monotonic):
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.limit = min(max(initial, self.minimum), self.maximum)
+        self.active = 0
+        self.clock = clock
+        self.stats = {"increases": 0, "decreases": 0, "errors": 0, "max_limit": self.limit,
+                      "chunks": 0, "chunk_bytes": 0, "chunk_seconds": 0.0}
+        self._cond = threading.Condition()
+        self._window_started = None
+        self._window_bytes = 0
+        self._window_chunks = 0
+        self._last_mbps = None
+
+    def acquire(self) -> float:
+        """等到有空闲的并发名额，返回开始时间"""
+        with self._cond:
+            while self.active >= self.limit:
+                self._cond.wait()
+            self.active += 1
+            now = self.clock()
+            if self._window_started is None:
+                self._window_started = now
+            return now
+
+    def release(self, started: float = None, nbytes: int = 0):
+        """
+        Args:
+            started: acquire 返回的开始时间
+            nbytes: 上传成功的字节数，0 表示没有上传(没有剩余分片或上传失败)
+        """
+        with self._cond:
+            self.active -= 1
+            self._cond.notify_all()
+            if nbytes and started is not None:
+                now = self.clock()
+                self.stats["chunks"] += 1
+                self.stats["chunk_bytes"] += nbytes
+                self.stats["chunk_seconds"] += now - started
+                self._window_bytes += nbytes
+                self._window_chunks += 1
+                if self._window_chunks >= self.limit:
+                    self._adjust(now)
+
+    def congestion(self):
+        """分片上传出错(超时、5xx 等)，并发数减半"""
+        with self._cond:
+            self.stats["errors"] += 1
+            self._decrease()
+            self._reset_window(self.clock())
+
+    def _decrease(self):
+        limit = max(self.minimum, self.limit // 2)
+        if limit < self.limit:
+            self.stats["decreases"] += 1
+            bilibili_logger.info(f"[bili] 分片并发 {self.limit} -> {limit}")
+        self.limit = limit
+        self._last_mbps = None
+
+    def _reset_window(self, now):
+        self._window_started = now
+        self._window_bytes = 0
+        self._window_chunks = 0
+
+    def _adjust(self, now: float):
+        elapsed = now - self._window_started
+        if elapsed <= 0:
+            return
+        mbps = self._window_bytes / elapsed / 1000 / 1000
+        last, self._last_mbps = self._last_mbps, mbps
+        if last is None or mbps >= last * INCREASE_THRESHOLD:
+            if self.limit < self.maximum:
+                self.limit += 1
+                self.stats["increases"] += 1
+                self.stats["max_limit"] = max(self.stats["max_limit"], self.limit)
+        elif mbps < last * DECREASE_THRESHOLD:
+            self._decrease()
+        self._reset_window(now)
+
+    def chunk_mbps(self) -> Optional[float]:
+        """单个分片的平均上传速度"""
+        if not self.stats["chunk_seconds"]:
+            return None
+        return self.stats["chunk_bytes"] / self.stats["chunk_seconds"] / 1000 / 1000
+
+
+class LineCache(object):
+    """测速选出的上传线路，在 ttl 秒内所有上传(包括其他进程)直接使用，不再每个文件测速"""
+
+    def __init__(self, cache_file=BILIBILI_LINE_CACHE_FILE, ttl: float = BILIBILI_LINE_CACHE_TTL):
+        self.cache_file = Path(cache_file) if cache_file else None
+        self.ttl = ttl
+        self._memory = None
+
+    def get(self, now: float = None) -> Optional[str]:
+        now = time.time() if now is None else now
+        entry = self._memory
+        if entry is None and self.cache_file is not None:
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                entry = None
+        if not entry or now - entry.get("probed_at", 0) > self.ttl:
+            return None
+        self._memory = entry
+        return entry["query"]
+
+    def set(self, query: str, cost: float = None, now: float = None):
+        self._memory = {"query": query, "cost": cost, "probed_at": time.time() if now is None else now}
+        if self.cache_file is None:
+            return
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.cache_file.with_name(f"{self.cache_file.name}.{os.getpid()}.tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self._memory, f, ensure_ascii=False)
+        os.replace(tmp_file, self.cache_file)
+
+    def invalidate(self):
+        self._memory = None
+        if self.cache_file is not None:
+            self.cache_file.unlink(missing_ok=True)
+
+
+def export_throughput(record: dict, log_file=BILIBILI_THROUGHPUT_LOG):
+    """每次上传追加一行 json，链路带宽和代码瓶颈可以从 mbps 与 chunk_mbps、concurrency 的关系看出"""
+    if log_file is None:
+        return
+    log_file = Path(log_file)
+    log_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(log_file, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
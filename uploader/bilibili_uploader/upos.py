@@ -0,0 +1,396 @@
+"""
+B 站 upos 线路的可续传分片上传。
+
+上传会话(upload_id、上传地址、鉴权)和已完成的分片记录在进度清单中，进程中断后再次上传同一个文件时，
+只上传缺少的分片。分片用 readinto 读进每个线程复用的缓冲区，不为每个分片创建新的 bytes 对象。
+"""
+import hashlib
+import itertools
+import json
+import math
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+from urllib.parse import urlparse
+
+import requests
+
+from conf import BILIBILI_UPLOAD_MANIFEST_DIR, BILIBILI_UPLOAD_MANIFEST_TTL, BILIBILI_CHUNK_RETRIES, \
+    BILIBILI_CHUNK_TIMEOUT, BILIBILI_UPLOAD_TASKS_MAX, BILIBILI_THROUGHPUT_LOG
+from uploader.bilibili_uploader.throughput import AdaptiveConcurrency, export_throughput
+from utils.log import bilibili_logger
+
+PREUPLOAD_URL = "https://member.bilibili.com/preupload"
+# 与 biliup 的线路表一致，AUTO 时由 biliup 测速选择
+UPOS_LINES = {
+    'bda': "upcdn=bda&probe_version=20221109",
+    'bda2': "upcdn=bda2&probe_version=20221109",
+    'cs-bda2': "upcdn=bda2&probe_version=20221109",
+    'ws': "upcdn=ws&probe_version=20221109",
+    'qn': "upcdn=qn&probe_version=20221109",
+    'cs-qn': "upcdn=qn&probe_version=20221109",
+    'bldsa': "upcdn=bldsa&probe_version=20221109",
+    'tx': "upcdn=tx&probe_version=20221109",
+    'txa': "upcdn=txa&probe_version=20221109",
+}
+
+
+class UploadSessionError(Exception):
+    """上传会话已失效(upload_id 过期、鉴权失败等)，需要重新申请上传"""
+
+
+class UploadManifest(object):
+    """一个文件的上传进度，每完成一个分片就原子写入一次"""
+
+    def __init__(self, path: Path, data: dict):
+        self.path = path
+        self.data = data
+        self.done = set(data.get("done", []))
+        self._lock = threading.Lock()
+
+    @property
+    def chunks(self) -> int:
+        return self.data["chunks"]
+
+    def missing(self) -> list:
+        return [index for index in range(self.chunks) if index not in self.done]
+
+    def mark_done(self, index: int):
+        with self._lock:
+            self.done.add(index)
+            self.save()
+
+    def save(self):
+        self.data["done"] = sorted(self.done)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.path.with_name(f"{self.path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, ensure_ascii=False)
+        os.replace(tmp_file, self.path)
+
+    def delete(self):
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class ManifestStore(object):
+    """
+    上传进度清单目录，一个 (账号, 文件) 对应一个清单。文件被修改(大小或 mtime 变化)后旧清单不再使用。
+
+    Args:
+        manifest_dir: 清单目录，默认与上传账本放在同一个 data 目录下
+        ttl: 清单有效期(秒)
+    """
+
+    def __init__(self, manifest_dir=BILIBILI_UPLOAD_MANIFEST_DIR, ttl: float = BILIBILI_UPLOAD_MANIFEST_TTL):
+        self.manifest_dir = Path(manifest_dir)
+        self.ttl = ttl
+
+    @staticmethod
+    def _fingerprint(file) -> dict:
+        stat = os.stat(file)
+        return {"file": os.path.abspath(str(file)), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def _path(self, fingerprint: dict, account: str) -> Path:
+        key = f"{account}\0{fingerprint['file']}\0{fingerprint['size']}\0{fingerprint['mtime_ns']}"
+        return self.manifest_dir / f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.json"
+
+    def load(self, file, account: str = "") -> Optional[UploadManifest]:
+        """返回未过期且与文件当前内容对应的清单，没有时返回 None"""
+        fingerprint = self._fingerprint(file)
+        path = self._path(fingerprint, account)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - data.get("created_at", 0) > self.ttl:
+            path.unlink(missing_ok=True)
+            return None
+        return UploadManifest(path, data)
+
+    def create(self, file, account: str, session: dict) -> UploadManifest:
+        fingerprint = self._fingerprint(file)
+        data = dict(fingerprint, account=account, created_at=time.time(), done=[], **session)
+        manifest = UploadManifest(self._path(fingerprint, account), data)
+        manifest.save()
+        return manifest
+
+    def purge_expired(self) -> int:
+        """删除过期的清单，返回删除的数量"""
+        removed = 0
+        for path in self.manifest_dir.glob("*.json"):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    created_at = json.load(f).get("created_at", 0)
+            except (OSError, ValueError):
+                created_at = 0
+            if time.time() - created_at > self.ttl:
+                path.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+
+class ResumableUposUpload(object):
+    """
+    把一个文件分片上传到 upos 线路，进度保存在清单中。
+
+    Args:
+        http: 带账号 cookie 的 requests 会话，连接池大小不小于 tasks
+        file: 视频文件
+        query: 线路参数，如 UPOS_LINES['bda2'] 或 biliup probe() 返回的 query
+        tasks: 初始的分片并发数，上传过程中按吞吐量在 [BILIBILI_UPLOAD_TASKS_MIN, max_tasks] 之间调整
+        max_tasks: 最大分片并发数
+        account: 账号标识，区分不同账号对同一文件的上传会话
+        store: 进度清单目录
+        preupload_url: 申请上传的接口，测试时可以指向本地替身服务
+        throughput_log: 上传速度导出文件，None 表示不导出
+        concurrency: 与其他文件共用的并发控制，多P上传时所有分P共用一份并发额度
+    """
+
+    def __init__(self, http: requests.Session, file, query: str, tasks: int = 3,
+                 max_tasks: int = BILIBILI_UPLOAD_TASKS_MAX, account: str = "", store: ManifestStore = None,
+                 preupload_url: str = PREUPLOAD_URL, throughput_log=BILIBILI_THROUGHPUT_LOG,
+                 concurrency: AdaptiveConcurrency = None):
+        self.http = http
+        self.file = Path(file)
+        self.query = query
+        self.concurrency = concurrency or AdaptiveConcurrency(tasks, maximum=max_tasks)
+        self.account = account
+        self.store = store or ManifestStore()
+        self.preupload_url = preupload_url
+        self.throughput_log = throughput_log
+        self.manifest: Optional[UploadManifest] = None
+        self.resumed = False
+        self.uploaded_bytes = 0
+        self.throughput = None
+        self._bytes_lock = threading.Lock()
+
+    def _start(self) -> UploadManifest:
+        """申请上传，得到上传地址和 upload_id"""
+        self.store.purge_expired()
+        size = self.file.stat().st_size
+        params = {
+            'r': 'upos',
+            'profile': 'ugcupos/bup',
+            'ssl': 0,
+            'version': '2.8.12',
+            'build': 2081200,
+            'name': self.file.name,
+            'size': size,
+        }
+        ret = self.http.get(f"{self.preupload_url}?{self.query}", params=params, timeout=15).json()
+        if 'upos_uri' not in ret:
+            # 未登录等错误原样抛出，由 BilibiliSession 判断是否需要重新登录
+            raise Exception(ret)
+        scheme = urlparse(self.preupload_url).scheme
+        url = f"{scheme}:{ret['endpoint']}/{ret['upos_uri'].replace('upos://', '')}"
+        headers = {"X-Upos-Auth": ret["auth"]}
+        upload_id = self.http.post(f'{url}?uploads&output=json', headers=headers, timeout=15).json()["upload_id"]
+        return self.store.create(self.file, self.account, {
+            "url": url,
+            "auth": ret["auth"],
+            "biz_id": ret["biz_id"],
+            "upos_uri": ret["upos_uri"],
+            "upload_id": upload_id,
+            "chunk_size": ret["chunk_size"],
+            "chunks": math.ceil(size / ret["chunk_size"]),
+        })
+
+    def _put_chunk(self, manifest: UploadManifest, index: int, chunk: memoryview):
+        data = manifest.data
+        start = index * data["chunk_size"]
+        params = {
+            'uploadId': data["upload_id"],
+            'chunks': data["chunks"],
+            'total': data["size"],
+            'chunk': index,
+            'size': len(chunk),
+            'partNumber': index + 1,
+            'start': start,
+            'end': start + len(chunk),
+        }
+        last_error = None
+        for attempt in range(BILIBILI_CHUNK_RETRIES):
+            try:
+                response = self.http.put(data["url"], params=params, data=chunk,
+                                         headers={"X-Upos-Auth": data["auth"]}, timeout=BILIBILI_CHUNK_TIMEOUT)
+            except requests.RequestException as e:
+                last_error = e
+            else:
+                if response.ok:
+                    return
+                if 400 <= response.status_code < 500 and response.status_code != 429:
+                    raise UploadSessionError(f"分片 {index} 被拒绝: HTTP {response.status_code} {response.text[:200]}")
+                last_error = IOError(f"HTTP {response.status_code}")
+            bilibili_logger.warning(f"[-] 分片 {index} 第 {attempt + 1} 次上传失败: {last_error!r}")
+            self.concurrency.congestion()
+            if attempt + 1 < BILIBILI_CHUNK_RETRIES:
+                time.sleep(min(2 ** attempt, 30))
+        raise IOError(f"分片 {index} 上传失败，已重试 {BILIBILI_CHUNK_RETRIES} 次: {last_error!r}")
+
+    def prepare(self):
+        """读取进度清单，没有时申请新的上传会话"""
+        self.manifest = self.store.load(self.file, self.account)
+        self.resumed = self.manifest is not None
+        if self.resumed:
+            bilibili_logger.info(f"[+] {self.file.name} 续传，"
+                                 f"已完成 {len(self.manifest.done)}/{self.manifest.chunks} 个分片")
+        else:
+            self.manifest = self._start()
+
+    def add_uploaded(self, nbytes: int):
+        with self._bytes_lock:
+            self.uploaded_bytes += nbytes
+
+    def complete(self) -> dict:
+        """合并分片，返回可以 append 到 Data 的分P信息"""
+        manifest = self.manifest
+        data = manifest.data
+        params = {
+            'name': self.file.name,
+            'uploadId': data["upload_id"],
+            'biz_id': data["biz_id"],
+            'output': 'json',
+            'profile': 'ugcupos/bup',
+        }
+        parts = [{"partNumber": index + 1, "eTag": "etag"} for index in range(data["chunks"])]
+        last_error = None
+        for attempt in range(BILIBILI_CHUNK_RETRIES):
+            try:
+                ret = self.http.post(data["url"], params=params, json={"parts": parts},
+                                     headers={"X-Upos-Auth": data["auth"]}, timeout=15).json()
+                if ret.get('OK') == 1:
+                    manifest.delete()
+                    upos_name = Path(data["upos_uri"].replace('upos://', '')).stem
+                    return {"title": self.file.stem, "filename": upos_name, "desc": ""}
+                last_error = IOError(ret)
+            except (requests.RequestException, ValueError) as e:
+                last_error = e
+            bilibili_logger.warning(f"[-] 合并分片第 {attempt + 1} 次失败: {last_error!r}")
+            if attempt + 1 < BILIBILI_CHUNK_RETRIES:
+                time.sleep(min(2 ** attempt, 30))
+        # 分片都已上传，清单保留，下次只需要合并
+        raise IOError(f"合并分片失败: {last_error!r}")
+
+    def export(self, seconds: float):
+        """记录并导出本次上传的速度"""
+        chunk_mbps = self.concurrency.chunk_mbps()
+        self.throughput = {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "file": self.file.name,
+            "line": self.query,
+            "resumed": self.resumed,
+            "bytes": self.uploaded_bytes,
+            "seconds": round(seconds, 3),
+            "mbps": round(self.uploaded_bytes / 1000 / 1000 / max(seconds, 1e-6), 3),
+            "chunk_mbps": round(chunk_mbps, 3) if chunk_mbps is not None else None,
+            "concurrency": self.concurrency.limit,
+            "max_concurrency": self.concurrency.stats["max_limit"],
+            "chunk_errors": self.concurrency.stats["errors"],
+        }
+        export_throughput(self.throughput, self.throughput_log)
+        bilibili_logger.info(f"[+] {self.file.name} 上传完成，本次上传 {self.uploaded_bytes / 1000 / 1000:.1f}MB，"
+                             f"{self.throughput['mbps']:.2f}MB/s，分片并发 {self.concurrency.limit}")
+
+    def run(self) -> dict:
+        """上传文件，返回可以 append 到 Data 的分P信息"""
+        return upload_parts([self], self.concurrency)[0]
+
+
+def _chunk_worker(jobs: "queue.Queue", concurrency: AdaptiveConcurrency, failed: threading.Event):
+    # 每个线程一个缓冲区，分片直接 readinto 进来，发送时传 memoryview，不复制；
+    # 并发数没有调到这么高时线程一直等待，不分配缓冲区
+    buffer = None
+    files = {}
+    try:
+        while True:
+            started = concurrency.acquire()
+            try:
+                job = None if failed.is_set() else jobs.get_nowait()
+            except queue.Empty:
+                job = None
+            if job is None:
+                concurrency.release()
+                return
+            upload, index = job
+            chunk_size = upload.manifest.data["chunk_size"]
+            if buffer is None or len(buffer) < chunk_size:
+                buffer = memoryview(bytearray(chunk_size))
+            if upload not in files:
+                files[upload] = open(upload.file, 'rb')
+            f = files[upload]
+            f.seek(index * chunk_size)
+            length = f.readinto(buffer[:chunk_size])
+            try:
+                upload._put_chunk(upload.manifest, index, buffer[:length])
+            except Exception as e:
+                concurrency.release()
+                failed.set()
+                if isinstance(e, UploadSessionError):
+                    # 这个文件的上传会话已失效，清单作废
+                    upload.manifest.delete()
+                    e.upload = upload
+                raise
+            concurrency.release(started, length)
+            upload.manifest.mark_done(index)
+            upload.add_uploaded(length)
+    finally:
+        for f in files.values():
+            f.close()
+
+
+def _upload_chunks(uploads: List[ResumableUposUpload], concurrency: AdaptiveConcurrency):
+    jobs = queue.Queue()
+    # 各文件的分片交替排队，所有分P同时推进
+    for job in itertools.chain.from_iterable(itertools.zip_longest(
+            *[[(upload, index) for index in upload.manifest.missing()] for upload in uploads])):
+        if job is not None:
+            jobs.put(job)
+    failed = threading.Event()
+    workers = concurrency.maximum
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bili-upos") as pool:
+        futures = [pool.submit(_chunk_worker, jobs, concurrency, failed) for _ in range(workers)]
+    for future in futures:
+        future.result()
+
+
+def upload_parts(uploads: List[ResumableUposUpload], concurrency: AdaptiveConcurrency = None) -> List[dict]:
+    """
+    同时上传多个文件，所有文件的分片共用 concurrency 的并发额度。
+
+    Args:
+        uploads: 要上传的文件，一般为同一稿件的多个分P
+        concurrency: 共用的并发控制，None 时使用第一个文件的
+
+    Returns:
+        与 uploads 顺序一致的分P信息
+    """
+    concurrency = concurrency or uploads[0].concurrency
+    for upload in uploads:
+        upload.concurrency = concurrency
+    started = time.perf_counter()
+    for upload in uploads:
+        upload.prepare()
+    while True:
+        try:
+            _upload_chunks(uploads, concurrency)
+            break
+        except UploadSessionError as e:
+            upload = getattr(e, "upload", None)
+            if upload is None or not upload.resumed:
+                raise
+            # 续传的旧上传会话已失效，重新申请后从头上传，其他文件继续续传
+            bilibili_logger.warning(f"[-] {upload.file.name} 的上传会话已失效，重新上传")
+            upload.prepare()
+    parts = [upload.complete() for upload in uploads]
+    seconds = time.perf_counter() - started
+    for upload in uploads:
+        upload.export(seconds)
+    return parts
@@ -1,33 +1,67 @@
 # -*- coding: utf-8 -*-
 from datetime import datetime
 
-from playwright.async_api import Playwright, async_playwright, Page
+from playwright.async_api import async_playwright, BrowserContext, Page
 import os
 import asyncio
 
-from conf import LOCAL_CHROME_PATH
-from utils.base_social_media import set_init_script
+from conf import LOCAL_CHROME_PATH, COOKIE_AUTH_STRATEGY
+from utils.base_social_media import set_init_script, CookieExpiredError, SOCIAL_MEDIA_DOUYIN
+from utils.browser_pool import get_browser_pool
+from utils.cookie_cache import cached_cookie_auth, get_cookie_cache
+from utils.cookie_precheck import precheck_cookie_file
+from utils.diagnostics import DiagnosticsRecorder
 from utils.log import douyin_logger
+from utils.page_state import PageStateWatcher
+from utils.publish_confirm import PublishApi, PublishConfirmation
+from utils.session_probe import async_probe_session, AUTH_STRATEGY_HTTP
+from utils.text_entry import add_hashtags, insert_text, type_with_suggestion
+from utils.upload_steps import StepPipeline
 
+# 上传状态：出现"重新上传"代表视频上传完毕，出现"上传失败"代表出错
+DOUYIN_UPLOAD_STATES = {
+    "done": {"css": '[class^="long-card"] div', "text": "重新上传"},
+    "error": {"css": "div.progress-div > div", "text": "上传失败"},
+}
+# 输入 #话题 后出现的联想弹窗；选择器没有在所有页面版本上验证过，等不到弹窗时只等一次 DOUYIN_TAG_SUGGESTION_TIMEOUT，
+# 其余话题退回到不等待直接确认(与原来逐字输入后按空格相同)
+DOUYIN_TAG_SUGGESTION = '.mention-suggest-mount-dom [class*="tag"]'
+DOUYIN_TAG_SUGGESTION_TIMEOUT = 1
+# 发布接口：status_code 为 0 代表发布成功，item_id 为作品 id
+DOUYIN_PUBLISH_API = PublishApi("/web/api/media/aweme/create", "status_code", (0,), ("item_id", "aweme_id"))
 
-async def cookie_auth(account_file):
-    async with async_playwright() as playwright:
-        browser = await playwright.chromium.launch(headless=True)
-        context = await browser.new_context(storage_state=account_file)
-        context = await set_init_script(context)
+
+async def check_cookie_on_page(page: Page) -> bool:
+    """在已经打开上传页的 page 上判断 cookie 是否有效，cookie_auth 和上传流程共用"""
+    try:
+        await page.wait_for_url("https://creator.douyin.com/creator-micro/content/upload", timeout=5000)
+    except:
+        return False
+    # 2024.06.17 抖音创作者中心改版
+    if await page.get_by_text('手机号登录').count():
+        return False
+    return True
+
+
+@cached_cookie_auth(SOCIAL_MEDIA_DOUYIN)
+async def cookie_auth(account_file, auth_strategy=None):
+    # 先根据关键 cookie 的过期时间判断，能确定结果时不必启动浏览器
+    precheck = precheck_cookie_file(account_file, SOCIAL_MEDIA_DOUYIN)
+    if precheck is not None:
+        douyin_logger.info(f"[+] 根据 cookie 过期时间预检查: {'有效' if precheck else '已失效'}")
+        return precheck
+    # http 方式先请求平台的已登录接口，无法判断时再回退到下面的浏览器检查
+    if (auth_strategy or COOKIE_AUTH_STRATEGY) == AUTH_STRATEGY_HTTP:
+        probe = await async_probe_session(account_file, SOCIAL_MEDIA_DOUYIN)
+        if probe is not None:
+            douyin_logger.info(f"[+] HTTP 会话探测: {'有效' if probe else '已失效'}")
+            return probe
+    async with get_browser_pool().context(headless=True, storage_state=account_file) as context:
         # 创建一个新的页面
         page = await context.new_page()
         # 访问指定的 URL
         await page.goto("https://creator.douyin.com/creator-micro/content/upload")
-        try:
-            await page.wait_for_url("https://creator.douyin.com/creator-micro/content/upload", timeout=5000)
-        except:
-            print("[+] 等待5秒 cookie 失效")
-            await context.close()
-            await browser.close()
-            return False
-        # 2024.06.17 抖音创作者中心改版
-        if await page.get_by_text('手机号登录').count():
+        if not await check_cookie_on_page(page):
             print("[+] 等待5秒 cookie 失效")
             return False
         else:
@@ -35,8 +69,14 @@ async def cookie_auth(account_file):
             return True
 
 
-async def douyin_setup(account_file, handle=False):
-    if not os.path.exists(account_file) or not await cookie_auth(account_file):
+async def douyin_setup(account_file, handle=False, defer_auth=False, auth_strategy=None):
+    """
+    defer_auth 为 True 时只检查 cookie 文件是否存在，有效性交给上传流程打开上传页时顺带检测，
+    省掉一次单独的浏览器页面加载
+    """
+    if defer_auth and os.path.exists(account_file):
+        return True
+    if not os.path.exists(account_file) or not await cookie_auth(account_file, auth_strategy):
         if not handle:
             # Todo alert message
             return False
@@ -73,6 +113,7 @@ class DouYinVideo(object):
         self.date_format = '%Y年%m月%d日 %H:%M'
         self.local_executable_path = LOCAL_CHROME_PATH
         self.thumbnail_path = thumbnail_path
+        self.post_id = None  # 发布成功后由发布接口的响应得到，写入上传账本
 
     async def set_schedule_time_douyin(self, page, publish_date):
         # 选择包含特定文本内容的 label 元素
@@ -94,16 +135,70 @@ class DouYinVideo(object):
         douyin_logger.info('视频出错了，重新上传中')
         await page.locator('div.progress-div [class^="upload-btn-input"]').set_input_files(self.file_path)
 
-    async def upload(self, playwright: Playwright) -> None:
-        # 使用 Chromium 浏览器启动一个浏览器实例
-        if self.local_executable_path:
-            browser = await playwright.chromium.launch(headless=False, executable_path=self.local_executable_path)
+    async def fill_title_tags(self, page: Page):
+        # 检查是否存在包含输入框的元素
+        # 这里为了避免页面变化，故使用相对位置定位：作品标题父级右侧第一个元素的input子元素
+        await asyncio.sleep(1)
+        douyin_logger.info(f'  [-] 正在填充标题和话题...')
+        title_container = page.get_by_text('作品标题').locator("..").locator("xpath=following-sibling::div[1]").locator("input")
+        if await title_container.count():
+            await title_container.fill(self.title[:30])
         else:
-            browser = await playwright.chromium.launch(headless=False)
-        # 创建一个浏览器上下文，使用指定的 cookie 文件
-        context = await browser.new_context(storage_state=f"{self.account_file}")
-        context = await set_init_script(context)
+            titlecontainer = page.locator(".notranslate")
+            await titlecontainer.click()
+            await page.keyboard.press("Backspace")
+            await page.keyboard.press("Control+KeyA")
+            await page.keyboard.press("Delete")
+            await insert_text(page, self.title)
+            await page.keyboard.press("Enter")
+        css_selector = ".zone-container"
+        await page.focus(css_selector)
+        # 话题需要真实按键触发联想弹窗，弹窗出现后按空格转换为话题
+        count = await add_hashtags(page, self.tags, suggestion=DOUYIN_TAG_SUGGESTION,
+                                   timeout=DOUYIN_TAG_SUGGESTION_TIMEOUT)
+        douyin_logger.info(f'总共添加{count}个话题')
+
+    async def wait_upload_done(self, page: Page, input_lock: asyncio.Lock):
+        # 上传状态由页面里的 MutationObserver 推送，出现"重新上传"或"上传失败"时立即返回，不再每 2 秒轮询
+        douyin_logger.info("  [-] 正在上传视频中...")
+        async with PageStateWatcher(page, DOUYIN_UPLOAD_STATES) as upload_state:
+            while True:
+                if await upload_state.next() == "done":
+                    douyin_logger.success("  [-]视频上传完毕")
+                    break
+                douyin_logger.error("  [-] 发现上传出错了... 准备重试")
+                # 重新上传要操作页面，等正在填写的表单步骤完成
+                async with input_lock:
+                    await self.handle_upload_error(page)
 
+    async def set_third_part(self, page: Page):
+        # 頭條/西瓜
+        third_part_element = '[class^="info"] > [class^="first-part"] div div.semi-switch'
+        # 定位是否有第三方平台
+        if await page.locator(third_part_element).count():
+            # 检测是否是已选中状态
+            if 'semi-switch-checked' not in await page.eval_on_selector(third_part_element, 'div => div.className'):
+                await page.locator(third_part_element).locator('input.semi-switch-native-control').click()
+
+    async def click_publish(self, page: Page):
+        # 发布接口的响应回来时立即确认结果并拿到作品 id，跳转到作品管理页作为兜底
+        # 等待期间只在内存里保留低分辨率的帧，发布失败时才写到磁盘
+        async with DiagnosticsRecorder(page, SOCIAL_MEDIA_DOUYIN) as diagnostics, \
+                PublishConfirmation(page, DOUYIN_PUBLISH_API) as publish:
+            while True:
+                publish_button = page.get_by_role('button', name="发布", exact=True)
+                if not publish.request_sent and await publish_button.count():
+                    await publish_button.click()
+                result = await publish.wait(timeout=3,
+                                            fallback_url="https://creator.douyin.com/creator-micro/content/manage**")
+                if result:
+                    self.post_id = result.post_id
+                    douyin_logger.success(f"  [-]视频发布成功 作品id: {self.post_id}")
+                    break
+                douyin_logger.info("  [-] 视频正在发布中...")
+                await diagnostics.capture("publishing")
+
+    async def upload(self, context: BrowserContext) -> None:
         # 创建一个新的页面
         page = await context.new_page()
         # 访问指定的 URL
@@ -111,7 +206,10 @@ class DouYinVideo(object):
         douyin_logger.info(f'[+]正在上传-------{self.title}.mp4')
         # 等待页面跳转到指定的 URL，没进入，则自动等待到超时
         douyin_logger.info(f'[-] 正在打开主页...')
-        await page.wait_for_url("https://creator.douyin.com/creator-micro/content/upload")
+        # 上传页加载同时作为 cookie 校验
+        if not await check_cookie_on_page(page):
+            get_cookie_cache().invalidate(self.account_file)
+            raise CookieExpiredError(self.account_file)
         # 点击 "上传视频" 按钮
         await page.locator("div[class^='container'] input").set_input_files(self.file_path)
 
@@ -135,86 +233,24 @@ class DouYinVideo(object):
                 except:
                     print("  [-] 超时未进入视频发布页面，重新尝试...")
                     await asyncio.sleep(0.5)  # 等待 0.5 秒后重新尝试
-        # 填充标题和话题
-        # 检查是否存在包含输入框的元素
-        # 这里为了避免页面变化，故使用相对位置定位：作品标题父级右侧第一个元素的input子元素
-        await asyncio.sleep(1)
-        douyin_logger.info(f'  [-] 正在填充标题和话题...')
-        title_container = page.get_by_text('作品标题').locator("..").locator("xpath=following-sibling::div[1]").locator("input")
-        if await title_container.count():
-            await title_container.fill(self.title[:30])
-        else:
-            titlecontainer = page.locator(".notranslate")
-            await titlecontainer.click()
-            await page.keyboard.press("Backspace")
-            await page.keyboard.press("Control+KeyA")
-            await page.keyboard.press("Delete")
-            await page.keyboard.type(self.title)
-            await page.keyboard.press("Enter")
-        css_selector = ".zone-container"
-        for index, tag in enumerate(self.tags, start=1):
-            await page.type(css_selector, "#" + tag)
-            await page.press(css_selector, "Space")
-        douyin_logger.info(f'总共添加{len(self.tags)}个话题')
-
-        while True:
-            # 判断重新上传按钮是否存在，如果不存在，代表视频正在上传，则等待
-            try:
-                #  新版：定位重新上传
-                number = await page.locator('[class^="long-card"] div:has-text("重新上传")').count()
-                if number > 0:
-                    douyin_logger.success("  [-]视频上传完毕")
-                    break
-                else:
-                    douyin_logger.info("  [-] 正在上传视频中...")
-                    await asyncio.sleep(2)
-
-                    if await page.locator('div.progress-div > div:has-text("上传失败")').count():
-                        douyin_logger.error("  [-] 发现上传出错了... 准备重试")
-                        await self.handle_upload_error(page)
-            except:
-                douyin_logger.info("  [-] 正在上传视频中...")
-                await asyncio.sleep(2)
-        
-        #上传视频封面
-        await self.set_thumbnail(page, self.thumbnail_path)
-
-        # 更换可见元素
-        await self.set_location(page, "杭州市")
-
-        # 頭條/西瓜
-        third_part_element = '[class^="info"] > [class^="first-part"] div div.semi-switch'
-        # 定位是否有第三方平台
-        if await page.locator(third_part_element).count():
-            # 检测是否是已选中状态
-            if 'semi-switch-checked' not in await page.eval_on_selector(third_part_element, 'div => div.className'):
-                await page.locator(third_part_element).locator('input.semi-switch-native-control').click()
-
+        # 视频传输的同时填写表单，只有发布需要等传输完成；操作页面的步骤依次执行，避免抢焦点
+        pipeline = StepPipeline(SOCIAL_MEDIA_DOUYIN)
+        pipeline.add("transfer", lambda: self.wait_upload_done(page, pipeline.input_lock), exclusive=False)
+        pipeline.add("title_tags", lambda: self.fill_title_tags(page))
+        # 封面需要从已上传的视频里取帧，等传输完成后再设置
+        pipeline.add("thumbnail", lambda: self.set_thumbnail(page, self.thumbnail_path), after=("transfer",))
+        pipeline.add("location", lambda: self.set_location(page, "杭州市"))
+        pipeline.add("third_part", lambda: self.set_third_part(page))
         if self.publish_date != 0:
-            await self.set_schedule_time_douyin(page, self.publish_date)
-
-        # 判断视频是否发布成功
-        while True:
-            # 判断视频是否发布成功
-            try:
-                publish_button = page.get_by_role('button', name="发布", exact=True)
-                if await publish_button.count():
-                    await publish_button.click()
-                await page.wait_for_url("https://creator.douyin.com/creator-micro/content/manage**",
-                                        timeout=3000)  # 如果自动跳转到作品页面，则代表发布成功
-                douyin_logger.success("  [-]视频发布成功")
-                break
-            except:
-                douyin_logger.info("  [-] 视频正在发布中...")
-                await page.screenshot(full_page=True)
-                await asyncio.sleep(0.5)
+            pipeline.add("schedule", lambda: self.set_schedule_time_douyin(page, self.publish_date))
+        pipeline.add("publish", lambda: self.click_publish(page), after=tuple(pipeline.steps))
+        await pipeline.run()
 
         await context.storage_state(path=self.account_file)  # 保存cookie
+        # 上传页没有出现登录页，说明 cookie 有效，用新保存的文件刷新缓存
+        get_cookie_cache().set(self.account_file, SOCIAL_MEDIA_DOUYIN, True)
         douyin_logger.success('  [-]cookie更新完毕！')
         await asyncio.sleep(2)  # 这里延迟是为了方便眼睛直观的观看
-        # 关闭浏览器上下文和浏览器实例
-        await context.close()
-        await browser.close()
     
     async def set_thumbnail(self, page: Page, thumbnail_path: str):
         if thumbnail_path:
@@ -238,12 +274,22 @@ class DouYinVideo(object):
         await page.locator('div.semi-select span:has-text("输入地理位置")').click()
         await page.keyboard.press("Backspace")
         await page.wait_for_timeout(2000)
-        await page.keyboard.type(location)
-        await page.wait_for_selector('div[role="listbox"] [role="option"]', timeout=5000)
+        await type_with_suggestion(page, location, 'div[role="listbox"] [role="option"]', timeout=5)
         await page.locator('div[role="listbox"] [role="option"]').first.click()
 
+    async def upload_in_pool(self):
+        # 从共享浏览器池借用一个隔离的上下文，上传结束后自动归还
+        async with get_browser_pool().context(headless=False, executable_path=self.local_executable_path,
+                                              storage_state=f"{self.account_file}") as context:
+            await self.upload(context)
+
     async def main(self):
-        async with async_playwright() as playwright:
-            await self.upload(playwright)
+        try:
+            await self.upload_in_pool()
+        except CookieExpiredError:
+            # 只有上传页检测到登录页时才回退到扫码登录，登录后重新上传
+            douyin_logger.info('[+] cookie已失效，即将自动打开浏览器，请扫码登录，登陆后会自动生成cookie文件')
+            await douyin_cookie_gen(self.account_file)
+            await self.upload_in_pool()
 
 
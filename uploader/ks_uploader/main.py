@@ -1,39 +1,81 @@
 # -*- coding: utf-8 -*-
 from datetime import datetime
 
-from playwright.async_api import Playwright, async_playwright
+from playwright.async_api import async_playwright, BrowserContext, Page
 import os
 import asyncio
 from typing import Optional
 
-from conf import LOCAL_CHROME_PATH
-from utils.base_social_media import set_init_script
+from conf import LOCAL_CHROME_PATH, COOKIE_AUTH_STRATEGY
+from utils.base_social_media import set_init_script, CookieExpiredError, SOCIAL_MEDIA_KUAISHOU
+from utils.browser_pool import get_browser_pool
+from utils.cookie_cache import cached_cookie_auth, get_cookie_cache
+from utils.cookie_precheck import precheck_cookie_file
 from utils.files_times import get_absolute_path
+from utils.diagnostics import DiagnosticsRecorder
 from utils.log import kuaishou_logger
-
-
-async def cookie_auth(account_file):
-    async with async_playwright() as playwright:
-        browser = await playwright.chromium.launch(headless=True)
-        context = await browser.new_context(storage_state=account_file)
-        context = await set_init_script(context)
+from utils.page_state import wait_for_page_state
+from utils.publish_confirm import PublishApi, PublishConfirmation
+from utils.session_probe import async_probe_session, AUTH_STRATEGY_HTTP
+from utils.text_entry import add_hashtags, insert_text
+
+# 上传状态：页面上不再有"上传中"代表视频上传完毕
+KUAISHOU_UPLOAD_STATES = {
+    "done": {"text": "上传中", "absent": True},
+}
+# 输入 #话题 后出现的联想弹窗
+KUAISHOU_TAG_SUGGESTION = 'div[class*="_tag-list"], div[class*="_topic-list"]'
+# 发布接口：result 为 1 代表发布成功，photoId 为作品 id
+KUAISHOU_PUBLISH_API = PublishApi("/rest/cp/works/v2/video/pc/submit", "result", (1,), ("photoId", "workId"))
+
+
+async def check_cookie_on_page(page: Page) -> bool:
+    """在已经打开发布页的 page 上判断 cookie 是否有效，cookie_auth 和上传流程共用"""
+    login_name = page.locator("div.names div.container div.name:text('机构服务')")
+    try:
+        # 出现登录页的“机构服务”说明 cookie 失效，出现上传按钮则说明已登录，不必再等满5秒
+        await login_name.or_(page.locator("button[class^='_upload-btn']")).first.wait_for(state='attached',
+                                                                                            timeout=5000)
+    except:
+        return True
+    return not await login_name.count()
+
+
+@cached_cookie_auth(SOCIAL_MEDIA_KUAISHOU)
+async def cookie_auth(account_file, auth_strategy=None):
+    # 先根据关键 cookie 的过期时间判断，能确定结果时不必启动浏览器
+    precheck = precheck_cookie_file(account_file, SOCIAL_MEDIA_KUAISHOU)
+    if precheck is not None:
+        kuaishou_logger.info(f"[+] 根据 cookie 过期时间预检查: {'有效' if precheck else '已失效'}")
+        return precheck
+    # http 方式先请求平台的已登录接口，无法判断时再回退到下面的浏览器检查
+    if (auth_strategy or COOKIE_AUTH_STRATEGY) == AUTH_STRATEGY_HTTP:
+        probe = await async_probe_session(account_file, SOCIAL_MEDIA_KUAISHOU)
+        if probe is not None:
+            kuaishou_logger.info(f"[+] HTTP 会话探测: {'有效' if probe else '已失效'}")
+            return probe
+    async with get_browser_pool().context(headless=True, storage_state=account_file) as context:
         # 创建一个新的页面
         page = await context.new_page()
         # 访问指定的 URL
         await page.goto("https://cp.kuaishou.com/article/publish/video")
-        try:
-            await page.wait_for_selector("div.names div.container div.name:text('机构服务')", timeout=5000)  # 等待5秒
-
+        if not await check_cookie_on_page(page):
             kuaishou_logger.info("[+] 等待5秒 cookie 失效")
             return False
-        except:
+        else:
             kuaishou_logger.success("[+] cookie 有效")
             return True
 
 
-async def ks_setup(account_file, handle=False):
+async def ks_setup(account_file, handle=False, defer_auth=False, auth_strategy=None):
+    """
+    defer_auth 为 True 时只检查 cookie 文件是否存在，有效性交给上传流程打开发布页时顺带检测，
+    省掉一次单独的浏览器页面加载
+    """
     account_file = get_absolute_path(account_file, "ks_uploader")
-    if not os.path.exists(account_file) or not await cookie_auth(account_file):
+    if defer_auth and os.path.exists(account_file):
+        return True
+    if not os.path.exists(account_file) or not await cookie_auth(account_file, auth_strategy):
         if not handle:
             kuaishou_logger.info('[+] cookie文件不存或已失效，因为handle为False，所以不去登录')
             return False
@@ -72,25 +114,13 @@ class KSVideo(object):
         self.account_file = account_file
         self.date_format = '%Y-%m-%d %H:%M'
         self.local_executable_path = LOCAL_CHROME_PATH
+        self.post_id = None  # 发布成功后由发布接口的响应得到，写入上传账本
 
     async def handle_upload_error(self, page):
         kuaishou_logger.error("视频出错了，重新上传中")
         await page.locator('div.progress-div [class^="upload-btn-input"]').set_input_files(self.file_path)
 
-    async def upload(self, playwright: Playwright) -> None:
-        # 使用 Chromium 浏览器启动一个浏览器实例
-        print(self.local_executable_path)
-        if self.local_executable_path:
-            browser = await playwright.chromium.launch(
-                headless=False,
-                executable_path=self.local_executable_path,
-            )
-        else:
-            browser = await playwright.chromium.launch(
-                headless=False
-            )  # 创建一个浏览器上下文，使用指定的 cookie 文件
-        context = await browser.new_context(storage_state=f"{self.account_file}")
-        context = await set_init_script(context)
+    async def upload(self, context: BrowserContext) -> None:
         #context.on("close", lambda: context.storage_state(path=self.account_file))
 
         # 创建一个新的页面
@@ -101,6 +131,10 @@ class KSVideo(object):
         # 等待页面跳转到指定的 URL，没进入，则自动等待到超时
         kuaishou_logger.info('正在打开主页...')
         await page.wait_for_url("https://cp.kuaishou.com/article/publish/video")
+        # 发布页加载同时作为 cookie 校验
+        if not await check_cookie_on_page(page):
+            get_cookie_cache().invalidate(self.account_file)
+            raise CookieExpiredError(self.account_file)
         # 点击 "上传视频" 按钮
         upload_button = page.locator("button[class^='_upload-btn']")
         await upload_button.wait_for(state='visible')  # 确保按钮可见
@@ -129,79 +163,70 @@ class KSVideo(object):
         await page.keyboard.press("Control+KeyA")
         await page.keyboard.press("Delete")
         kuaishou_logger.info("filling new  title")
-        await page.keyboard.type(self.title)
+        await insert_text(page, self.title)
         await page.keyboard.press("Enter")
 
-        # 快手只能添加3个话题
-        for index, tag in enumerate(self.tags[:3], start=1):
-            kuaishou_logger.info("正在添加第%s个话题" % index)
-            await page.keyboard.type(f"#{tag} ")
-            await asyncio.sleep(3)
-
-        max_retries = 60  # 设置最大重试次数,最大等待时间为 2 分钟
-        retry_count = 0
+        # 快手只能添加3个话题，话题需要真实按键触发联想弹窗，弹窗出现后按空格确认，不再每个话题 sleep 3 秒
+        count = await add_hashtags(page, self.tags[:3], suggestion=KUAISHOU_TAG_SUGGESTION)
+        kuaishou_logger.info(f"已添加{count}个话题")
 
-        while retry_count < max_retries:
-            try:
-                # 获取包含 '上传中' 文本的元素数量
-                number = await page.locator("text=上传中").count()
-
-                if number == 0:
-                    kuaishou_logger.success("视频上传完毕")
-                    break
-                else:
-                    if retry_count % 5 == 0:
-                        kuaishou_logger.info("正在上传视频中...")
-                    await asyncio.sleep(3)
-            except Exception as e:
-                kuaishou_logger.error(f"检查上传状态时发生错误: {e}")
-                await asyncio.sleep(3)  # 等待 2 秒后重试
-            retry_count += 1
-
-        if retry_count == max_retries:
-            kuaishou_logger.warning("超过最大重试次数，视频上传可能未完成。")
+        # 页面上没有"上传中"时代表视频上传完毕，由页面里的 MutationObserver 推送状态，最长等待 3 分钟
+        kuaishou_logger.info("正在上传视频中...")
+        try:
+            await wait_for_page_state(page, KUAISHOU_UPLOAD_STATES, timeout=180)
+            kuaishou_logger.success("视频上传完毕")
+        except asyncio.TimeoutError:
+            kuaishou_logger.warning("超过最大等待时间，视频上传可能未完成。")
 
         # 定时任务
         if self.publish_date != None:
             await self.set_schedule_time(page, self.publish_date)
 
-        # 判断视频是否发布成功
-        while True:
-            try:
-                publish_button = page.get_by_text("发布", exact=True)
-                if await publish_button.count() > 0:
-                    await publish_button.click()
-
-                await asyncio.sleep(1)
-                confirm_button = page.get_by_text("确认发布")
-                if await confirm_button.count() > 0:
-                    await confirm_button.click()
-
-                # 等待页面跳转，确认发布成功
-                await page.wait_for_url(
-                    "https://cp.kuaishou.com/article/manage/video?status=2&from=publish",
-                    timeout=5000,
-                )
-                kuaishou_logger.success("视频发布成功")
-                break
-            except Exception as e:
-                kuaishou_logger.info(f"视频正在发布中... 错误: {e}")
-                await page.screenshot(full_page=True)
-                await asyncio.sleep(1)
+        # 发布接口的响应回来时立即确认结果并拿到作品 id，跳转到作品管理页作为兜底
+        # 等待期间只在内存里保留低分辨率的帧，发布失败时才写到磁盘
+        async with DiagnosticsRecorder(page, SOCIAL_MEDIA_KUAISHOU) as diagnostics, \
+                PublishConfirmation(page, KUAISHOU_PUBLISH_API) as publish:
+            while True:
+                if not publish.request_sent:
+                    publish_button = page.get_by_text("发布", exact=True)
+                    if await publish_button.count() > 0:
+                        await publish_button.click()
+
+                    await asyncio.sleep(1)
+                    confirm_button = page.get_by_text("确认发布")
+                    if await confirm_button.count() > 0:
+                        await confirm_button.click()
+
+                result = await publish.wait(
+                    timeout=5, fallback_url="https://cp.kuaishou.com/article/manage/video?status=2&from=publish")
+                if result:
+                    self.post_id = result.post_id
+                    kuaishou_logger.success(f"视频发布成功 作品id: {self.post_id}")
+                    break
+                kuaishou_logger.info("视频正在发布中...")
+                await diagnostics.capture("publishing")
 
         await context.storage_state(path=self.account_file)  # 保存cookie
+        # 上传页没有出现登录页，说明 cookie 有效，用新保存的文件刷新缓存
+        get_cookie_cache().set(self.account_file, SOCIAL_MEDIA_KUAISHOU, True)
         kuaishou_logger.info('cookie更新完毕！')
         await asyncio.sleep(3)  # 这里延迟是为了方便眼睛直观的观看
-        # 关闭浏览器上下文和浏览器实例
-        await context.close()
+
+    async def upload_in_pool(self):
+        # 从共享浏览器池借用一个隔离的上下文，上传结束后自动归还
+        async with get_browser_pool().context(headless=False, executable_path=self.local_executable_path,
+                                              storage_state=f"{self.account_file}") as context:
+            await self.upload(context)
         kuaishou_logger.info('context关闭完毕！')
-        await browser.close()
-        kuaishou_logger.info('浏览器关闭完毕！')
-        await asyncio.sleep(3)  # 这里延迟是为了等待关闭成功
 
     async def main(self):
-        async with async_playwright() as playwright:
-            await self.upload(playwright)
+        try:
+            await self.upload_in_pool()
+        except CookieExpiredError:
+            # 只有发布页检测到登录页时才回退到扫码登录，登录后重新上传
+            kuaishou_logger.info('[+] cookie已失效，即将自动打开浏览器，请扫码登录，登陆后会自动生成cookie文件')
+            await get_ks_cookie(self.account_file)
+            await self.upload_in_pool()
 
     async def set_schedule_time(self, page, publish_date):
         kuaishou_logger.info("click schedule")
@@ -1,14 +1,31 @@
 # -*- coding: utf-8 -*-
 from datetime import datetime
 
-from playwright.async_api import Playwright, async_playwright
+from playwright.async_api import async_playwright, BrowserContext, Page
 import os
 import asyncio
 
-from conf import LOCAL_CHROME_PATH
-from utils.base_social_media import set_init_script
+from conf import LOCAL_CHROME_PATH, COOKIE_AUTH_STRATEGY
+from utils.base_social_media import set_init_script, CookieExpiredError, SOCIAL_MEDIA_TENCENT
+from utils.browser_pool import get_browser_pool
+from utils.cookie_cache import cached_cookie_auth, get_cookie_cache
+from utils.cookie_precheck import precheck_cookie_file
 from utils.files_times import get_absolute_path
+from utils.diagnostics import DiagnosticsRecorder
 from utils.log import tencent_logger
+from utils.page_state import PageStateWatcher
+from utils.publish_confirm import PublishApi, PublishConfirmation
+from utils.session_probe import async_probe_session, AUTH_STRATEGY_HTTP
+from utils.text_entry import add_hashtags, insert_text
+from utils.upload_steps import StepPipeline
+
+# 上传状态："发表"按钮不再是禁用样式代表视频上传完毕，出现错误提示和"删除"按钮代表出错
+TENCENT_UPLOAD_STATES = {
+    "done": {"css": "div.form-btns button", "text": "发表", "class_absent": "weui-desktop-btn_disabled"},
+    "error": [{"css": "div.status-msg.error"}, {"css": "div.media-status-content div.tag-inner", "text": "删除"}],
+}
+# 发布接口：errCode 为 0 代表发表成功，exportId / objectId 为作品 id
+TENCENT_PUBLISH_API = PublishApi("/post/post_create", "errCode", (0,), ("exportId", "objectId"))
 
 
 def format_str_for_short_title(origin_title: str) -> str:
@@ -31,20 +48,39 @@ def format_str_for_short_title(origin_title: str) -> str:
     return formatted_string
 
 
-async def cookie_auth(account_file):
-    async with async_playwright() as playwright:
-        browser = await playwright.chromium.launch(headless=True)
-        context = await browser.new_context(storage_state=account_file)
-        context = await set_init_script(context)
+async def check_cookie_on_page(page: Page) -> bool:
+    """在已经打开发表页的 page 上判断 cookie 是否有效，cookie_auth 和上传流程共用"""
+    login_title = page.locator('div.title-name:has-text("微信小店")')
+    try:
+        # 出现登录页的“微信小店”说明 cookie 失效，出现上传控件则说明已登录，不必再等满5秒
+        await login_title.or_(page.locator('input[type="file"]')).first.wait_for(state='attached', timeout=5000)
+    except:
+        return True
+    return not await login_title.count()
+
+
+@cached_cookie_auth(SOCIAL_MEDIA_TENCENT)
+async def cookie_auth(account_file, auth_strategy=None):
+    # 先根据关键 cookie 的过期时间判断，能确定结果时不必启动浏览器
+    precheck = precheck_cookie_file(account_file, SOCIAL_MEDIA_TENCENT)
+    if precheck is not None:
+        tencent_logger.info(f"[+] 根据 cookie 过期时间预检查: {'有效' if precheck else '已失效'}")
+        return precheck
+    # http 方式先请求平台的已登录接口，无法判断时再回退到下面的浏览器检查
+    if (auth_strategy or COOKIE_AUTH_STRATEGY) == AUTH_STRATEGY_HTTP:
+        probe = await async_probe_session(account_file, SOCIAL_MEDIA_TENCENT)
+        if probe is not None:
+            tencent_logger.info(f"[+] HTTP 会话探测: {'有效' if probe else '已失效'}")
+            return probe
+    async with get_browser_pool().context(headless=True, storage_state=account_file) as context:
         # 创建一个新的页面
         page = await context.new_page()
         # 访问指定的 URL
         await page.goto("https://channels.weixin.qq.com/platform/post/create")
-        try:
-            await page.wait_for_selector('div.title-name:has-text("微信小店")', timeout=5000)  # 等待5秒
+        if not await check_cookie_on_page(page):
             tencent_logger.error("[+] 等待5秒 cookie 失效")
             return False
-        except:
+        else:
             tencent_logger.success("[+] cookie 有效")
             return True
 
@@ -70,9 +106,15 @@ async def get_tencent_cookie(account_file):
         await context.storage_state(path=account_file)
 
 
-async def weixin_setup(account_file, handle=False):
+async def weixin_setup(account_file, handle=False, defer_auth=False, auth_strategy=None):
+    """
+    defer_auth 为 True 时只检查 cookie 文件是否存在，有效性交给上传流程打开发表页时顺带检测，
+    省掉一次单独的浏览器页面加载
+    """
     account_file = get_absolute_path(account_file, "tencent_uploader")
-    if not os.path.exists(account_file) or not await cookie_auth(account_file):
+    if defer_auth and os.path.exists(account_file):
+        return True
+    if not os.path.exists(account_file) or not await cookie_auth(account_file, auth_strategy):
         if not handle:
             # Todo alert message
             return False
@@ -90,6 +132,7 @@ class TencentVideo(object):
         self.account_file = account_file
         self.category = category
         self.local_executable_path = LOCAL_CHROME_PATH
+        self.post_id = None  # 发布成功后由发布接口的响应得到，写入上传账本
 
     async def set_schedule_time_tencent(self, page, publish_date):
         label_element = page.locator("label").filter(has_text="定时").nth(1)
@@ -133,13 +176,7 @@ class TencentVideo(object):
         file_input = page.locator('input[type="file"]')
         await file_input.set_input_files(self.file_path)
 
-    async def upload(self, playwright: Playwright) -> None:
-        # 使用 Chromium (这里使用系统内浏览器，用chromium 会造成h264错误
-        browser = await playwright.chromium.launch(headless=False, executable_path=self.local_executable_path)
-        # 创建一个浏览器上下文，使用指定的 cookie 文件
-        context = await browser.new_context(storage_state=f"{self.account_file}")
-        context = await set_init_script(context)
-
+    async def upload(self, context: BrowserContext) -> None:
         # 创建一个新的页面
         page = await context.new_page()
         # 访问指定的 URL
@@ -147,32 +184,38 @@ class TencentVideo(object):
         tencent_logger.info(f'[+]正在上传-------{self.title}.mp4')
         # 等待页面跳转到指定的 URL，没进入，则自动等待到超时
         await page.wait_for_url("https://channels.weixin.qq.com/platform/post/create")
+        # 发表页加载同时作为 cookie 校验
+        if not await check_cookie_on_page(page):
+            get_cookie_cache().invalidate(self.account_file)
+            raise CookieExpiredError(self.account_file)
         # await page.wait_for_selector('input[type="file"]', timeout=10000)
         file_input = page.locator('input[type="file"]')
         await file_input.set_input_files(self.file_path)
+        # 视频传输的同时填写表单，只有发布需要等传输完成；操作页面的步骤依次执行，避免抢焦点
+        pipeline = StepPipeline(SOCIAL_MEDIA_TENCENT)
+        pipeline.add("transfer", lambda: self.detect_upload_status(page, pipeline.input_lock), exclusive=False)
         # 填充标题和话题
-        await self.add_title_tags(page)
+        pipeline.add("title_tags", lambda: self.add_title_tags(page))
         # 添加商品
-        # await self.add_product(page)
+        # pipeline.add("product", lambda: self.add_product(page))
         # 合集功能
-        await self.add_collection(page)
+        pipeline.add("collection", lambda: self.add_collection(page))
         # 原创选择
-        await self.add_original(page)
-        # 检测上传状态
-        await self.detect_upload_status(page)
+        pipeline.add("original", lambda: self.add_original(page))
         if self.publish_date != 0:
-            await self.set_schedule_time_tencent(page, self.publish_date)
+            # 设置定时后会点击标题栏让时间生效，放在标题之后
+            pipeline.add("schedule", lambda: self.set_schedule_time_tencent(page, self.publish_date),
+                         after=("title_tags",))
         # 添加短标题
-        await self.add_short_title(page)
-
-        await self.click_publish(page)
+        pipeline.add("short_title", lambda: self.add_short_title(page))
+        pipeline.add("publish", lambda: self.click_publish(page), after=tuple(pipeline.steps))
+        await pipeline.run()
 
         await context.storage_state(path=f"{self.account_file}")  # 保存cookie
+        # 上传页没有出现登录页，说明 cookie 有效，用新保存的文件刷新缓存
+        get_cookie_cache().set(self.account_file, SOCIAL_MEDIA_TENCENT, True)
         tencent_logger.success('  [-]cookie更新完毕！')
         await asyncio.sleep(2)  # 这里延迟是为了方便眼睛直观的观看
-        # 关闭浏览器上下文和浏览器实例
-        await context.close()
-        await browser.close()
 
     async def add_short_title(self, page):
         short_title_element = page.get_by_text("短标题", exact=True).locator("..").locator(
@@ -183,53 +226,43 @@ class TencentVideo(object):
             await short_title_element.fill(short_title)
 
     async def click_publish(self, page):
-        while True:
-            try:
+        # 发布接口的响应回来时立即确认结果并拿到作品 id，跳转到作品列表页作为兜底
+        # 等待期间只在内存里保留低分辨率的帧，发布失败时才写到磁盘
+        async with DiagnosticsRecorder(page, SOCIAL_MEDIA_TENCENT) as diagnostics, \
+                PublishConfirmation(page, TENCENT_PUBLISH_API) as publish:
+            while True:
                 publish_buttion = page.locator('div.form-btns button:has-text("发表")')
-                if await publish_buttion.count():
+                if not publish.request_sent and await publish_buttion.count():
                     await publish_buttion.click()
-                await page.wait_for_url("https://channels.weixin.qq.com/platform/post/list", timeout=1500)
-                tencent_logger.success("  [-]视频发布成功")
-                break
-            except Exception as e:
-                current_url = page.url
-                if "https://channels.weixin.qq.com/platform/post/list" in current_url:
-                    tencent_logger.success("  [-]视频发布成功")
+                result = await publish.wait(timeout=1.5,
+                                            fallback_url="https://channels.weixin.qq.com/platform/post/list")
+                if result:
+                    self.post_id = result.post_id
+                    tencent_logger.success(f"  [-]视频发布成功 作品id: {self.post_id}")
                     break
-                else:
-                    tencent_logger.exception(f"  [-] Exception: {e}")
-                    tencent_logger.info("  [-] 视频正在发布中...")
-                    await asyncio.sleep(0.5)
-
-    async def detect_upload_status(self, page):
-        while True:
-            # 匹配删除按钮，代表视频上传完毕，如果不存在，代表视频正在上传，则等待
-            try:
-                # 匹配删除按钮，代表视频上传完毕
-                if "weui-desktop-btn_disabled" not in await page.get_by_role("button", name="发表").get_attribute(
-                        'class'):
+                tencent_logger.info("  [-] 视频正在发布中...")
+                await diagnostics.capture("publishing")
+
+    async def detect_upload_status(self, page, input_lock: asyncio.Lock = None):
+        # "发表"按钮可点击代表视频上传完毕，由页面里的 MutationObserver 推送状态，不再每 2 秒轮询
+        tencent_logger.info("  [-] 正在上传视频中...")
+        async with PageStateWatcher(page, TENCENT_UPLOAD_STATES) as upload_state:
+            while True:
+                if await upload_state.next() == "done":
                     tencent_logger.info("  [-]视频上传完毕")
                     break
-                else:
-                    tencent_logger.info("  [-] 正在上传视频中...")
-                    await asyncio.sleep(2)
-                    # 出错了视频出错
-                    if await page.locator('div.status-msg.error').count() and await page.locator(
-                            'div.media-status-content div.tag-inner:has-text("删除")').count():
-                        tencent_logger.error("  [-] 发现上传出错了...准备重试")
-                        await self.handle_upload_error(page)
-            except:
-                tencent_logger.info("  [-] 正在上传视频中...")
-                await asyncio.sleep(2)
+                tencent_logger.error("  [-] 发现上传出错了...准备重试")
+                # 重新上传要操作页面，等正在填写的表单步骤完成
+                async with input_lock or asyncio.Lock():
+                    await self.handle_upload_error(page)
 
     async def add_title_tags(self, page):
         await page.locator("div.input-editor").click()
-        await page.keyboard.type(self.title)
+        await insert_text(page, self.title)
         await page.keyboard.press("Enter")
-        for index, tag in enumerate(self.tags, start=1):
-            await page.keyboard.type("#" + tag)
-            await page.keyboard.press("Space")
-        tencent_logger.info(f"成功添加hashtag: {len(self.tags)}")
+        # 视频号输入 #话题 后按空格即可识别，不需要联想弹窗，整段写入
+        count = await add_hashtags(page, self.tags)
+        tencent_logger.info(f"成功添加hashtag: {count}")
 
     async def add_collection(self, page):
         collection_elements = page.get_by_text("添加到合集").locator("xpath=following-sibling::div").locator(
@@ -262,6 +295,18 @@ class TencentVideo(object):
             if await page.locator('button:has-text("声明原创"):visible').count():
                 await page.locator('button:has-text("声明原创"):visible').click()
 
+    async def upload_in_pool(self):
+        # 使用 Chromium (这里使用系统内浏览器，用chromium 会造成h264错误
+        # 从共享浏览器池借用一个隔离的上下文，上传结束后自动归还
+        async with get_browser_pool().context(headless=False, executable_path=self.local_executable_path,
+                                              storage_state=f"{self.account_file}") as context:
+            await self.upload(context)
+
     async def main(self):
-        async with async_playwright() as playwright:
-            await self.upload(playwright)
+        try:
+            await self.upload_in_pool()
+        except CookieExpiredError:
+            # 只有发表页检测到登录页时才回退到扫码登录，登录后重新上传
+            tencent_logger.info('[+] cookie已失效，即将自动打开浏览器，请扫码登录，登陆后会自动生成cookie文件')
+            await get_tencent_cookie(self.account_file)
+            await self.upload_in_pool()
@@ -6,7 +6,8 @@ from playwright.async_api import Playwright, async_playwright
 import os
 import asyncio
 from uploader.tk_uploader.tk_config import Tk_Locator
-from utils.base_social_media import set_init_script
+from utils.base_social_media import set_init_script, SOCIAL_MEDIA_TIKTOK
+from utils.diagnostics import DiagnosticsRecorder
 from utils.files_times import get_absolute_path
 from utils.log import tiktok_logger
 
@@ -217,24 +218,26 @@ class TiktokVideo(object):
 
     async def click_publish(self, page):
         success_flag_div = '#\\:r9\\:'
-        while True:
-            try:
-                publish_button = self.locator_base.locator('div.btn-post')
-                if await publish_button.count():
-                    await publish_button.click()
-
-                await self.locator_base.locator(success_flag_div).wait_for(state="visible", timeout=3000)
-                tiktok_logger.success("  [-] video published success")
-                break
-            except Exception as e:
-                if await self.locator_base.locator(success_flag_div).count():
-                    tiktok_logger.success("  [-]video published success")
+        # keep a few low resolution frames in memory instead of a full page screenshot per retry
+        async with DiagnosticsRecorder(page, SOCIAL_MEDIA_TIKTOK) as diagnostics:
+            while True:
+                try:
+                    publish_button = self.locator_base.locator('div.btn-post')
+                    if await publish_button.count():
+                        await publish_button.click()
+
+                    await self.locator_base.locator(success_flag_div).wait_for(state="visible", timeout=3000)
+                    tiktok_logger.success("  [-] video published success")
                     break
-                else:
-                    tiktok_logger.exception(f"  [-] Exception: {e}")
-                    tiktok_logger.info("  [-] video publishing")
-                    await page.screenshot(full_page=True)
-                    await asyncio.sleep(0.5)
+                except Exception as e:
+                    if await self.locator_base.locator(success_flag_div).count():
+                        tiktok_logger.success("  [-]video published success")
+                        break
+                    else:
+                        tiktok_logger.exception(f"  [-] Exception: {e}")
+                        tiktok_logger.info("  [-] video publishing")
+                        await diagnostics.capture("publishing")
+                        await asyncio.sleep(0.5)
 
     async def detect_upload_status(self, page):
         while True:
@@ -2,46 +2,89 @@
 import re
 from datetime import datetime
 
-from playwright.async_api import Playwright, async_playwright
+from playwright.async_api import async_playwright, BrowserContext, Page
 import os
 import asyncio
 
-from conf import LOCAL_CHROME_PATH
+from conf import LOCAL_CHROME_PATH, COOKIE_AUTH_STRATEGY
 from uploader.tk_uploader.tk_config import Tk_Locator
-from utils.base_social_media import set_init_script
+from utils.base_social_media import set_init_script, CookieExpiredError, SOCIAL_MEDIA_TIKTOK
+from utils.browser_pool import get_browser_pool
+from utils.cookie_cache import cached_cookie_auth, get_cookie_cache
+from utils.cookie_precheck import precheck_cookie_file
 from utils.files_times import get_absolute_path
+from utils.diagnostics import DiagnosticsRecorder
 from utils.log import tiktok_logger
-
-
-async def cookie_auth(account_file):
-    async with async_playwright() as playwright:
-        browser = await playwright.chromium.launch(headless=True)
-        context = await browser.new_context(storage_state=account_file)
-        context = await set_init_script(context)
+from utils.page_state import PageStateWatcher
+from utils.publish_confirm import PublishApi, PublishConfirmation
+from utils.session_probe import async_probe_session, AUTH_STRATEGY_HTTP
+from utils.text_entry import add_hashtags, insert_text
+from utils.upload_steps import StepPipeline
+
+# upload state: the Post button is enabled when the video is uploaded, the "Select file" button shows up on error
+TIKTOK_UPLOAD_STATES = {
+    "done": {"css": "div.button-group > button", "text": "Post", "attr_absent": "disabled"},
+    "error": {"css": 'button[aria-label="Select file"]'},
+}
+# right after the file is chosen the original "Select file" button can still be in the DOM,
+# an error is only handled if the button is still there this many seconds after (re)selecting the file
+TIKTOK_UPLOAD_ERROR_GRACE = 2
+# hashtag popup shown while typing a #tag
+TIKTOK_TAG_SUGGESTION = 'div.mention-list-popover'
+# post api: status_code 0 means published, item_id is the post id
+TIKTOK_PUBLISH_API = PublishApi("/tiktok/web/project/post", "status_code", (0,), ("item_id", "aweme_id"))
+
+
+async def check_cookie_on_page(page: Page) -> bool:
+    """check the cookie on a page which already opened the upload url, shared by cookie_auth and upload"""
+    try:
+        # 选择所有的 select 元素
+        select_elements = await page.query_selector_all('select')
+        for element in select_elements:
+            class_name = await element.get_attribute('class')
+            # 使用正则表达式匹配特定模式的 class 名称
+            if class_name and re.match(r'tiktok-.*-SelectFormContainer.*', class_name):
+                return False
+        return True
+    except:
+        return True
+
+
+@cached_cookie_auth(SOCIAL_MEDIA_TIKTOK)
+async def cookie_auth(account_file, auth_strategy=None):
+    # judge by the expires of the session cookies first, no browser is needed when it is conclusive
+    precheck = precheck_cookie_file(account_file, SOCIAL_MEDIA_TIKTOK)
+    if precheck is not None:
+        tiktok_logger.info(f"[+] cookie precheck by expires: {'valid' if precheck else 'expired'}")
+        return precheck
+    # the http strategy asks a cheap logged-in api first, the browser check below stays as the fallback
+    if (auth_strategy or COOKIE_AUTH_STRATEGY) == AUTH_STRATEGY_HTTP:
+        probe = await async_probe_session(account_file, SOCIAL_MEDIA_TIKTOK)
+        if probe is not None:
+            tiktok_logger.info(f"[+] cookie http probe: {'valid' if probe else 'expired'}")
+            return probe
+    async with get_browser_pool().context(headless=True, storage_state=account_file) as context:
         # 创建一个新的页面
         page = await context.new_page()
         # 访问指定的 URL
         await page.goto("https://www.tiktok.com/tiktokstudio/upload?lang=en")
         await page.wait_for_load_state('networkidle')
-        try:
-            # 选择所有的 select 元素
-            select_elements = await page.query_selector_all('select')
-            for element in select_elements:
-                class_name = await element.get_attribute('class')
-                # 使用正则表达式匹配特定模式的 class 名称
-                if re.match(r'tiktok-.*-SelectFormContainer.*', class_name):
-                    tiktok_logger.error("[+] cookie expired")
-                    return False
-            tiktok_logger.success("[+] cookie valid")
-            return True
-        except:
-            tiktok_logger.success("[+] cookie valid")
-            return True
-
-
-async def tiktok_setup(account_file, handle=False):
+        if not await check_cookie_on_page(page):
+            tiktok_logger.error("[+] cookie expired")
+            return False
+        tiktok_logger.success("[+] cookie valid")
+        return True
+
+
+async def tiktok_setup(account_file, handle=False, defer_auth=False, auth_strategy=None):
+    """
+    with defer_auth=True only the existence of the cookie file is checked here,
+    the upload flow checks the cookie on the upload page it opens anyway
+    """
     account_file = get_absolute_path(account_file, "tk_uploader")
-    if not os.path.exists(account_file) or not await cookie_auth(account_file):
+    if defer_auth and os.path.exists(account_file):
+        return True
+    if not os.path.exists(account_file) or not await cookie_auth(account_file, auth_strategy):
         if not handle:
             return False
         tiktok_logger.info('[+] cookie file is not existed or expired. Now open the browser auto. Please login with your way(gmail phone, whatever, the cookie file will generated after login')
@@ -80,6 +123,8 @@ class TiktokVideo(object):
         self.account_file = account_file
         self.local_executable_path = LOCAL_CHROME_PATH
         self.locator_base = None
+        self.base_frame = None
+        self.post_id = None  # filled from the post api response, recorded in the upload ledger
 
     async def set_schedule_time(self, page, publish_date):
         schedule_input_element = self.locator_base.get_by_label('Schedule')
@@ -149,10 +194,7 @@ class TiktokVideo(object):
         file_chooser = await fc_info.value
         await file_chooser.set_files(self.file_path)
 
-    async def upload(self, playwright: Playwright) -> None:
-        browser = await playwright.chromium.launch(headless=False, executable_path=self.local_executable_path)
-        context = await browser.new_context(storage_state=f"{self.account_file}")
-        context = await set_init_script(context)
+    async def upload(self, context: BrowserContext) -> None:
         page = await context.new_page()
 
         # change language to eng first
@@ -167,6 +209,10 @@ class TiktokVideo(object):
             tiktok_logger.info("Either iframe or div appeared.")
         except Exception as e:
             tiktok_logger.error("Neither iframe nor div appeared within the timeout.")
+        # the upload page load doubles as the cookie check
+        if not await check_cookie_on_page(page):
+            get_cookie_cache().invalidate(self.account_file)
+            raise CookieExpiredError(self.account_file)
 
         await self.choose_base_locator(page)
 
@@ -179,24 +225,24 @@ class TiktokVideo(object):
         file_chooser = await fc_info.value
         await file_chooser.set_files(self.file_path)
 
-        await self.add_title_tags(page)
-        # detect upload status
-        await self.detect_upload_status(page)
+        # fill the form while the video is still transferring, only publishing waits for the transfer;
+        # steps that touch the page run one at a time so they do not steal focus from each other
+        pipeline = StepPipeline(SOCIAL_MEDIA_TIKTOK)
+        pipeline.add("transfer", lambda: self.detect_upload_status(page, pipeline.input_lock), exclusive=False)
+        pipeline.add("title_tags", lambda: self.add_title_tags(page))
         if self.thumbnail_path:
-            tiktok_logger.info(f'[+] Uploading thumbnail file {self.title}.png')
-            await self.upload_thumbnails(page)
-
+            # the cover editor needs frames of the uploaded video
+            pipeline.add("thumbnail", lambda: self.upload_thumbnails(page), after=("transfer",))
         if self.publish_date != 0:
-            await self.set_schedule_time(page, self.publish_date)
-
-        await self.click_publish(page)
+            pipeline.add("schedule", lambda: self.set_schedule_time(page, self.publish_date))
+        pipeline.add("publish", lambda: self.click_publish(page), after=tuple(pipeline.steps))
+        await pipeline.run()
 
         await context.storage_state(path=f"{self.account_file}")  # save cookie
+        # 上传页没有出现登录页，说明 cookie 有效，用新保存的文件刷新缓存
+        get_cookie_cache().set(self.account_file, SOCIAL_MEDIA_TIKTOK, True)
         tiktok_logger.info('  [-] update cookie！')
         await asyncio.sleep(2)  # close delay for look the video status
-        # close all
-        await context.close()
-        await browser.close()
 
     async def add_title_tags(self, page):
 
@@ -211,27 +257,20 @@ class TiktokVideo(object):
 
         await page.keyboard.press("End")
 
-        await page.wait_for_timeout(1000)  # 等待1秒
-
-        await page.keyboard.insert_text(self.title)
-        await page.wait_for_timeout(1000)  # 等待1秒
+        await insert_text(page, self.title)
         await page.keyboard.press("End")
 
         await page.keyboard.press("Enter")
 
-        # tag part
+        # tag part: the last key stroke of each tag opens the hashtag popup, Space turns it into a hashtag
         for index, tag in enumerate(self.tags, start=1):
             tiktok_logger.info("Setting the %s tag" % index)
             await page.keyboard.press("End")
-            await page.wait_for_timeout(1000)  # 等待1秒
-            await page.keyboard.insert_text("#" + tag + " ")
-            await page.keyboard.press("Space")
-            await page.wait_for_timeout(1000)  # 等待1秒
-
-            await page.keyboard.press("Backspace")
-            await page.keyboard.press("End")
+            # the form may live in Upload_index_iframe, the popup is rendered in the same frame
+            await add_hashtags(page, [tag], suggestion=TIKTOK_TAG_SUGGESTION, root=self.base_frame)
 
     async def upload_thumbnails(self, page):
+        tiktok_logger.info(f'[+] Uploading thumbnail file {self.title}.png')
         await self.locator_base.locator(".cover-container").click()
         await self.locator_base.locator(".cover-edit-container >> text=Upload cover").click()
         async with page.expect_file_chooser() as fc_info:
@@ -253,52 +292,66 @@ class TiktokVideo(object):
         await page.locator('#lang-setting-popup-list >> text=English').click()
 
     async def click_publish(self, page):
+        # the post api response confirms the result at once and carries the post id,
+        # the confirm modal is kept as a fallback
         success_flag_div = 'div.common-modal-confirm-modal'
-        while True:
-            try:
+        # keep a few low resolution frames in memory, they are written to disk only if publishing fails
+        async with DiagnosticsRecorder(page, SOCIAL_MEDIA_TIKTOK) as diagnostics, \
+                PublishConfirmation(page, TIKTOK_PUBLISH_API) as publish:
+            while True:
                 publish_button = self.locator_base.locator('div.button-group button').nth(0)
-                if await publish_button.count():
+                if not publish.request_sent and await publish_button.count():
                     await publish_button.click()
-
-                await self.locator_base.locator(success_flag_div).wait_for(state="visible", timeout=3000)
-                tiktok_logger.success("  [-] video published success")
-                break
-            except Exception as e:
-                if await self.locator_base.locator(success_flag_div).count():
-                    tiktok_logger.success("  [-]video published success")
+                result = await publish.wait(timeout=3, fallback=lambda: self.locator_base.locator(
+                    success_flag_div).wait_for(state="visible", timeout=0))
+                if result:
+                    self.post_id = result.post_id
+                    tiktok_logger.success(f"  [-] video published success, post id: {self.post_id}")
                     break
-                else:
-                    tiktok_logger.exception(f"  [-] Exception: {e}")
-                    tiktok_logger.info("  [-] video publishing")
-                    await page.screenshot(full_page=True)
-                    await asyncio.sleep(0.5)
-
-    async def detect_upload_status(self, page):
-        while True:
-            try:
-                # if await self.locator_base.locator('div.btn-post > button').get_attribute("disabled") is None:
-                if await self.locator_base.locator(
-                        'div.button-group > button >> text=Post').get_attribute("disabled") is None:
+                tiktok_logger.info("  [-] video publishing")
+                await diagnostics.capture("publishing")
+
+    async def detect_upload_status(self, page, input_lock: asyncio.Lock = None):
+        # the page pushes state changes through a MutationObserver, no more 2 second polling
+        tiktok_logger.info("  [-] video uploading...")
+        loop = asyncio.get_running_loop()
+        selected_at = loop.time()
+        async with PageStateWatcher(page, TIKTOK_UPLOAD_STATES, frame=self.base_frame) as upload_state:
+            while True:
+                if await upload_state.next() == "done":
                     tiktok_logger.info("  [-]video uploaded.")
                     break
-                else:
-                    tiktok_logger.info("  [-] video uploading...")
-                    await asyncio.sleep(2)
-                    if await self.locator_base.locator(
-                            'button[aria-label="Select file"]').count():
-                        tiktok_logger.info("  [-] found some error while uploading now retry...")
-                        await self.handle_upload_error(page)
-            except:
-                tiktok_logger.info("  [-] video uploading...")
-                await asyncio.sleep(2)
+                remaining = TIKTOK_UPLOAD_ERROR_GRACE - (loop.time() - selected_at)
+                if remaining > 0:
+                    await asyncio.sleep(remaining)
+                    if not await self.locator_base.locator(TIKTOK_UPLOAD_STATES["error"]["css"]).count():
+                        continue
+                tiktok_logger.info("  [-] found some error while uploading now retry...")
+                # re-selecting the file touches the page, wait for the form step in progress
+                async with input_lock or asyncio.Lock():
+                    await self.handle_upload_error(page)
+                selected_at = loop.time()
 
     async def choose_base_locator(self, page):
         # await page.wait_for_selector('div.upload-container')
         if await page.locator('iframe[data-tt="Upload_index_iframe"]').count():
             self.locator_base = page.frame_locator(Tk_Locator.tk_iframe)
+            self.base_frame = await (await page.query_selector(Tk_Locator.tk_iframe)).content_frame()
         else:
-            self.locator_base = page.locator(Tk_Locator.default) 
+            self.locator_base = page.locator(Tk_Locator.default)
+            self.base_frame = page.main_frame
+
+    async def upload_in_pool(self):
+        # borrow an isolated context from the shared browser pool, it is returned after upload
+        async with get_browser_pool().context(headless=False, executable_path=self.local_executable_path,
+                                              storage_state=f"{self.account_file}") as context:
+            await self.upload(context)
 
     async def main(self):
-        async with async_playwright() as playwright:
-            await self.upload(playwright)
+        try:
+            await self.upload_in_pool()
+        except CookieExpiredError:
+            # only fall back to the interactive login when the upload page shows the login form
+            tiktok_logger.info('[+] cookie expired. Now open the browser auto. Please login with your way, then upload again')
+            await get_tiktok_cookie(self.account_file)
+            await self.upload_in_pool()
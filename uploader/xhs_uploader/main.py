@@ -1,52 +1,45 @@
 import configparser
 import json
 import pathlib
-from time import sleep
 
 import requests
-from playwright.sync_api import sync_playwright
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from xhs import XhsClient
 
-from conf import BASE_DIR, XHS_SERVER
+from conf import BASE_DIR, XHS_SERVER, XHS_SIGN_CLIENT_TIMEOUT, XHS_SIGN_CLIENT_RETRIES
+from uploader.xhs_uploader.signer import get_signer
+from uploader.xhs_uploader.topics import resolve_topics
+from utils.log import xhs_logger
 
 config = configparser.RawConfigParser()
 config.read('accounts.ini')
 
 
 def sign_local(uri, data=None, a1="", web_session=""):
-    for _ in range(10):
-        try:
-            with sync_playwright() as playwright:
-                stealth_js_path = pathlib.Path(BASE_DIR / "utils/stealth.min.js")
-                chromium = playwright.chromium
-
-                # 如果一直失败可尝试设置成 False 让其打开浏览器，适当添加 sleep 可查看浏览器状态
-                browser = chromium.launch(headless=True)
-
-                browser_context = browser.new_context()
-                browser_context.add_init_script(path=stealth_js_path)
-                context_page = browser_context.new_page()
-                context_page.goto("https://www.xiaohongshu.com")
-                browser_context.add_cookies([
-                    {'name': 'a1', 'value': a1, 'domain': ".xiaohongshu.com", 'path': "/"}]
-                )
-                context_page.reload()
-                # 这个地方设置完浏览器 cookie 之后，如果这儿不 sleep 一下签名获取就失败了，如果经常失败请设置长一点试试
-                sleep(2)
-                encrypt_params = context_page.evaluate("([url, data]) => window._webmsxyw(url, data)", [uri, data])
-                return {
-                    "x-s": encrypt_params["X-s"],
-                    "x-t": str(encrypt_params["X-t"])
-                }
-        except Exception:
-            # 这儿有时会出现 window._webmsxyw is not a function 或未知跳转错误，因此加一个失败重试趴
-            pass
-    raise Exception("重试了这么多次还是无法签名成功，寄寄寄")
+    # 由常驻的签名页完成签名，每个 a1 只在第一次签名时打开浏览器页面
+    return get_signer().sign(uri, data, a1=a1, web_session=web_session)
+
+
+def _create_sign_session() -> requests.Session:
+    """签名服务的 keep-alive 连接池，服务繁忙(503)或重启(502/504、连接失败)时退避重试"""
+    retry = Retry(total=XHS_SIGN_CLIENT_RETRIES, backoff_factor=0.2, status_forcelist=(502, 503, 504),
+                  allowed_methods=None, respect_retry_after_header=True, raise_on_status=False)
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=8, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+_sign_session = _create_sign_session()
 
 
 def sign(uri, data=None, a1="", web_session=""):
-    # 填写自己的 flask 签名服务端口地址
-    res = requests.post(f"{XHS_SERVER}/sign",
-                        json={"uri": uri, "data": data, "a1": a1, "web_session": web_session})
+    # 签名服务地址见 conf.XHS_SERVER，可用 python -m uploader.xhs_uploader.sign_server 启动
+    res = _sign_session.post(f"{XHS_SERVER}/sign", timeout=XHS_SIGN_CLIENT_TIMEOUT,
+                             json={"uri": uri, "data": data, "a1": a1, "web_session": web_session})
+    res.raise_for_status()
     signs = res.json()
     return {
         "x-s": signs["x-s"],
@@ -56,3 +49,34 @@ def sign(uri, data=None, a1="", web_session=""):
 
 def beauty_print(data: dict):
     print(json.dumps(data, ensure_ascii=False, indent=2))
+
+
+def get_xhs_client(account_name: str = "account1", sign_func=sign_local) -> XhsClient:
+    """用 accounts.ini 中 account_name 段的 cookies 创建 XhsClient"""
+    accounts = configparser.RawConfigParser()
+    accounts.read(pathlib.Path(BASE_DIR / "uploader" / "xhs_uploader" / "accounts.ini"))
+    return XhsClient(accounts[account_name]['cookies'], sign=sign_func, timeout=60)
+
+
+def upload_video_note(xhs_client: XhsClient, title, video_file, tags, post_time=None):
+    """
+    发布视频笔记，前三个 hashtag 换成官方话题。同步阻塞，在协程中调用时请放到线程池执行。
+
+    Args:
+        post_time: 定时发布时间，格式 "%Y-%m-%d %H:%M:%S"，None 表示立即发布
+    """
+    # 加入到标题 补充标题（xhs 可以填1000字不写白不写）
+    tags_str = ' '.join(['#' + tag for tag in tags])
+    # 获取hashtag，话题查询结果有缓存，重复的 tag 不再请求
+    resolved = resolve_topics(xhs_client, tags[:3])
+    topics = [topic for topic in resolved.values() if topic]
+    hash_tags = [topic['name'] for topic in topics]
+    hash_tags_str = ' ' + ' '.join(['#' + tag + '[话题]#' for tag in hash_tags])
+
+    note = xhs_client.create_video_note(title=title[:20], video_path=str(video_file),
+                                        desc=title + tags_str + hash_tags_str,
+                                        topics=topics,
+                                        is_private=False,
+                                        post_time=post_time)
+    xhs_logger.success(f'[+] {pathlib.Path(video_file).name} 发布成功')
+    return note
@@ -0,0 +1,225 @@
+"""
+内置的小红书签名服务，多个账号、多个上传进程共用一组常驻签名页。
+
+启动：
+
+    python -m uploader.xhs_uploader.sign_server --workers 2
+
+接口：
+    POST /sign     {"uri": ..., "data": ..., "a1": ..., "web_session": ...} -> {"x-s": ..., "x-t": ...}
+    GET  /metrics  请求数、排队拒绝数、签名耗时直方图
+    GET  /health
+"""
+import argparse
+import bisect
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+from urllib.parse import urlparse
+
+from conf import XHS_SERVER, XHS_SIGN_SERVER_WORKERS, XHS_SIGN_SERVER_MAX_PENDING
+from uploader.xhs_uploader.signer import XhsSigner
+from utils.log import xhs_logger
+
+# 签名耗时直方图的桶上限(毫秒)，最后一个桶为 +Inf
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class LatencyHistogram(object):
+    """线程安全的耗时直方图"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, ms: float):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, ms)] += 1
+            self.total += 1
+            self.sum_ms += ms
+
+    def quantile(self, q: float) -> Optional[float]:
+        """按桶估算分位数，返回所在桶的上限(毫秒)，超过最大桶时返回 None"""
+        with self._lock:
+            if not self.total:
+                return None
+            rank = q * self.total
+            seen = 0
+            for index, count in enumerate(self.counts):
+                seen += count
+                if seen >= rank:
+                    return self.buckets[index] if index < len(self.buckets) else None
+        return None
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            buckets = {f"le_{bound}": count for bound, count in zip(self.buckets, self.counts)}
+            buckets["le_inf"] = self.counts[-1]
+            total, sum_ms = self.total, self.sum_ms
+        return {
+            "count": total,
+            "avg_ms": round(sum_ms / total, 2) if total else None,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "buckets": buckets,
+        }
+
+
+class SignerPool(object):
+    """
+    一组 XhsSigner，每个各自持有一个浏览器线程。
+
+    同一个 a1 总是路由到同一个 signer，页面保持常驻；同时处理和排队的请求数超过 max_pending 时直接拒绝，
+    避免浏览器跟不上时请求无限堆积。
+
+    Args:
+        signers: 签名器列表
+        max_pending: 最多同时在处理或排队的请求数
+    """
+
+    def __init__(self, signers: List[XhsSigner], max_pending: int = XHS_SIGN_SERVER_MAX_PENDING):
+        self.signers = signers
+        self.max_pending = max_pending
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self.latency = LatencyHistogram()
+        self.stats = {"requests": 0, "errors": 0, "rejected": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def signer_for(self, a1: str) -> XhsSigner:
+        return self.signers[zlib.crc32(a1.encode("utf-8")) % len(self.signers)]
+
+    def try_sign(self, uri, data=None, a1="", web_session="") -> Optional[dict]:
+        """返回签名结果；排队已满时返回 None；签名失败时抛出异常"""
+        self._count("requests")
+        if not self._pending.acquire(blocking=False):
+            self._count("rejected")
+            return None
+        started = time.perf_counter()
+        try:
+            return self.signer_for(a1).sign(uri, data, a1=a1, web_session=web_session)
+        except Exception:
+            self._count("errors")
+            raise
+        finally:
+            self._pending.release()
+            self.latency.observe((time.perf_counter() - started) * 1000)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        stats["workers"] = len(self.signers)
+        stats["max_pending"] = self.max_pending
+        stats["pages"] = sum(len(signer.pages) for signer in self.signers)
+        stats["latency"] = self.latency.snapshot()
+        return stats
+
+    def close(self):
+        for signer in self.signers:
+            signer.close()
+
+
+class SignRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 支持 keep-alive，客户端复用连接
+
+    @property
+    def pool(self) -> SignerPool:
+        return self.server.pool
+
+    def _send_json(self, status: int, body: dict, headers: dict = None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            self._send_json(200, self.pool.metrics())
+        elif self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length)
+        if self.path != "/sign":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            body = json.loads(raw or b"{}")
+            uri = body["uri"]
+        except (ValueError, KeyError):
+            self._send_json(400, {"error": "需要 json 格式的 uri、data、a1"})
+            return
+        try:
+            result = self.pool.try_sign(uri, body.get("data"), a1=body.get("a1") or "",
+                                        web_session=body.get("web_session") or "")
+        except Exception as e:
+            xhs_logger.error(f"[sign_server] 签名失败 {uri}: {e!r}")
+            self._send_json(500, {"error": str(e)})
+            return
+        if result is None:
+            self._send_json(503, {"error": "签名排队已满"}, headers={"Retry-After": "1"})
+            return
+        self._send_json(200, result)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SignServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, pool: SignerPool):
+        super().__init__(address, SignRequestHandler)
+        self.pool = pool
+
+
+def create_server(host: str, port: int, workers: int = XHS_SIGN_SERVER_WORKERS,
+                  max_pending: int = XHS_SIGN_SERVER_MAX_PENDING, headless: bool = True,
+                  signer_factory=None) -> SignServer:
+    """创建签名服务，signer_factory 默认为 XhsSigner，测试时可以替换"""
+    signer_factory = signer_factory or (lambda: XhsSigner(headless=headless))
+    pool = SignerPool([signer_factory() for _ in range(workers)], max_pending=max_pending)
+    return SignServer((host, port), pool)
+
+
+def main():
+    default = urlparse(XHS_SERVER)
+    parser = argparse.ArgumentParser(description="小红书签名服务")
+    parser.add_argument("--host", default=default.hostname or "127.0.0.1")
+    parser.add_argument("--port", type=int, default=default.port or 11901)
+    parser.add_argument("--workers", type=int, default=XHS_SIGN_SERVER_WORKERS, help="浏览器数量")
+    parser.add_argument("--max-pending", type=int, default=XHS_SIGN_SERVER_MAX_PENDING,
+                        help="最多同时在处理或排队的签名请求，超过时返回 503")
+    parser.add_argument("--headed", action="store_true", help="显示浏览器窗口，便于排查签名失败")
+    args = parser.parse_args()
+
+    server = create_server(args.host, args.port, args.workers, args.max_pending, headless=not args.headed)
+    xhs_logger.info(f"[sign_server] 已启动 http://{args.host}:{args.port}，{args.workers} 个浏览器")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.pool.close()
+
+
+if __name__ == '__main__':
+    main()
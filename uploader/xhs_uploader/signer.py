@@ -0,0 +1,220 @@
+import pathlib
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Optional
+
+from playwright.sync_api import sync_playwright
+
+from conf import BASE_DIR, XHS_SIGNER_PAGE_TTL, XHS_SIGNER_MAX_PAGES, XHS_SIGNER_TIMEOUT
+from utils.log import xhs_logger
+
+XHS_HOME = "https://www.xiaohongshu.com"
+_SIGN_READY_JS = "() => typeof window._webmsxyw === 'function'"
+_SIGN_JS = "([url, data]) => window._webmsxyw(url, data)"
+
+
+class SignPage(object):
+    """一个 a1 对应的常驻签名页"""
+
+    def __init__(self, a1: str, context, page):
+        self.a1 = a1
+        self.context = context
+        self.page = page
+        self.loaded_at = time.monotonic()
+        self.signs = 0
+
+    def age(self) -> float:
+        return time.monotonic() - self.loaded_at
+
+
+class XhsSigner(object):
+    """
+    常驻的小红书签名器：每个 a1 保留一个已经加载好的页面，签名只需一次 window._webmsxyw 调用。
+
+    playwright 的同步 API 只能在创建它的线程里使用，所以浏览器和页面都由一个专用线程持有，
+    其他线程调用 sign() 时把请求放进队列并等待结果，多线程调用天然串行。
+
+    - 页面加载超过 page_ttl 秒后，在签名线程空闲时后台刷新
+    - 签名失败(页面跳转、_webmsxyw 不存在等)时立即刷新页面重试，最多 retries 次
+    - 页面数超过 max_pages 时关闭最久未使用的页面
+
+    Args:
+        headless: 是否无头
+        page_ttl: 页面刷新周期(秒)
+        max_pages: 最多保留的页面数(a1 数)
+        retries: 单次签名的最大尝试次数
+    """
+
+    def __init__(self, headless: bool = True, page_ttl: float = XHS_SIGNER_PAGE_TTL,
+                 max_pages: int = XHS_SIGNER_MAX_PAGES, retries: int = 3):
+        self.headless = headless
+        self.page_ttl = page_ttl
+        self.max_pages = max_pages
+        self.retries = retries
+        self.pages: "OrderedDict[str, SignPage]" = OrderedDict()
+        self.stats = {"signs": 0, "page_loads": 0, "reloads": 0, "errors": 0}
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._playwright = None
+        self._browser = None
+
+    # 以下方法只在签名线程中调用
+
+    def _start_browser(self):
+        self._playwright = sync_playwright().start()
+        self._browser = self._playwright.chromium.launch(headless=self.headless)
+
+    def _stop_browser(self):
+        try:
+            if self._browser is not None:
+                self._browser.close()
+        finally:
+            if self._playwright is not None:
+                self._playwright.stop()
+
+    def _open_page(self, a1: str) -> SignPage:
+        context = self._browser.new_context()
+        context.add_init_script(path=pathlib.Path(BASE_DIR / "utils/stealth.min.js"))
+        context.add_cookies([{'name': 'a1', 'value': a1, 'domain': ".xiaohongshu.com", 'path': "/"}])
+        page = context.new_page()
+        page.goto(XHS_HOME)
+        # 等签名函数就绪，不再固定 sleep
+        page.wait_for_function(_SIGN_READY_JS, timeout=XHS_SIGNER_TIMEOUT * 1000)
+        return SignPage(a1, context, page)
+
+    def _reload_page(self, sign_page: SignPage):
+        sign_page.page.reload()
+        sign_page.page.wait_for_function(_SIGN_READY_JS, timeout=XHS_SIGNER_TIMEOUT * 1000)
+        sign_page.loaded_at = time.monotonic()
+
+    def _close_page(self, sign_page: SignPage):
+        try:
+            sign_page.context.close()
+        except Exception:
+            pass
+
+    def _evaluate(self, sign_page: SignPage, uri: str, data) -> dict:
+        return sign_page.page.evaluate(_SIGN_JS, [uri, data])
+
+    def _get_page(self, a1: str) -> SignPage:
+        sign_page = self.pages.get(a1)
+        if sign_page is not None:
+            self.pages.move_to_end(a1)
+            return sign_page
+        sign_page = self._open_page(a1)
+        self.stats["page_loads"] += 1
+        self.pages[a1] = sign_page
+        while len(self.pages) > self.max_pages:
+            _, oldest = self.pages.popitem(last=False)
+            self._close_page(oldest)
+        return sign_page
+
+    def _drop_page(self, a1: str):
+        sign_page = self.pages.pop(a1, None)
+        if sign_page is not None:
+            self._close_page(sign_page)
+
+    def _sign(self, uri: str, data, a1: str) -> dict:
+        last_error = None
+        for attempt in range(self.retries):
+            try:
+                opened = a1 not in self.pages
+                sign_page = self._get_page(a1)
+                # 刚打开的页面不需要刷新
+                if not opened and (attempt > 0 or sign_page.age() > self.page_ttl):
+                    self._reload_page(sign_page)
+                    self.stats["reloads"] += 1
+                encrypt_params = self._evaluate(sign_page, uri, data)
+                sign_page.signs += 1
+                self.stats["signs"] += 1
+                return {"x-s": encrypt_params["X-s"], "x-t": str(encrypt_params["X-t"])}
+            except Exception as e:
+                # 页面跳转、_webmsxyw is not a function 等，刷新不了的页面直接丢弃，下次重新打开
+                last_error = e
+                self.stats["errors"] += 1
+                if attempt > 0:
+                    self._drop_page(a1)
+        raise Exception(f"签名失败，已重试 {self.retries} 次: {last_error!r}")
+
+    def _refresh_stale(self):
+        for a1, sign_page in list(self.pages.items()):
+            if sign_page.age() <= self.page_ttl:
+                continue
+            try:
+                self._reload_page(sign_page)
+                self.stats["reloads"] += 1
+            except Exception as e:
+                xhs_logger.warning(f"签名页刷新失败，下次签名时重新打开: {e!r}")
+                self._drop_page(a1)
+
+    def _run(self, started: Future):
+        try:
+            self._start_browser()
+        except Exception as e:
+            started.set_exception(e)
+            return
+        started.set_result(True)
+        try:
+            while True:
+                try:
+                    item = self._queue.get(timeout=max(1.0, min(60.0, self.page_ttl / 4)))
+                except queue.Empty:
+                    self._refresh_stale()
+                    continue
+                if item is None:
+                    break
+                future, args = item
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(self._sign(*args))
+                except Exception as e:
+                    future.set_exception(e)
+        finally:
+            for a1 in list(self.pages):
+                self._drop_page(a1)
+            self._stop_browser()
+
+    # 以下方法可以在任意线程调用
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return self
+            started = Future()
+            self._thread = threading.Thread(target=self._run, args=(started,), name="xhs-signer", daemon=True)
+            self._thread.start()
+        # 浏览器启动失败时在调用方抛出
+        started.result()
+        return self
+
+    def sign(self, uri, data=None, a1="", web_session="") -> dict:
+        """与 xhs.XhsClient 的 sign 参数一致，返回 {"x-s": ..., "x-t": ...}"""
+        self.start()
+        future = Future()
+        self._queue.put((future, (uri, data, a1)))
+        return future.result(timeout=XHS_SIGNER_TIMEOUT * (self.retries + 1))
+
+    def close(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and thread.is_alive():
+            self._queue.put(None)
+            thread.join()
+
+
+_signer: Optional[XhsSigner] = None
+_signer_lock = threading.Lock()
+
+
+def get_signer() -> XhsSigner:
+    """进程内共享的签名器"""
+    global _signer
+    with _signer_lock:
+        if _signer is None:
+            _signer = XhsSigner()
+        return _signer
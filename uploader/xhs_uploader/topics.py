@@ -0,0 +1,136 @@
+"""
+小红书话题联想结果缓存：同一个 tag 在所有账号、所有视频之间只查询一次 get_suggest_topic，
+没有对应话题的 tag 也缓存(负缓存)，避免每条笔记都重复签名和请求。
+"""
+import copy
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from conf import XHS_TOPIC_CACHE_FILE, XHS_TOPIC_CACHE_TTL, XHS_TOPIC_NEGATIVE_TTL
+from utils.log import xhs_logger
+
+_MISSING = object()
+
+
+def normalize_tag(tag: str) -> str:
+    return tag.strip().lstrip('#').strip()
+
+
+class TopicCache(object):
+    """
+    tag 到官方话题的持久化缓存。
+
+    Args:
+        cache_file: 缓存文件路径，None 表示只保存在内存中
+        ttl: 查到话题的结果保留的秒数
+        negative_ttl: 没有话题的结果保留的秒数，一般比 ttl 短，新话题出现后能较快查到
+    """
+
+    def __init__(self, cache_file=XHS_TOPIC_CACHE_FILE, ttl: float = XHS_TOPIC_CACHE_TTL,
+                 negative_ttl: float = XHS_TOPIC_NEGATIVE_TTL):
+        self.cache_file = Path(cache_file) if cache_file else None
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._entries = self._load()
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self) -> dict:
+        if not self.cache_file or not self.cache_file.exists():
+            return {}
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            xhs_logger.warning(f"话题缓存文件损坏，已忽略: {self.cache_file}")
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def _save(self):
+        if not self.cache_file:
+            return
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.cache_file.with_name(f"{self.cache_file.name}.{os.getpid()}.tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.cache_file)
+
+    def get(self, tag: str, now: float = None):
+        """
+        Returns:
+            缓存的话题(dict)；缓存的结果为没有话题时返回 None；没有缓存或已过期时返回 _MISSING
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._entries.get(normalize_tag(tag))
+            if entry is not None:
+                ttl = self.ttl if entry["topic"] else self.negative_ttl
+                if now - entry["checked_at"] <= ttl:
+                    self.hits += 1
+                    return copy.deepcopy(entry["topic"])
+            self.misses += 1
+            return _MISSING
+
+    def set(self, tag: str, topic: Optional[dict], now: float = None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self._entries[normalize_tag(tag)] = {"topic": copy.deepcopy(topic), "checked_at": now}
+            self._save()
+
+
+def _fetch_topic(xhs_client, tag: str) -> Optional[dict]:
+    topic_official = xhs_client.get_suggest_topic(tag)
+    if not topic_official:
+        return None
+    topic = dict(topic_official[0])
+    topic['type'] = 'topic'
+    return topic
+
+
+def resolve_topics(xhs_client, tags: Iterable[str], cache: TopicCache = None) -> Dict[str, Optional[dict]]:
+    """
+    把 tag 换成官方话题，重复的 tag 只查一次，缓存中已有的 tag 不再请求。
+    批量上传前可以先对所有视频的 tag 调用一次，后续每条笔记都直接命中缓存。
+
+    Args:
+        xhs_client: 用于查询话题的 XhsClient，任意账号均可
+        tags: tag 列表
+        cache: 话题缓存，默认使用进程内共享的缓存
+
+    Returns:
+        {tag: 话题 dict 或 None}；查询失败的 tag 结果为 None 且不写入缓存，下次重新查询
+    """
+    cache = cache or get_topic_cache()
+    topics = {}
+    for tag in tags:
+        if tag in topics or not normalize_tag(tag):
+            continue
+        topic = cache.get(tag)
+        if topic is _MISSING:
+            try:
+                topic = _fetch_topic(xhs_client, normalize_tag(tag))
+            except Exception as e:
+                xhs_logger.warning(f"话题查询失败 {tag}: {e!r}")
+                topics[tag] = None
+                continue
+            cache.set(tag, topic)
+        topics[tag] = topic
+    return topics
+
+
+_topic_cache: Optional[TopicCache] = None
+_topic_cache_lock = threading.Lock()
+
+
+def get_topic_cache() -> TopicCache:
+    """进程内共享的话题缓存，所有账号共用"""
+    global _topic_cache
+    with _topic_cache_lock:
+        if _topic_cache is None:
+            _topic_cache = TopicCache()
+        return _topic_cache
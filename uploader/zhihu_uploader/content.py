@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+知乎文章内容：Markdown 渲染为净化过的 HTML，按文件内容哈希缓存，并通过一次粘贴事件写入编辑器。
+"""
+import hashlib
+import os
+from html import escape
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Dict, Optional
+
+import markdown
+from playwright.async_api import Page
+
+from conf import ZHIHU_HTML_CACHE_DIR
+from uploader.zhihu_uploader.images import rewrite_image_refs
+
+# 渲染规则变化时修改版本号，旧缓存自动失效
+RENDER_VERSION = "1"
+MARKDOWN_EXTENSIONS = ["extra", "sane_lists"]
+
+# 知乎编辑器能识别的标签和属性，其余标签去掉但保留文字，脚本类标签连同内容一起去掉
+ALLOWED_TAGS = {
+    "p", "br", "hr", "h1", "h2", "h3", "h4", "h5", "h6", "strong", "b", "em", "i", "u", "s", "del",
+    "blockquote", "ul", "ol", "li", "pre", "code", "a", "img", "sup", "sub",
+    "table", "thead", "tbody", "tr", "th", "td",
+}
+ALLOWED_ATTRS = {"a": {"href", "title"}, "img": {"src", "alt", "title"}}
+DROP_CONTENT_TAGS = {"script", "style", "iframe", "object", "embed", "noscript", "template"}
+VOID_TAGS = {"br", "hr", "img"}
+SAFE_URL_SCHEMES = ("http://", "https://", "mailto:", "data:image/", "/", "#")
+
+
+def _is_safe_url(url: str) -> bool:
+    value = url.strip().lower()
+    # 相对路径(本地图片)没有协议
+    return value.startswith(SAFE_URL_SCHEMES) or ":" not in value.split("/", 1)[0]
+
+
+class HtmlSanitizer(HTMLParser):
+    """按白名单过滤 HTML，去掉事件属性、javascript: 链接和脚本内容"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._dropping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROP_CONTENT_TAGS:
+            self._dropping += 1
+            return
+        if self._dropping or tag not in ALLOWED_TAGS:
+            return
+        allowed = ALLOWED_ATTRS.get(tag, set())
+        rendered = ""
+        for name, value in attrs:
+            if name not in allowed or value is None:
+                continue
+            if name in ("href", "src") and not _is_safe_url(value):
+                continue
+            rendered += f' {name}="{escape(value, quote=True)}"'
+        self.parts.append(f"<{tag}{rendered}>")
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag in DROP_CONTENT_TAGS and self._dropping:
+            self._dropping -= 1
+
+    def handle_endtag(self, tag):
+        if tag in DROP_CONTENT_TAGS:
+            self._dropping = max(0, self._dropping - 1)
+            return
+        if self._dropping or tag not in ALLOWED_TAGS or tag in VOID_TAGS:
+            return
+        self.parts.append(f"</{tag}>")
+
+    def handle_data(self, data):
+        if not self._dropping:
+            self.parts.append(escape(data, quote=False))
+
+    def get_html(self) -> str:
+        return "".join(self.parts)
+
+
+def sanitize_html(html: str) -> str:
+    sanitizer = HtmlSanitizer()
+    sanitizer.feed(html)
+    sanitizer.close()
+    return sanitizer.get_html()
+
+
+def render_markdown(content: str) -> str:
+    """Markdown 渲染为净化过的 HTML"""
+    return sanitize_html(markdown.markdown(content, extensions=MARKDOWN_EXTENSIONS, output_format="html"))
+
+
+class HtmlCache(object):
+    """
+    渲染结果按 Markdown 文件内容的 sha256 缓存到磁盘，同一篇文章重复发布(多账号、重试)时不再重新渲染。
+
+    Args:
+        cache_dir: 缓存目录，默认使用 conf.ZHIHU_HTML_CACHE_DIR
+    """
+
+    def __init__(self, cache_dir=ZHIHU_HTML_CACHE_DIR):
+        self.cache_dir = Path(cache_dir)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def content_key(data: bytes) -> str:
+        return hashlib.sha256(RENDER_VERSION.encode() + b"\0" + data).hexdigest()
+
+    def get(self, content_file, image_urls: Dict[str, str] = None) -> str:
+        """
+        返回 content_file 渲染后的 HTML
+
+        Args:
+            content_file: Markdown 文件
+            image_urls: {图片原始引用: 上传后的地址}，渲染前替换到 Markdown 中
+        """
+        data = Path(content_file).read_bytes()
+        if image_urls:
+            data = rewrite_image_refs(data.decode("utf-8"), image_urls).encode("utf-8")
+        cache_file = self.cache_dir / f"{self.content_key(data)}.html"
+        if cache_file.exists():
+            self.hits += 1
+            return cache_file.read_text(encoding="utf-8")
+        self.misses += 1
+        html = render_markdown(data.decode("utf-8"))
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+        tmp_file.write_text(html, encoding="utf-8")
+        os.replace(tmp_file, cache_file)
+        return html
+
+
+_html_cache: Optional[HtmlCache] = None
+
+
+def get_html_cache() -> HtmlCache:
+    global _html_cache
+    if _html_cache is None:
+        _html_cache = HtmlCache()
+    return _html_cache
+
+
+# 构造带 text/html 的 DataTransfer，在编辑器上派发一次 paste 事件，Draft.js 按粘贴 HTML 处理
+_PASTE_JS = """
+([selector, html, text]) => {
+    const editor = document.querySelector(selector);
+    if (!editor) return -1;
+    editor.focus();
+    const before = (editor.innerText || '').length;
+    const data = new DataTransfer();
+    data.setData('text/html', html);
+    data.setData('text/plain', text);
+    editor.dispatchEvent(new ClipboardEvent('paste', {clipboardData: data, bubbles: true, cancelable: true}));
+    return before;
+}
+"""
+
+_PASTED_JS = """
+([selector, before]) => {
+    const editor = document.querySelector(selector);
+    return !!editor && (editor.innerText || '').length > before;
+}
+"""
+
+
+async def paste_html(page: Page, selector: str, html: str, text: str = "", timeout: float = 10) -> bool:
+    """
+    把 HTML 通过一次粘贴事件写入编辑器。
+
+    Args:
+        page: 页面
+        selector: 编辑器的选择器
+        html: 要粘贴的 HTML
+        text: text/plain 内容，编辑器不接受 HTML 时使用
+        timeout: 等待编辑器内容变化的最长时间(秒)
+
+    Returns:
+        编辑器内容是否变化
+    """
+    before = await page.evaluate(_PASTE_JS, [selector, html, text])
+    if before < 0:
+        return False
+    try:
+        await page.wait_for_function(_PASTED_JS, arg=[selector, before], timeout=timeout * 1000)
+        return True
+    except Exception:
+        return False
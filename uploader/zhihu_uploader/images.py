@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+知乎文章中的本地图片：从 Markdown 中找出本地图片，按内容哈希去重后并发上传到编辑器的图片接口，
+再把 Markdown 里的图片地址替换为上传后的地址。
+"""
+import asyncio
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import unquote
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from conf import ZHIHU_IMAGE_UPLOAD_URL, ZHIHU_IMAGE_UPLOAD_CONCURRENCY, ZHIHU_IMAGE_CACHE_FILE, \
+    ZHIHU_IMAGE_UPLOAD_TIMEOUT
+from utils.cookie_precheck import load_storage_cookies
+from utils.log import zhihu_logger
+from utils.session_probe import USER_AGENT
+
+# ![alt](path "title") 和 <img src="path">
+MARKDOWN_IMAGE_RE = re.compile(r'(!\[[^\]]*\]\(\s*)(<[^>]+>|[^)\s]+)((?:\s+"[^"]*")?\s*\))')
+HTML_IMAGE_RE = re.compile(r'(<img\b[^>]*?\bsrc\s*=\s*["\'])([^"\']+)(["\'])', re.IGNORECASE)
+REMOTE_PREFIXES = ("http://", "https://", "data:", "//")
+
+
+def _clean_ref(ref: str) -> str:
+    return unquote(ref.strip("<>"))
+
+
+def find_local_images(markdown_text: str, base_dir) -> Dict[str, Path]:
+    """
+    找出 Markdown 中引用的本地图片。
+
+    Args:
+        markdown_text: Markdown 原文
+        base_dir: 相对路径的基准目录，一般为 Markdown 文件所在目录
+
+    Returns:
+        {Markdown 中的原始引用: 图片绝对路径}，不存在的文件和网络图片不包含在内
+    """
+    images = {}
+    for pattern in (MARKDOWN_IMAGE_RE, HTML_IMAGE_RE):
+        for match in pattern.finditer(markdown_text):
+            ref = match.group(2)
+            if ref in images or _clean_ref(ref).lower().startswith(REMOTE_PREFIXES):
+                continue
+            path = Path(base_dir, _clean_ref(ref)).expanduser().resolve()
+            if path.is_file():
+                images[ref] = path
+    return images
+
+
+def rewrite_image_refs(markdown_text: str, urls: Dict[str, str]) -> str:
+    """把图片引用替换为 urls 中对应的地址，没有地址的引用保持不变"""
+    if not urls:
+        return markdown_text
+
+    def replace(match):
+        return f"{match.group(1)}{urls.get(match.group(2), match.group(2))}{match.group(3)}"
+
+    return HTML_IMAGE_RE.sub(replace, MARKDOWN_IMAGE_RE.sub(replace, markdown_text))
+
+
+def file_sha256(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ImageUrlCache(object):
+    """图片内容 sha256 到上传地址的缓存，文章重新发布或修改后未变化的图片不再上传"""
+
+    def __init__(self, cache_file=ZHIHU_IMAGE_CACHE_FILE):
+        self.cache_file = Path(cache_file)
+        self._lock = threading.Lock()
+        self._entries = None
+
+    def _load(self) -> dict:
+        if self._entries is None:
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def get(self, content_hash: str) -> Optional[str]:
+        with self._lock:
+            entry = self._load().get(content_hash)
+        return entry["url"] if entry else None
+
+    def set(self, content_hash: str, url: str):
+        with self._lock:
+            self._load()[content_hash] = {"url": url, "uploaded_at": time.time()}
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.cache_file.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_file, self.cache_file)
+
+
+class ZhihuImageUploader(object):
+    """
+    用账号 cookie 把图片上传到知乎编辑器的图片接口，同一时间最多 max_workers 个上传。
+
+    Args:
+        account_file: cookie 文件
+        endpoint: 图片上传接口，测试时可以指向本地替身服务
+        max_workers: 最大并发上传数
+        cache: 图片地址缓存
+    """
+
+    def __init__(self, account_file, endpoint: str = ZHIHU_IMAGE_UPLOAD_URL,
+                 max_workers: int = ZHIHU_IMAGE_UPLOAD_CONCURRENCY, cache: ImageUrlCache = None):
+        self.account_file = account_file
+        self.endpoint = endpoint
+        self.max_workers = max_workers
+        self.cache = cache or ImageUrlCache()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update(self._build_headers())
+
+    def _build_headers(self) -> dict:
+        cookies = [cookie for cookie in load_storage_cookies(self.account_file)
+                   if "zhihu.com" in cookie.get("domain", "zhihu.com")]
+        headers = {
+            'user-agent': USER_AGENT,
+            'cookie': "; ".join(f"{cookie['name']}={cookie['value']}" for cookie in cookies),
+            'referer': 'https://zhuanlan.zhihu.com/write',
+        }
+        xsrf = next((cookie['value'] for cookie in cookies if cookie['name'] == '_xsrf'), None)
+        if xsrf:
+            headers['x-xsrftoken'] = xsrf
+        return headers
+
+    def upload_file(self, path: Path) -> str:
+        """上传一张图片，返回图片地址；失败时抛出异常"""
+        content_type = mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+        with open(path, 'rb') as f:
+            response = self.session.post(self.endpoint, files={'picture': (path.name, f, content_type)},
+                                         data={'source': 'article'}, timeout=ZHIHU_IMAGE_UPLOAD_TIMEOUT)
+        response.raise_for_status()
+        body = response.json()
+        url = body.get("src") or body.get("url") or body.get("original_src")
+        if not url:
+            raise ValueError(f"图片接口没有返回地址: {body}")
+        return url
+
+    def _upload_cached(self, path: Path, content_hash: str) -> str:
+        url = self.cache.get(content_hash)
+        if url:
+            return url
+        url = self.upload_file(path)
+        self.cache.set(content_hash, url)
+        return url
+
+    async def upload_images(self, images: Dict[str, Path]) -> Dict[str, str]:
+        """
+        并发上传图片，内容相同的图片只上传一次。
+
+        Args:
+            images: {Markdown 中的原始引用: 图片路径}
+
+        Returns:
+            {原始引用: 图片地址}，上传失败的图片不包含在内
+        """
+        semaphore = asyncio.Semaphore(self.max_workers)
+        # 同一张图片被引用多次或内容相同的多个文件，共用一次上传
+        by_hash: Dict[str, asyncio.Task] = {}
+
+        async def upload(path: Path, content_hash: str) -> str:
+            async with semaphore:
+                return await asyncio.to_thread(self._upload_cached, path, content_hash)
+
+        refs: List[tuple] = []
+        for ref, path in images.items():
+            content_hash = await asyncio.to_thread(file_sha256, path)
+            if content_hash not in by_hash:
+                by_hash[content_hash] = asyncio.ensure_future(upload(path, content_hash))
+            refs.append((ref, path, content_hash))
+        await asyncio.gather(*by_hash.values(), return_exceptions=True)
+
+        urls = {}
+        for ref, path, content_hash in refs:
+            task = by_hash[content_hash]
+            if task.exception() is not None:
+                zhihu_logger.warning(f'图片上传失败，保留原地址 {path}: {task.exception()!r}')
+                continue
+            urls[ref] = task.result()
+        return urls
+
+    def close(self):
+        self.session.close()
+
+
+async def upload_article_images(content_file, account_file, uploader: ZhihuImageUploader = None) -> Dict[str, str]:
+    """上传文章中的本地图片，返回 {原始引用: 图片地址}，没有本地图片时不发起任何请求"""
+    content_file = Path(content_file)
+    markdown_text = content_file.read_text(encoding='utf-8')
+    images = find_local_images(markdown_text, content_file.parent)
+    if not images:
+        return {}
+    owned = uploader is None
+    uploader = uploader or ZhihuImageUploader(account_file)
+    try:
+        started = time.monotonic()
+        urls = await uploader.upload_images(images)
+        zhihu_logger.info(f'文章中的 {len(images)} 张本地图片已处理 {len(urls)} 张，用时 {time.monotonic() - started:.1f}s')
+        return urls
+    finally:
+        if owned:
+            uploader.close()
@@ -1,7 +1,6 @@
 # -*- coding: utf-8 -*-
 import os
 import json
-import time
 from datetime import datetime
 from typing import Optional, List
 #from pathlib import Path
@@ -10,24 +9,49 @@ import traceback
 from playwright.async_api import Playwright, async_playwright
 #import markdown
 
-from conf import LOCAL_CHROME_PATH
-from utils.base_social_media import set_init_script
+from conf import LOCAL_CHROME_PATH, COOKIE_AUTH_STRATEGY
+from uploader.zhihu_uploader.content import get_html_cache, paste_html
+from uploader.zhihu_uploader.images import upload_article_images
+from utils.base_social_media import set_init_script, SOCIAL_MEDIA_ZHIHU
+from utils.cookie_cache import cached_cookie_auth, get_cookie_cache
+from utils.cookie_precheck import precheck_cookie_file
+from utils.diagnostics import DiagnosticsRecorder
 from utils.files_times import get_absolute_path
 from utils.log import zhihu_logger
+from utils.session_probe import async_probe_session, AUTH_STRATEGY_HTTP
+from utils.text_entry import insert_text
 
 # 设置日志
 zhihu_logger = zhihu_logger.bind(name="zhihu")
 
-async def cookie_auth(account_file):
+# 正文编辑器可能的选择器
+CONTENT_EDITORS = ["div.public-DraftEditor-content", "div.notranslate[contenteditable='true']:not(div.WriteIndex-titleInput)",
+                   ".Editable-content", ".DraftEditor-root"]
+
+@cached_cookie_auth(SOCIAL_MEDIA_ZHIHU)
+async def cookie_auth(account_file, auth_strategy=None):
     """
     验证知乎cookie是否有效
     
     Args:
         account_file: cookie文件路径
+        auth_strategy: cookie 校验方式，见 utils.session_probe，默认使用 conf.COOKIE_AUTH_STRATEGY
     
     Returns:
         bool: cookie是否有效
     """
+    # 先根据关键 cookie 的过期时间判断，能确定结果时不必启动浏览器
+    precheck = precheck_cookie_file(account_file, SOCIAL_MEDIA_ZHIHU)
+    if precheck is not None:
+        zhihu_logger.info(f"[+] 根据 cookie 过期时间预检查: {'有效' if precheck else '已失效'}")
+        return precheck
+    # http 方式先请求平台的已登录接口，无法判断时再回退到下面的浏览器检查
+    if (auth_strategy or COOKIE_AUTH_STRATEGY) == AUTH_STRATEGY_HTTP:
+        probe = await async_probe_session(account_file, SOCIAL_MEDIA_ZHIHU)
+        if probe is not None:
+            zhihu_logger.info(f"[+] HTTP 会话探测: {'有效' if probe else '已失效'}")
+            return probe
+
     # 读取cookie
     try:
         with open(account_file, 'r') as f:
@@ -83,19 +107,20 @@ async def cookie_auth(account_file):
             await browser.close()
             return False
 
-async def zhihu_setup(account_file, handle=False):
+async def zhihu_setup(account_file, handle=False, auth_strategy=None):
     """
     设置知乎cookie，如果cookie不存在或无效，则自动打开浏览器等待用户登录
     
     Args:
         account_file: cookie文件路径
         handle: 是否处理cookie无效的情况
+        auth_strategy: cookie 校验方式，见 utils.session_probe，默认使用 conf.COOKIE_AUTH_STRATEGY
     
     Returns:
         bool: 设置是否成功
     """
     account_file = get_absolute_path(account_file, "zhihu_uploader")
-    if not os.path.exists(account_file) or not await cookie_auth(account_file):
+    if not os.path.exists(account_file) or not await cookie_auth(account_file, auth_strategy):
         if not handle:
             zhihu_logger.info('[+] cookie文件不存在或已失效，因为handle为False，所以不去登录')
             return False
@@ -205,6 +230,34 @@ class ZhihuArticle:
         
         return True  # 没有验证页面，直接返回成功
 
+    async def paste_content(self, page, content: str) -> bool:
+        """
+        上传文章中的本地图片，把 Markdown 渲染为 HTML(按文件哈希缓存)，通过一次粘贴事件写入正文编辑器
+
+        Args:
+            page: 编辑页
+            content: Markdown 原文，编辑器不接受 HTML 时作为纯文本粘贴
+
+        Returns:
+            是否写入成功
+        """
+        try:
+            # 本地图片先并发上传，渲染时替换为上传后的地址
+            image_urls = await upload_article_images(self.content_file, self.account_file)
+            html = get_html_cache().get(self.content_file, image_urls)
+            for editor_selector in CONTENT_EDITORS:
+                if await page.locator(editor_selector).count() > 0:
+                    await page.locator(editor_selector).first.click()
+                    await page.keyboard.press("Control+KeyA")
+                    await page.keyboard.press("Delete")
+                    if await paste_html(page, editor_selector, html, content):
+                        zhihu_logger.info(f'已粘贴文章内容，共 {len(html)} 字符 HTML')
+                        return True
+                    zhihu_logger.warning(f'编辑器 {editor_selector} 未接受粘贴的内容')
+        except Exception as e:
+            zhihu_logger.warning(f'粘贴文章内容失败: {e}')
+        return False
+
     async def upload(self, playwright: Playwright) -> None:
         """
         上传文章到知乎
@@ -252,6 +305,9 @@ class ZhihuArticle:
             # 获取当前URL
             current_url = page.url
             if current_url != "https://zhuanlan.zhihu.com/write":
+                if "signin" in current_url:
+                    # 被跳转到登录页，之前缓存的校验结果已不可信
+                    get_cookie_cache().invalidate(self.account_file)
                 zhihu_logger.warning(f'未能直接进入编辑页面，当前URL: {current_url}，尝试通过创作中心进入...')
                 
                 await page.goto("https://www.zhihu.com/creator")
@@ -321,56 +377,57 @@ class ZhihuArticle:
                 await page.locator(title_input_selector).click()
                 await page.keyboard.press("Control+KeyA")
                 await page.keyboard.press("Delete")
-                await page.keyboard.type(self.title)
+                await insert_text(page, self.title)
             else:
                 zhihu_logger.warning('未找到标题输入框，尝试使用Tab导航到标题区域')
                 await page.keyboard.press("Tab")
-                await page.keyboard.type(self.title)
+                await insert_text(page, self.title)
             
             await page.keyboard.press("Tab")
             
-            import_success = False
+            # 优先把渲染好的 HTML 一次性粘贴进编辑器，失败时再尝试导入 Markdown 和逐字输入
+            import_success = await self.paste_content(page, content)
             
-            try:
-                more_buttons = ["button.css-m5a9ul", ".Editable-toolbar button:last-child", "button.WriteIndex-moreButton"]
-                for more_selector in more_buttons:
-                    if await page.locator(more_selector).count() > 0:
-                        await page.locator(more_selector).click()
-                        await page.wait_for_timeout(1000)
+            if not import_success:
+                try:
+                    more_buttons = ["button.css-m5a9ul", ".Editable-toolbar button:last-child", "button.WriteIndex-moreButton"]
+                    for more_selector in more_buttons:
+                        if await page.locator(more_selector).count() > 0:
+                            await page.locator(more_selector).click()
+                            await page.wait_for_timeout(1000)
                         
-                        import_options = ["div:has-text('导入Markdown')", "li:has-text('导入Markdown')"]
-                        for import_selector in import_options:
-                            if await page.locator(import_selector).count() > 0:
-                                await page.locator(import_selector).click()
-                                await page.wait_for_timeout(1000)
+                            import_options = ["div:has-text('导入Markdown')", "li:has-text('导入Markdown')"]
+                            for import_selector in import_options:
+                                if await page.locator(import_selector).count() > 0:
+                                    await page.locator(import_selector).click()
+                                    await page.wait_for_timeout(1000)
                                 
-                                markdown_inputs = ["textarea.css-lk63t1", "textarea", ".ImportPanel-input"]
-                                for input_selector in markdown_inputs:
-                                    if await page.locator(input_selector).count() > 0:
-                                        await page.locator(input_selector).fill(content)
-                                        await page.wait_for_timeout(1000)
+                                    markdown_inputs = ["textarea.css-lk63t1", "textarea", ".ImportPanel-input"]
+                                    for input_selector in markdown_inputs:
+                                        if await page.locator(input_selector).count() > 0:
+                                            await page.locator(input_selector).fill(content)
+                                            await page.wait_for_timeout(1000)
                                         
-                                        import_buttons = ["button:has-text('导入')", ".ImportPanel-button", "button.css-lxrmzw"]
-                                        for button_selector in import_buttons:
-                                            if await page.locator(button_selector).count() > 0:
-                                                await page.locator(button_selector).click()
-                                                await page.wait_for_timeout(3000)
-                                                import_success = True
+                                            import_buttons = ["button:has-text('导入')", ".ImportPanel-button", "button.css-lxrmzw"]
+                                            for button_selector in import_buttons:
+                                                if await page.locator(button_selector).count() > 0:
+                                                    await page.locator(button_selector).click()
+                                                    await page.wait_for_timeout(3000)
+                                                    import_success = True
+                                                    break
+                                            if import_success:
                                                 break
-                                        if import_success:
-                                            break
-                                if import_success:
-                                    break
-                        if import_success:
-                            break
-            except Exception as e:
-                zhihu_logger.warning(f'使用更多菜单导入Markdown失败: {e}')
+                                    if import_success:
+                                        break
+                            if import_success:
+                                break
+                except Exception as e:
+                    zhihu_logger.warning(f'使用更多菜单导入Markdown失败: {e}')
             
             if not import_success:
-                zhihu_logger.info('尝试直接粘贴内容到编辑器...')
+                zhihu_logger.info('尝试逐字输入内容到编辑器...')
                 try:
-                    content_editors = ["div.public-DraftEditor-content", "div.notranslate[contenteditable='true']:not(div.WriteIndex-titleInput)", ".Editable-content", ".DraftEditor-root"]
-                    for editor_selector in content_editors:
+                    for editor_selector in CONTENT_EDITORS:
                         if await page.locator(editor_selector).count() > 0:
                             await page.locator(editor_selector).click()
                             await page.keyboard.press("Control+KeyA")
@@ -535,8 +592,8 @@ class ZhihuArticle:
             
         except Exception as e:
             zhihu_logger.error(f'发布文章时发生错误：{e}\n{traceback.format_exc()}')
-            # 捕获屏幕截图以便调试
-            await page.screenshot(path=f"zhihu_error_{int(time.time())}.png", full_page=True)
+            # 保存失败时的画面以便调试，写入 logs/diagnostics，受磁盘预算限制
+            await DiagnosticsRecorder(page, SOCIAL_MEDIA_ZHIHU).flush(repr(e))
         finally:
             await context.storage_state(path=self.account_file)
             zhihu_logger.info('cookie更新完毕！')
@@ -9,12 +9,19 @@ SOCIAL_MEDIA_TIKTOK = "tiktok"
 SOCIAL_MEDIA_BILIBILI = "bilibili"
 SOCIAL_MEDIA_KUAISHOU = "kuaishou"
 SOCIAL_MEDIA_ZHIHU = "zhihu"
+SOCIAL_MEDIA_XHS = "xhs"
 
 
 def get_supported_social_media() -> List[str]:
     return [SOCIAL_MEDIA_DOUYIN, SOCIAL_MEDIA_TENCENT, SOCIAL_MEDIA_TIKTOK, SOCIAL_MEDIA_KUAISHOU, SOCIAL_MEDIA_ZHIHU]
 
 
+def get_fanout_social_media() -> List[str]:
+    """upload --platforms 可以同时发布的平台"""
+    return [SOCIAL_MEDIA_DOUYIN, SOCIAL_MEDIA_TENCENT, SOCIAL_MEDIA_TIKTOK, SOCIAL_MEDIA_KUAISHOU,
+            SOCIAL_MEDIA_BILIBILI, SOCIAL_MEDIA_XHS]
+
+
 def get_cli_action() -> List[str]:
     return ["upload", "login", "watch"]
 
@@ -23,3 +30,11 @@ async def set_init_script(context):
     stealth_js_path = Path(BASE_DIR / "utils/stealth.min.js")
     await context.add_init_script(path=stealth_js_path)
     return context
+
+
+class CookieExpiredError(Exception):
+    """上传页面加载后检测到登录页，说明 cookie 已失效"""
+
+
+class PublishFailedError(Exception):
+    """平台的发布接口返回失败"""
@@ -0,0 +1,273 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from playwright.async_api import async_playwright, Browser, BrowserContext
+
+from conf import BROWSER_POOL_MAX_BROWSERS, BROWSER_POOL_MAX_CONTEXTS_PER_BROWSER, BROWSER_POOL_MAX_RSS_MB
+from utils.base_social_media import set_init_script
+from utils.log import logger
+
+
+def _read_ppid(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # comm 字段可能包含空格和括号，从最后一个 ')' 之后开始解析
+    fields = stat[stat.rfind(")") + 2:].split()
+    return int(fields[1])
+
+
+def _descendant_pids(root_pid: int) -> set:
+    """返回 root_pid 的所有子孙进程（仅 Linux，其他平台返回空集合）"""
+    if not os.path.isdir("/proc"):
+        return set()
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        ppid = _read_ppid(int(entry))
+        if ppid is not None:
+            children.setdefault(ppid, []).append(int(entry))
+    result = set()
+    stack = [root_pid]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            if child not in result:
+                result.add(child)
+                stack.append(child)
+    return result
+
+
+def _process_tree_rss_mb(root_pid: int) -> Optional[float]:
+    """统计进程树的常驻内存（MB），无法读取时返回 None"""
+    page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+    total_pages = 0
+    found = False
+    for pid in {root_pid} | _descendant_pids(root_pid):
+        try:
+            with open(f"/proc/{pid}/statm", "r") as f:
+                total_pages += int(f.read().split()[1])
+                found = True
+        except (OSError, IndexError, ValueError):
+            continue
+    if not found:
+        return None
+    return total_pages * page_size / 1024 / 1024
+
+
+def _launch_key(browser_type: str, options: dict) -> tuple:
+    items = []
+    for key, value in sorted(options.items()):
+        if isinstance(value, list):
+            value = tuple(value)
+        items.append((key, value))
+    return (browser_type,) + tuple(items)
+
+
+class PooledBrowser(object):
+    def __init__(self, browser: Browser, key: tuple, pid: Optional[int]):
+        self.browser = browser
+        self.key = key
+        self.pid = pid
+        self.active = 0  # 当前借出的上下文数量
+        self.served = 0  # 累计提供过的上下文数量
+        self.retiring = False  # 标记后不再借出，等所有上下文归还后关闭
+
+    def is_alive(self) -> bool:
+        return self.browser.is_connected()
+
+
+class BrowserPool(object):
+    """
+    进程内共享的浏览器池。
+
+    整个事件循环只启动一个 Playwright 驱动，按启动参数复用少量常驻浏览器，
+    上传器按账号借用相互隔离的 BrowserContext，用完归还。
+    浏览器提供的上下文数量达到上限，或进程树内存超过上限时，会在空闲后被回收重启。
+    """
+
+    def __init__(self, max_browsers: int = BROWSER_POOL_MAX_BROWSERS,
+                 max_contexts_per_browser: int = BROWSER_POOL_MAX_CONTEXTS_PER_BROWSER,
+                 max_rss_mb: float = BROWSER_POOL_MAX_RSS_MB):
+        self.max_browsers = max(1, max_browsers)
+        self.max_contexts_per_browser = max_contexts_per_browser
+        self.max_rss_mb = max_rss_mb
+        self.loop = asyncio.get_running_loop()
+        self._playwright = None
+        self._browsers = []
+        self._leases = {}
+        self._condition = asyncio.Condition()
+        self.stats = {"hits": 0, "misses": 0, "launches": 0, "recycles": 0}
+
+    def get_stats(self) -> dict:
+        """返回命中/未命中/启动/回收计数以及当前存活的浏览器和上下文数量"""
+        stats = dict(self.stats)
+        stats["browsers"] = len(self._browsers)
+        stats["active_contexts"] = sum(pooled.active for pooled in self._browsers)
+        return stats
+
+    async def acquire(self, browser_type: str = "chromium", headless: bool = True, executable_path: str = None,
+                      args: list = None, slow_mo: float = None, **context_options) -> BrowserContext:
+        """
+        借出一个新的浏览器上下文。
+
+        Args:
+            browser_type: chromium / firefox / webkit
+            headless, executable_path, args, slow_mo: 浏览器启动参数，相同参数的请求共享同一个浏览器
+            context_options: 透传给 browser.new_context，例如 storage_state
+
+        Returns:
+            BrowserContext: 已注入 stealth 脚本的上下文，用完必须调用 release 归还
+        """
+        launch_options = {"headless": headless}
+        if executable_path:
+            launch_options["executable_path"] = executable_path
+        if args:
+            launch_options["args"] = list(args)
+        if slow_mo:
+            launch_options["slow_mo"] = slow_mo
+        key = _launch_key(browser_type, launch_options)
+
+        async with self._condition:
+            while True:
+                self._drop_dead_browsers()
+                pooled = self._find_browser(key)
+                if pooled:
+                    self.stats["hits"] += 1
+                    break
+                if len(self._browsers) >= self.max_browsers:
+                    idle = next((b for b in self._browsers if b.active == 0), None)
+                    if idle is None:
+                        # 所有浏览器都在忙，等待有上下文归还
+                        await self._condition.wait()
+                        continue
+                    await self._close_browser(idle)
+                self.stats["misses"] += 1
+                pooled = await self._launch(browser_type, launch_options, key)
+                break
+            pooled.active += 1
+            pooled.served += 1
+
+        try:
+            context = await pooled.browser.new_context(**context_options)
+            context = await set_init_script(context)
+        except Exception:
+            await self._return(pooled)
+            raise
+        self._leases[context] = pooled
+        return context
+
+    async def release(self, context: BrowserContext) -> None:
+        """关闭并归还由 acquire 借出的上下文"""
+        pooled = self._leases.pop(context, None)
+        try:
+            await context.close()
+        except Exception as e:
+            logger.warning(f"[browser_pool] 关闭上下文失败: {e}")
+        if pooled is not None:
+            await self._return(pooled)
+
+    @asynccontextmanager
+    async def context(self, **options):
+        """acquire/release 的上下文管理器写法: async with pool.context(storage_state=...) as context"""
+        context = await self.acquire(**options)
+        try:
+            yield context
+        finally:
+            await self.release(context)
+
+    async def close(self) -> None:
+        """关闭所有浏览器并停止 Playwright 驱动"""
+        async with self._condition:
+            for pooled in list(self._browsers):
+                await self._close_browser(pooled)
+            if self._playwright:
+                await self._playwright.stop()
+                self._playwright = None
+        logger.info(f"[browser_pool] 已关闭, stats: {self.get_stats()}")
+
+    def _find_browser(self, key: tuple) -> Optional[PooledBrowser]:
+        candidates = [b for b in self._browsers if b.key == key and not b.retiring]
+        if not candidates:
+            return None
+        # 优先复用负载最低的浏览器
+        return min(candidates, key=lambda b: b.active)
+
+    def _drop_dead_browsers(self):
+        for pooled in list(self._browsers):
+            if not pooled.is_alive():
+                logger.warning("[browser_pool] 检测到浏览器已断开，移出浏览器池")
+                self._browsers.remove(pooled)
+
+    async def _launch(self, browser_type: str, launch_options: dict, key: tuple) -> PooledBrowser:
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+        # 通过启动前后的子进程差集定位浏览器主进程，用于统计内存
+        before = _descendant_pids(os.getpid())
+        browser = await getattr(self._playwright, browser_type).launch(**launch_options)
+        new_pids = _descendant_pids(os.getpid()) - before
+        roots = [pid for pid in new_pids if _read_ppid(pid) not in new_pids]
+        pooled = PooledBrowser(browser, key, roots[0] if len(roots) == 1 else None)
+        self._browsers.append(pooled)
+        self.stats["launches"] += 1
+        logger.info(f"[browser_pool] 启动浏览器 {browser_type} {launch_options}, 当前数量: {len(self._browsers)}")
+        return pooled
+
+    async def _return(self, pooled: PooledBrowser) -> None:
+        async with self._condition:
+            pooled.active -= 1
+            if self.max_contexts_per_browser and pooled.served >= self.max_contexts_per_browser:
+                pooled.retiring = True
+            elif self.max_rss_mb and pooled.pid is not None:
+                rss_mb = _process_tree_rss_mb(pooled.pid)
+                if rss_mb is not None and rss_mb > self.max_rss_mb:
+                    logger.info(f"[browser_pool] 浏览器内存 {rss_mb:.0f}MB 超过上限 {self.max_rss_mb}MB，准备回收")
+                    pooled.retiring = True
+            if pooled.retiring and pooled.active == 0 and pooled in self._browsers:
+                await self._close_browser(pooled)
+                self.stats["recycles"] += 1
+            self._condition.notify_all()
+
+    async def _close_browser(self, pooled: PooledBrowser) -> None:
+        if pooled in self._browsers:
+            self._browsers.remove(pooled)
+        try:
+            await pooled.browser.close()
+        except Exception as e:
+            logger.warning(f"[browser_pool] 关闭浏览器失败: {e}")
+
+
+_browser_pool: Optional[BrowserPool] = None
+
+
+def get_browser_pool() -> BrowserPool:
+    """获取当前事件循环上的共享浏览器池，不存在时创建"""
+    global _browser_pool
+    loop = asyncio.get_running_loop()
+    if _browser_pool is None or _browser_pool.loop is not loop:
+        _browser_pool = BrowserPool()
+    return _browser_pool
+
+
+async def close_browser_pool() -> None:
+    """关闭当前事件循环上的共享浏览器池，在事件循环结束前调用"""
+    global _browser_pool
+    if _browser_pool is not None and _browser_pool.loop is asyncio.get_running_loop():
+        pool, _browser_pool = _browser_pool, None
+        await pool.close()
+
+
+async def run_with_browser_pool(coro):
+    """
+    运行协程并在结束后关闭共享浏览器池。
+
+    适用于每个任务都调用一次 asyncio.run 的脚本，例如 asyncio.run(run_with_browser_pool(app.main()))
+    """
+    try:
+        return await coro
+    finally:
+        await close_browser_pool()
@@ -0,0 +1,102 @@
+"""
+文件内容指纹：同一个视频被复制到另一个监控目录或改名后，指纹不变，用来避免重复上传。
+
+小文件计算完整 sha256；大文件只读取开头、中间、结尾各一段，加上文件大小计算哈希，
+几 GB 的视频也只需要读几 MB。文件通过 mmap 读取，多个文件在进程池里并行计算。
+"""
+import hashlib
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, Optional
+
+from conf import FINGERPRINT_FULL_HASH_LIMIT, FINGERPRINT_SAMPLE_SIZE, FINGERPRINT_WORKERS
+from utils.log import logger
+
+
+def file_fingerprint(file_path, full_hash_limit: int = FINGERPRINT_FULL_HASH_LIMIT,
+                     sample_size: int = FINGERPRINT_SAMPLE_SIZE) -> str:
+    """
+    计算文件内容指纹。
+
+    Returns:
+        完整哈希为 "sha256:<hex>"，抽样哈希为 "sample:<文件大小>:<hex>"
+    """
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return f"sha256:{hashlib.sha256().hexdigest()}"
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if size <= full_hash_limit or size <= sample_size * 3:
+                return f"sha256:{hashlib.sha256(mm).hexdigest()}"
+            digest = hashlib.sha256(str(size).encode())
+            middle = (size - sample_size) // 2
+            for offset in (0, middle, size - sample_size):
+                digest.update(mm[offset:offset + sample_size])
+            return f"sample:{size}:{digest.hexdigest()}"
+
+
+def _fingerprint_or_none(args) -> Optional[str]:
+    """进程池里执行，文件读取失败时返回 None，不影响其他文件"""
+    file_path, full_hash_limit, sample_size = args
+    try:
+        return file_fingerprint(file_path, full_hash_limit, sample_size)
+    except (OSError, ValueError):
+        return None
+
+
+def fingerprint_files(file_paths: Iterable, ledger=None, max_workers: int = FINGERPRINT_WORKERS,
+                      full_hash_limit: int = FINGERPRINT_FULL_HASH_LIMIT,
+                      sample_size: int = FINGERPRINT_SAMPLE_SIZE) -> Dict:
+    """
+    批量计算文件指纹。
+
+    传入 ledger 时先查账本里缓存的指纹(文件大小和修改时间都没变才使用)，只计算缺少的文件，算完写回账本。
+
+    Args:
+        file_paths: 文件路径列表
+        ledger: UploadLedger，None 表示不缓存
+        max_workers: 进程数，只有一个文件要计算时不启动进程池
+
+    Returns:
+        {传入的路径: 指纹}，不存在或读取失败的文件不在结果中
+    """
+    fingerprints, missing, stats = {}, [], {}
+    for file_path in dict.fromkeys(file_paths):
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            continue
+        stats[file_path] = stat
+        cached = ledger.get_fingerprint(file_path, stat.st_size, stat.st_mtime_ns) if ledger else None
+        if cached:
+            fingerprints[file_path] = cached
+        else:
+            missing.append(file_path)
+    if not missing:
+        return fingerprints
+
+    jobs = [(str(file_path), full_hash_limit, sample_size) for file_path in missing]
+    results = None
+    if len(missing) > 1 and max_workers != 1:
+        workers = min(len(missing), max_workers or os.cpu_count() or 1)
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(_fingerprint_or_none, jobs))
+        except (OSError, BrokenProcessPool) as e:
+            logger.warning(f"进程池计算文件指纹失败，改为逐个计算: {e!r}")
+    if results is None:
+        results = [_fingerprint_or_none(job) for job in jobs]
+
+    computed = []
+    for file_path, fingerprint in zip(missing, results):
+        if fingerprint is None:
+            logger.warning(f"无法读取文件，跳过指纹计算: {file_path}")
+            continue
+        fingerprints[file_path] = fingerprint
+        stat = stats[file_path]
+        computed.append((file_path, stat.st_size, stat.st_mtime_ns, fingerprint))
+    if ledger and computed:
+        ledger.save_fingerprints(computed)
+    return fingerprints
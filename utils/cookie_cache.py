@@ -0,0 +1,162 @@
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from conf import COOKIE_CACHE_FILE, COOKIE_CACHE_TTL, COOKIE_CACHE_DEFAULT_TTL, COOKIE_CACHE_NEGATIVE_TTL
+from utils.log import logger
+
+
+def _file_fingerprint(account_file) -> Optional[tuple]:
+    """返回 cookie 文件的 (mtime_ns, sha256)，文件不存在时返回 None"""
+    try:
+        mtime_ns = os.stat(account_file).st_mtime_ns
+        with open(account_file, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+    return mtime_ns, digest
+
+
+class CookieValidationCache(object):
+    """
+    持久化的 cookie 校验结果缓存。
+
+    以 cookie 文件的绝对路径为键，记录校验时文件的 mtime、内容哈希和校验结果。
+    文件被重写（重新登录、上传后保存 cookie）或超过平台 TTL 后，旧结果视为过期，需要重新校验。
+
+    Args:
+        cache_file: 缓存文件路径，None 表示只保存在内存中
+        ttl: {平台: 秒数}，未配置的平台使用 default_ttl；TTL 为 0 表示该平台不缓存
+        default_ttl: 默认 TTL
+        negative_ttl: 校验失败结果的 TTL，不超过平台 TTL
+    """
+
+    def __init__(self, cache_file=None, ttl: dict = None, default_ttl: int = COOKIE_CACHE_DEFAULT_TTL,
+                 negative_ttl: int = COOKIE_CACHE_NEGATIVE_TTL):
+        self.cache_file = Path(cache_file) if cache_file else None
+        self.ttl = ttl if ttl is not None else {}
+        self.default_ttl = default_ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._entries = self._load()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def _load(self) -> dict:
+        if not self.cache_file or not self.cache_file.exists():
+            return {}
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            logger.warning(f"cookie 校验缓存文件损坏，已忽略: {self.cache_file}")
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def _save(self):
+        if not self.cache_file:
+            return
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.cache_file.with_name(self.cache_file.name + '.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.cache_file)
+
+    @staticmethod
+    def _key(account_file) -> str:
+        return str(Path(account_file).resolve())
+
+    def get_ttl(self, platform: str, valid: bool = True) -> int:
+        ttl = self.ttl.get(platform, self.default_ttl)
+        return ttl if valid else min(ttl, self.negative_ttl)
+
+    def get(self, account_file, platform: str, now: float = None) -> Optional[bool]:
+        """
+        Returns:
+            缓存的校验结果；没有缓存、文件已变化或超过 TTL 时返回 None
+        """
+        now = time.time() if now is None else now
+        key = self._key(account_file)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.get("platform") != platform:
+                self.misses += 1
+                return None
+            fingerprint = _file_fingerprint(account_file)
+            expired = now - entry["checked_at"] >= self.get_ttl(platform, entry["valid"])
+            if fingerprint is None or list(fingerprint) != [entry["mtime_ns"], entry["sha256"]] or expired:
+                self.stale += 1
+                del self._entries[key]
+                self._save()
+                return None
+            self.hits += 1
+            return entry["valid"]
+
+    def set(self, account_file, platform: str, valid: bool, now: float = None):
+        """记录一次校验结果，TTL 为 0 的平台不记录，校验失败的结果只保留 negative_ttl"""
+        fingerprint = _file_fingerprint(account_file)
+        if fingerprint is None or not self.get_ttl(platform, valid):
+            return
+        mtime_ns, digest = fingerprint
+        with self._lock:
+            self._entries[self._key(account_file)] = {
+                "platform": platform,
+                "valid": bool(valid),
+                "mtime_ns": mtime_ns,
+                "sha256": digest,
+                "checked_at": time.time() if now is None else now,
+            }
+            self._save()
+
+    def invalidate(self, account_file):
+        """上传时遇到登录页等情况，删除该 cookie 文件的缓存结果"""
+        with self._lock:
+            if self._entries.pop(self._key(account_file), None) is not None:
+                self._save()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "entries": len(self._entries),
+            }
+
+
+_cache: Optional[CookieValidationCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cookie_cache() -> CookieValidationCache:
+    """返回进程内共享的 cookie 校验缓存"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = CookieValidationCache(COOKIE_CACHE_FILE, COOKIE_CACHE_TTL)
+        return _cache
+
+
+def cached_cookie_auth(platform: str):
+    """
+    装饰各平台的 cookie_auth(account_file, ...) 协程：命中缓存时直接返回结果，否则校验后写入缓存
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(account_file, *args, **kwargs):
+            cache = get_cookie_cache()
+            cached = cache.get(account_file, platform)
+            if cached is not None:
+                logger.info(f"[+] 使用缓存的 cookie 校验结果: {'有效' if cached else '已失效'}")
+                return cached
+            valid = await func(account_file, *args, **kwargs)
+            cache.set(account_file, platform, valid)
+            return valid
+        return wrapper
+    return decorator
@@ -0,0 +1,75 @@
+import json
+import os
+import time
+from typing import Optional
+
+from conf import COOKIE_PRECHECK_FRESH_TTL
+from utils.base_social_media import SOCIAL_MEDIA_DOUYIN, SOCIAL_MEDIA_TENCENT, SOCIAL_MEDIA_TIKTOK, \
+    SOCIAL_MEDIA_BILIBILI, SOCIAL_MEDIA_KUAISHOU, SOCIAL_MEDIA_ZHIHU
+
+# 各平台决定登录态的关键 cookie: (cookie 所属域名, cookie 名称列表)
+CRITICAL_COOKIES = {
+    SOCIAL_MEDIA_DOUYIN: ("douyin.com", ["sessionid", "sid_guard"]),
+    SOCIAL_MEDIA_TIKTOK: ("tiktok.com", ["sessionid", "sid_guard"]),
+    SOCIAL_MEDIA_TENCENT: ("qq.com", ["sessionid", "wxuin"]),
+    SOCIAL_MEDIA_KUAISHOU: ("kuaishou.com", ["kuaishou.web.cp.api_st", "userId"]),
+    SOCIAL_MEDIA_BILIBILI: ("bilibili.com", ["SESSDATA"]),
+    SOCIAL_MEDIA_ZHIHU: ("zhihu.com", ["z_c0"]),
+}
+
+
+def load_storage_cookies(account_file) -> list:
+    """
+    读取 cookie 文件中的 cookie 列表。
+
+    同时兼容 playwright context.storage_state 写出的格式 {"cookies": [...]}
+    和 biliup 登录写出的格式 {"cookie_info": {"cookies": [...]}}。
+    """
+    with open(account_file, 'r', encoding='utf-8') as f:
+        storage = json.load(f)
+    if "cookies" in storage:
+        return storage["cookies"]
+    return storage.get("cookie_info", {}).get("cookies", [])
+
+
+def find_critical_cookies(cookies: list, platform: str) -> list:
+    """返回属于该平台、且名称在关键 cookie 列表里的 cookie"""
+    if platform not in CRITICAL_COOKIES:
+        return []
+    domain, names = CRITICAL_COOKIES[platform]
+    return [cookie for cookie in cookies
+            if cookie.get("name") in names and domain in cookie.get("domain", domain)]
+
+
+def precheck_cookie_file(account_file, platform: str, fresh_ttl: int = COOKIE_PRECHECK_FRESH_TTL,
+                         now: float = None) -> Optional[bool]:
+    """
+    不启动浏览器，根据 cookie 文件中关键 cookie 的 expires 预判 cookie 是否有效。
+
+    Args:
+        account_file: cookie 文件路径
+        platform: 平台名称，见 utils.base_social_media 中的 SOCIAL_MEDIA_*
+        fresh_ttl: cookie 文件在这个秒数内写入过、且关键 cookie 在这段时间内不会过期时，直接认为有效；0 表示不做此判断
+        now: 当前时间戳，默认 time.time()
+
+    Returns:
+        False: 关键 cookie 已过期，无需再用浏览器检查
+        True: cookie 文件足够新，可以跳过浏览器检查
+        None: 无法判断，需要继续用浏览器检查
+    """
+    now = time.time() if now is None else now
+    try:
+        cookies = find_critical_cookies(load_storage_cookies(account_file), platform)
+        file_age = now - os.path.getmtime(account_file)
+    except (OSError, ValueError, AttributeError):
+        return None
+    if not cookies:
+        return None
+
+    # expires 为 -1 表示会话 cookie，没有过期时间
+    expires = [cookie.get("expires", -1) for cookie in cookies]
+    if any(0 < expire <= now for expire in expires):
+        return False
+    if fresh_ttl and file_age < fresh_ttl and all(expire <= 0 or expire > now + fresh_ttl for expire in expires):
+        return True
+    return None
@@ -0,0 +1,167 @@
+import asyncio
+import base64
+import os
+import time
+from collections import deque
+from pathlib import Path
+from typing import Optional
+
+from playwright.async_api import Page
+
+from conf import DIAGNOSTICS_DIR, DIAGNOSTICS_FRAMES, DIAGNOSTICS_INTERVAL, DIAGNOSTICS_QUALITY, \
+    DIAGNOSTICS_MAX_WIDTH, DIAGNOSTICS_DISK_BUDGET_MB
+from utils.log import logger
+
+MODE_SCREENCAST = "screencast"
+MODE_SCREENSHOT = "screenshot"
+
+
+class DiskBudget(object):
+    """一次运行(进程)写入诊断文件的总字节数上限，所有 DiagnosticsRecorder 共用"""
+
+    def __init__(self, root=DIAGNOSTICS_DIR, budget_mb: float = DIAGNOSTICS_DISK_BUDGET_MB):
+        self.root = Path(root)
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.used = 0
+        self._run_dir: Optional[Path] = None
+
+    @property
+    def run_dir(self) -> Path:
+        if self._run_dir is None:
+            self._run_dir = self.root / f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+            self._run_dir.mkdir(parents=True, exist_ok=True)
+        return self._run_dir
+
+    def write(self, name: str, data: bytes) -> Optional[Path]:
+        """预算用完时不再写入，返回 None"""
+        if self.used + len(data) > self.budget:
+            return None
+        path = self.run_dir / name
+        path.write_bytes(data)
+        self.used += len(data)
+        return path
+
+
+_disk_budget: Optional[DiskBudget] = None
+
+
+def get_disk_budget() -> DiskBudget:
+    global _disk_budget
+    if _disk_budget is None:
+        _disk_budget = DiskBudget()
+    return _disk_budget
+
+
+class DiagnosticsRecorder(object):
+    """
+    在内存里保留最近几帧低分辨率的页面截图，只有步骤真正失败时才写到磁盘，替代重试循环里每次都截整页。
+
+    - Chromium 下使用 CDP screencast，页面有变化时浏览器推送压缩好的帧，不占用重试循环的时间
+    - 其他浏览器或 CDP 不可用时退回到限速截图：capture() 间隔小于 interval 时直接返回
+    - 以 async with 使用时，块内抛出异常会自动 flush
+
+    Args:
+        page: 页面
+        name: 写入磁盘时的文件名前缀，一般为平台名称
+        capacity: 内存中最多保留的帧数
+        interval: 两帧之间的最小间隔(秒)
+    """
+
+    def __init__(self, page: Page, name: str, capacity: int = DIAGNOSTICS_FRAMES,
+                 interval: float = DIAGNOSTICS_INTERVAL, budget: DiskBudget = None):
+        self.page = page
+        self.name = name
+        self.interval = interval
+        self.frames = deque(maxlen=capacity)
+        self.budget = budget
+        self.mode = MODE_SCREENSHOT
+        self._session = None
+        self._last_frame = 0.0
+
+    def _add_frame(self, data: bytes, label: str = ""):
+        self.frames.append((time.time(), label, data))
+        self._last_frame = time.monotonic()
+
+    def _on_screencast_frame(self, params):
+        # 每一帧都要确认，否则浏览器停止推送；超过频率的帧直接丢弃
+        asyncio.ensure_future(self._ack(params["sessionId"]))
+        if time.monotonic() - self._last_frame >= self.interval:
+            self._add_frame(base64.b64decode(params["data"]))
+
+    async def _ack(self, session_id):
+        try:
+            await self._session.send("Page.screencastFrameAck", {"sessionId": session_id})
+        except Exception:
+            pass
+
+    async def start(self):
+        try:
+            self._session = await self.page.context.new_cdp_session(self.page)
+            self._session.on("Page.screencastFrame", self._on_screencast_frame)
+            await self._session.send("Page.startScreencast", {
+                "format": "jpeg", "quality": DIAGNOSTICS_QUALITY,
+                "maxWidth": DIAGNOSTICS_MAX_WIDTH, "maxHeight": DIAGNOSTICS_MAX_WIDTH * 2})
+            self.mode = MODE_SCREENCAST
+        except Exception:
+            # 非 Chromium 浏览器没有 CDP
+            self._session = None
+            self.mode = MODE_SCREENSHOT
+        return self
+
+    async def stop(self):
+        if self._session is not None:
+            try:
+                await self._session.send("Page.stopScreencast")
+                await self._session.detach()
+            except Exception:
+                pass
+            self._session = None
+
+    async def _screenshot(self) -> Optional[bytes]:
+        try:
+            return await self.page.screenshot(type="jpeg", quality=DIAGNOSTICS_QUALITY, scale="css", timeout=5000)
+        except Exception:
+            return None
+
+    async def capture(self, label: str = ""):
+        """记录一帧；screencast 模式下帧由浏览器推送，这里什么也不做"""
+        if self.mode == MODE_SCREENCAST or time.monotonic() - self._last_frame < self.interval:
+            return
+        data = await self._screenshot()
+        if data:
+            self._add_frame(data, label)
+
+    async def flush(self, reason: str = "") -> Optional[Path]:
+        """
+        步骤失败时调用：补一帧当前画面，把内存里的帧和失败原因写到磁盘，返回写入的目录。
+
+        先写失败原因，再从最新的帧开始写图片，超出本次运行的磁盘预算后不再写入。
+        """
+        data = await self._screenshot()
+        if data:
+            self._add_frame(data, "failure")
+        budget = self.budget or get_disk_budget()
+        prefix = f"{self.name}_{time.strftime('%H%M%S')}_{id(self) % 10000:04d}"
+        lines = [f"reason: {reason}", f"url: {self.page.url}", f"mode: {self.mode}"]
+        lines += [f"frame {index:02d}: {time.strftime('%H:%M:%S', time.localtime(timestamp))} {label}"
+                  for index, (timestamp, label, _) in enumerate(self.frames)]
+        budget.write(f"{prefix}.txt", "\n".join(lines).encode("utf-8"))
+        # 预算不够时优先保留最新的帧
+        written = 0
+        for index, (timestamp, label, frame) in reversed(list(enumerate(self.frames))):
+            suffix = f"_{label}" if label else ""
+            if budget.write(f"{prefix}_{index:02d}{suffix}.jpg", frame):
+                written += 1
+        logger.info(f"[diagnostics] {self.name} 已写入 {written}/{len(self.frames)} 帧到 {budget.run_dir}")
+        self.frames.clear()
+        return budget.run_dir
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is not None and not issubclass(exc_type, asyncio.CancelledError):
+                await self.flush(repr(exc))
+        finally:
+            await self.stop()
@@ -0,0 +1,328 @@
+import asyncio
+import ctypes
+import ctypes.util
+import fnmatch
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import AsyncIterator, Iterable, Optional
+
+from conf import FOLDER_WATCH_POLL_INTERVAL, FILE_READY_STABLE_SECONDS
+from utils.log import logger
+
+# linux/inotify.h
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, "O_CLOEXEC", 0o2000000)
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+# 生产者写入整个目录期间放置的标记文件，存在时跳过该目录
+DOING_FILE = "doing.txt"
+# 单个文件写入期间放置的标记文件，例如 a.mp4 对应 a.mp4.lock
+LOCK_SUFFIX = ".lock"
+
+
+def _load_libc():
+    """加载提供 inotify 的 libc，非 Linux 或加载失败时返回 None，由调用方回退到轮询"""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+def parse_inotify_events(buffer: bytes):
+    """把 read(inotify_fd) 读到的数据解析为 (wd, mask, name) 列表"""
+    events = []
+    offset = 0
+    while offset + _EVENT_HEADER.size <= len(buffer):
+        wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(buffer, offset)
+        offset += _EVENT_HEADER.size
+        name = buffer[offset:offset + length].rstrip(b"\0").decode(errors="surrogateescape")
+        offset += length
+        events.append((wd, mask, name))
+    return events
+
+
+def lock_path_for(path) -> Path:
+    path = Path(path)
+    return path.with_name(path.name + LOCK_SUFFIX)
+
+
+def folder_is_busy(folder) -> bool:
+    """目录中存在 doing.txt 表示生产者还在写入"""
+    return (Path(folder) / DOING_FILE).exists()
+
+
+def is_file_ready(path, stable_seconds: float = FILE_READY_STABLE_SECONDS, now: float = None) -> bool:
+    """
+    判断文件是否已经写完，可以上传。
+
+    目录中没有 doing.txt、文件没有对应的 .lock，且最后修改时间距今超过 stable_seconds 时认为已写完，
+    同一目录中其他文件是否还在写入不影响判断。
+    """
+    path = Path(path)
+    if folder_is_busy(path.parent) or lock_path_for(path).exists():
+        return False
+    try:
+        mtime = path.stat().st_mtime
+    except OSError:
+        return False
+    now = time.time() if now is None else now
+    return now - mtime >= stable_seconds
+
+
+def wait_for_removed(path, timeout: float = None, poll_interval: float = FOLDER_WATCH_POLL_INTERVAL) -> bool:
+    """
+    阻塞到文件被删除或移走。Linux 上用 inotify 在删除时立即唤醒，否则按 poll_interval 轮询。
+
+    Returns:
+        文件已不存在返回 True，超时返回 False
+    """
+    path = Path(path)
+    deadline = None if timeout is None else time.monotonic() + timeout
+    libc = _load_libc()
+    fd = -1
+    if libc is not None:
+        fd = libc.inotify_init1(IN_CLOEXEC)
+        if fd >= 0 and libc.inotify_add_watch(fd, os.fsencode(path.parent), IN_DELETE | IN_MOVED_FROM) < 0:
+            os.close(fd)
+            fd = -1
+    try:
+        while path.exists():
+            wait = poll_interval
+            if fd >= 0:
+                # 用较长的间隔兜底复查，防止目录本身被删除等情况收不到事件
+                wait = 60
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            if fd >= 0:
+                readable, _, _ = select.select([fd], [], [], wait)
+                if readable:
+                    os.read(fd, 64 * 1024)
+            else:
+                time.sleep(wait)
+        return True
+    finally:
+        if fd >= 0:
+            os.close(fd)
+
+
+class FolderWatcher(object):
+    """
+    监听目录中新写入完成或移入的文件。
+
+    Linux 上使用 inotify 的 IN_CLOSE_WRITE / IN_MOVED_TO 事件，空闲时不扫描目录；
+    其他平台或 inotify 不可用时回退到轮询，目录 mtime 未变化时只做一次 stat。
+    启动时会先按文件名顺序返回目录中已有的、已经写完的文件。
+    目录中存在 doing.txt 或文件有对应的 .lock 时暂不返回，标记文件删除后再返回。
+
+    Args:
+        folders: 要监听的目录列表
+        patterns: 文件名匹配模式，例如 ("*.mp4",)
+        poll_interval: 轮询模式的间隔（秒）
+        stable_seconds: 启动时已有的文件最后修改时间距今超过这个秒数才认为已经写完
+        use_inotify: None 表示自动选择，False 强制使用轮询
+    """
+
+    def __init__(self, folders: Iterable, patterns: Iterable[str] = ("*.mp4",),
+                 poll_interval: float = FOLDER_WATCH_POLL_INTERVAL,
+                 stable_seconds: float = FILE_READY_STABLE_SECONDS, use_inotify: Optional[bool] = None):
+        self.folders = [Path(folder).resolve() for folder in folders]
+        self.patterns = tuple(patterns)
+        self.poll_interval = poll_interval
+        self.stable_seconds = stable_seconds
+        self._libc = _load_libc() if use_inotify is not False else None
+        self._fd = None
+
+    @property
+    def mode(self) -> str:
+        return "inotify" if self._libc is not None else "polling"
+
+    def match(self, name: str) -> bool:
+        # ._ 开头的是 macOS 生成的资源文件
+        if name.startswith("._"):
+            return False
+        return any(fnmatch.fnmatch(name, pattern) for pattern in self.patterns)
+
+    def scan(self, folder: Path) -> list:
+        """返回目录中匹配的文件，按文件名排序"""
+        try:
+            with os.scandir(folder) as entries:
+                names = [entry.name for entry in entries if entry.is_file() and self.match(entry.name)]
+        except OSError as e:
+            logger.warning(f"扫描目录失败 {folder}: {e}")
+            return []
+        return [folder / name for name in sorted(names)]
+
+    def gated(self, path: Path) -> bool:
+        """文件所在目录存在 doing.txt，或文件有对应的 .lock 时暂不处理"""
+        return folder_is_busy(path.parent) or lock_path_for(path).exists()
+
+    async def watch(self) -> AsyncIterator[Path]:
+        """异步迭代新文件的路径，同一路径被重新写入时会再次返回"""
+        # 先建立 inotify 监听再扫描已有文件，避免两者之间写入的文件被漏掉
+        if self._libc is not None:
+            try:
+                self._open_inotify()
+            except OSError as e:
+                logger.warning(f"inotify 不可用，回退到轮询: {e}")
+                self._libc = None
+        existing = [path for folder in self.folders for path in self.scan(folder)]
+        ready = [path for path in existing if is_file_ready(path, self.stable_seconds)]
+        for path in ready:
+            yield path
+        if self._libc is not None:
+            # 启动时还没写完或被 doing.txt/.lock 挡住的文件，值表示放行前是否还要等 mtime 稳定
+            deferred = {path: True for path in existing if path not in ready}
+            async for path in self._watch_inotify(deferred):
+                yield path
+        else:
+            async for path in self._watch_polling(ready):
+                yield path
+
+    def _open_inotify(self):
+        fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        self._fd = fd
+        self._wds = {}
+        for folder in self.folders:
+            wd = self._libc.inotify_add_watch(fd, os.fsencode(folder),
+                                              IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE | IN_MOVED_FROM)
+            if wd < 0:
+                self.close()
+                raise OSError(ctypes.get_errno(), f"{os.strerror(ctypes.get_errno())}: {folder}")
+            self._wds[wd] = folder
+
+    def _release(self, deferred: dict, folder: Optional[Path] = None) -> list:
+        """返回 deferred 中已经可以处理的文件，并从 deferred 中移除"""
+        released = []
+        for path, needs_stable in list(deferred.items()):
+            if folder is not None and path.parent != folder:
+                continue
+            if not path.exists():
+                del deferred[path]
+            elif not self.gated(path) and (not needs_stable or is_file_ready(path, self.stable_seconds)):
+                del deferred[path]
+                released.append(path)
+        return released
+
+    async def _watch_inotify(self, deferred: dict) -> AsyncIterator[Path]:
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+        loop.add_reader(self._fd, ready.set)
+        try:
+            while True:
+                # 只有等待 mtime 稳定的文件需要定时复查，doing.txt/.lock 的删除会直接唤醒
+                timeout = self.poll_interval if any(deferred.values()) else None
+                try:
+                    await asyncio.wait_for(ready.wait(), timeout)
+                except asyncio.TimeoutError:
+                    for path in self._release(deferred):
+                        yield path
+                    continue
+                ready.clear()
+                try:
+                    buffer = os.read(self._fd, 64 * 1024)
+                except BlockingIOError:
+                    continue
+                for wd, mask, name in parse_inotify_events(buffer):
+                    if mask & IN_Q_OVERFLOW:
+                        # 事件队列溢出时可能丢了事件，重新扫描所有目录
+                        logger.warning("inotify 事件队列溢出，重新扫描目录")
+                        for folder in self.folders:
+                            for path in self.scan(folder):
+                                deferred.setdefault(path, True)
+                        for path in self._release(deferred):
+                            yield path
+                        continue
+                    if mask & IN_ISDIR or wd not in self._wds:
+                        continue
+                    folder = self._wds[wd]
+                    if mask & (IN_DELETE | IN_MOVED_FROM):
+                        # doing.txt 或 .lock 被删除，放行被它挡住的文件
+                        if name == DOING_FILE or name.endswith(LOCK_SUFFIX):
+                            for path in self._release(deferred, folder):
+                                yield path
+                        continue
+                    if not self.match(name):
+                        continue
+                    path = folder / name
+                    # IN_CLOSE_WRITE / IN_MOVED_TO 说明写入已经结束，不必再等 mtime 稳定
+                    if self.gated(path):
+                        deferred[path] = False
+                        continue
+                    deferred.pop(path, None)
+                    yield path
+        finally:
+            loop.remove_reader(self._fd)
+            self.close()
+
+    async def _watch_polling(self, existing: list) -> AsyncIterator[Path]:
+        # 每个目录记录已返回文件的 (size, mtime) 和目录自身的 mtime
+        known = {folder: {} for folder in self.folders}
+        for path in existing:
+            known[path.parent][path.name] = self._stat(path)
+        # 第一次轮询总是列一次目录，补上启动扫描之后到这里之间写入的文件
+        dir_mtimes = {folder: None for folder in self.folders}
+        pending = {folder: {} for folder in self.folders}
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            for folder in self.folders:
+                dir_mtime = self._dir_mtime(folder)
+                # 目录项没有变化且没有等待写完的文件时，不需要列目录
+                if dir_mtime == dir_mtimes[folder] and not pending[folder]:
+                    continue
+                dir_mtimes[folder] = dir_mtime
+                paths = self.scan(folder)
+                names = {path.name for path in paths}
+                for name in [name for name in pending[folder] if name not in names]:
+                    del pending[folder][name]
+                for path in paths:
+                    stat = self._stat(path)
+                    if stat is None or known[folder].get(path.name) == stat:
+                        continue
+                    # 连续两次轮询大小和修改时间都不变、且没有被 doing.txt/.lock 挡住，才认为文件已经写完
+                    if pending[folder].get(path.name) == stat and not self.gated(path):
+                        del pending[folder][path.name]
+                        known[folder][path.name] = stat
+                        yield path
+                    else:
+                        pending[folder][path.name] = stat
+
+    @staticmethod
+    def _stat(path: Path):
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    @staticmethod
+    def _dir_mtime(folder: Path):
+        try:
+            return folder.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
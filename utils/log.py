@@ -2,7 +2,7 @@ from pathlib import Path
 from sys import stdout
 from loguru import logger
 
-from conf import BASE_DIR
+from conf import BASE_DIR, LOG_DIR
 
 
 def log_formatter(record: dict) -> str:
@@ -33,7 +33,7 @@ def create_logger(log_name: str, file_path: str):
     def filter_record(record):
         return record["extra"].get("business_name") == log_name
 
-    Path(BASE_DIR / file_path).parent.mkdir(exist_ok=True)
+    Path(BASE_DIR / file_path).parent.mkdir(parents=True, exist_ok=True)
     logger.add(Path(BASE_DIR / file_path), filter=filter_record, level="INFO", rotation="10 MB", retention="10 days", backtrace=True, diagnose=True)
     return logger.bind(business_name=log_name)
 
@@ -43,10 +43,10 @@ logger.remove()
 # Add a standard console handler
 logger.add(stdout, colorize=True, format=log_formatter)
 
-douyin_logger = create_logger('douyin', 'logs/douyin.log')
-tencent_logger = create_logger('tencent', 'logs/tencent.log')
-xhs_logger = create_logger('xhs', 'logs/xhs.log')
-tiktok_logger = create_logger('tiktok', 'logs/tiktok.log')
-bilibili_logger = create_logger('bilibili', 'logs/bilibili.log')
-kuaishou_logger = create_logger('kuaishou', 'logs/kuaishou.log')
-zhihu_logger = create_logger('zhihu', 'logs/zhihu.log')
+douyin_logger = create_logger('douyin', LOG_DIR / "douyin.log")
+tencent_logger = create_logger('tencent', LOG_DIR / "tencent.log")
+xhs_logger = create_logger('xhs', LOG_DIR / "xhs.log")
+tiktok_logger = create_logger('tiktok', LOG_DIR / "tiktok.log")
+bilibili_logger = create_logger('bilibili', LOG_DIR / "bilibili.log")
+kuaishou_logger = create_logger('kuaishou', LOG_DIR / "kuaishou.log")
+zhihu_logger = create_logger('zhihu', LOG_DIR / "zhihu.log")
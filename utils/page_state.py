@@ -0,0 +1,143 @@
+import asyncio
+import itertools
+import weakref
+from typing import Dict, List, Optional, Union
+
+from playwright.async_api import Frame, Page
+
+# 页面里回调 Python 的绑定名
+BINDING_NAME = "__sauPageState"
+
+# 在页面（或 iframe）里安装 MutationObserver，状态变化时通过绑定通知 Python。
+# states 为 [[状态名, [条件, ...]], ...]，按顺序匹配，第一个所有条件都满足的状态即为当前状态。
+# 条件字段：
+#   css: CSS 选择器，不填表示 document.body
+#   text: 元素文本需要包含的字符串
+#   class_absent: 元素不能带有的 class
+#   attr_absent: 元素不能带有的属性
+#   absent: 为 true 时表示没有任何元素满足上面的条件
+_OBSERVER_JS = """
+([bindingName, token, states]) => {
+    const matches = (cond) => {
+        let elements = cond.css ? Array.from(document.querySelectorAll(cond.css)) : [document.body];
+        elements = elements.filter((el) => el
+            && (!cond.text || (el.innerText || el.textContent || '').includes(cond.text))
+            && (!cond.class_absent || !el.classList.contains(cond.class_absent))
+            && (!cond.attr_absent || !el.hasAttribute(cond.attr_absent)));
+        return cond.absent ? elements.length === 0 : elements.length > 0;
+    };
+    const current = () => {
+        for (const [name, conds] of states) {
+            if (conds.every(matches)) return name;
+        }
+        return null;
+    };
+    let last = null;
+    let scheduled = false;
+    const check = () => {
+        scheduled = false;
+        const state = current();
+        if (state !== last) {
+            last = state;
+            if (state !== null) window[bindingName](token, state);
+        }
+    };
+    const observer = new MutationObserver(() => {
+        // 同一轮里的多次 DOM 变化合并成一次检查
+        if (!scheduled) {
+            scheduled = true;
+            setTimeout(check, 50);
+        }
+    });
+    observer.observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+    window.__sauObservers = window.__sauObservers || {};
+    window.__sauObservers[token] = observer;
+    check();
+}
+"""
+
+_DISCONNECT_JS = """
+(token) => {
+    const observer = (window.__sauObservers || {})[token];
+    if (observer) {
+        observer.disconnect();
+        delete window.__sauObservers[token];
+    }
+}
+"""
+
+Condition = Dict[str, Union[str, bool]]
+
+_tokens = itertools.count(1)
+# page -> {token: asyncio.Queue}，每个 page 只注册一次绑定
+_page_queues: "weakref.WeakKeyDictionary[Page, Dict[int, asyncio.Queue]]" = weakref.WeakKeyDictionary()
+
+
+async def _ensure_binding(page: Page) -> Dict[int, asyncio.Queue]:
+    if page not in _page_queues:
+        queues = {}
+        _page_queues[page] = queues
+
+        def on_state(source, token, state):
+            queue = queues.get(token)
+            if queue is not None:
+                queue.put_nowait(state)
+
+        await page.expose_binding(BINDING_NAME, on_state)
+    return _page_queues[page]
+
+
+class PageStateWatcher(object):
+    """
+    用 MutationObserver 监听页面上的上传状态，状态出现的同时通知 Python，不再每隔几秒轮询 locator。
+
+    用法::
+
+        async with PageStateWatcher(page, {"error": [...], "done": [...]}) as watcher:
+            state = await watcher.next(timeout=600)
+
+    Args:
+        page: 页面
+        states: {状态名: 条件或条件列表}，按顺序匹配，条件格式见 _OBSERVER_JS
+        frame: 状态所在的 iframe，默认是页面主 frame
+    """
+
+    def __init__(self, page: Page, states: Dict[str, Union[Condition, List[Condition]]], frame: Frame = None):
+        self.page = page
+        self.frame = frame or page.main_frame
+        self.states = [[name, conds if isinstance(conds, list) else [conds]] for name, conds in states.items()]
+        self.token = next(_tokens)
+        self._queues = None
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    async def start(self):
+        self._queues = await _ensure_binding(self.page)
+        self._queues[self.token] = self.queue
+        await self.frame.evaluate(_OBSERVER_JS, [BINDING_NAME, self.token, self.states])
+        return self
+
+    async def next(self, timeout: Optional[float] = None) -> str:
+        """等待下一次状态变化，返回状态名；超时抛出 asyncio.TimeoutError"""
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    async def stop(self):
+        if self._queues is not None:
+            self._queues.pop(self.token, None)
+        try:
+            await self.frame.evaluate(_DISCONNECT_JS, self.token)
+        except Exception:
+            # 页面已经跳转或关闭，observer 随页面一起销毁
+            pass
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+
+async def wait_for_page_state(page: Page, states: Dict[str, Union[Condition, List[Condition]]], frame: Frame = None,
+                              timeout: Optional[float] = None) -> str:
+    """等待页面进入 states 中的任意一个状态，返回状态名"""
+    async with PageStateWatcher(page, states, frame) as watcher:
+        return await watcher.next(timeout)
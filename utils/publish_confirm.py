@@ -0,0 +1,185 @@
+import asyncio
+from typing import Callable, Optional, Sequence
+
+from playwright.async_api import Page
+
+from utils.base_social_media import PublishFailedError
+
+
+class PublishApi(object):
+    """
+    平台发布接口的描述。
+
+    Args:
+        url_part: 发布接口 URL 中包含的片段
+        status_key: 响应 JSON 中表示结果的字段
+        success_values: status_key 为这些值时代表发布成功
+        id_keys: 作品 id 可能使用的字段名，按顺序在响应 JSON 中(包括嵌套的 dict/list)查找
+        message_keys: 失败原因可能使用的字段名
+    """
+
+    def __init__(self, url_part: str, status_key: str, success_values: Sequence, id_keys: Sequence[str],
+                 message_keys: Sequence[str] = ("status_msg", "errMsg", "message", "error_msg", "msg")):
+        self.url_part = url_part
+        self.status_key = status_key
+        self.success_values = tuple(success_values)
+        self.id_keys = tuple(id_keys)
+        self.message_keys = tuple(message_keys)
+
+    def matches(self, url: str) -> bool:
+        return self.url_part in url
+
+
+class PublishResult(object):
+    def __init__(self, success: bool, post_id: Optional[str] = None, message: str = "", source: str = "response"):
+        self.success = success
+        self.post_id = post_id
+        self.message = message
+        # response: 由发布接口的响应确认；fallback: 由页面跳转等兜底条件确认，拿不到作品 id
+        self.source = source
+
+    def __repr__(self):
+        return f"<PublishResult success={self.success} post_id={self.post_id} source={self.source}>"
+
+
+def find_value(data, keys: Sequence[str]):
+    """在嵌套的 dict/list 中按 keys 的顺序查找第一个非空值"""
+    for key in keys:
+        stack = [data]
+        while stack:
+            item = stack.pop(0)
+            if isinstance(item, dict):
+                value = item.get(key)
+                if value not in (None, "", 0):
+                    return value
+                stack.extend(item.values())
+            elif isinstance(item, list):
+                stack.extend(item)
+    return None
+
+
+def parse_publish_response(api: PublishApi, status: int, data) -> PublishResult:
+    """把发布接口的 HTTP 状态码和 JSON 转换为 PublishResult"""
+    message = find_value(data, api.message_keys) if data is not None else None
+    if status >= 400 or not isinstance(data, dict):
+        return PublishResult(False, message=str(message or f"HTTP {status}"))
+    if data.get(api.status_key) not in api.success_values:
+        return PublishResult(False, message=str(message or f"{api.status_key}={data.get(api.status_key)}"))
+    post_id = find_value(data, api.id_keys)
+    return PublishResult(True, post_id=str(post_id) if post_id is not None else None)
+
+
+class PublishConfirmation(object):
+    """
+    点击发布前订阅发布接口的请求和响应，响应回来时立即得到发布结果和作品 id。
+
+    - 发布请求已经发出后只等待响应，不再重复点击发布按钮
+    - 接口返回失败时抛出 PublishFailedError
+    - 页面跳转等原有判断作为兜底，接口地址变化时仍然可以确认发布成功
+
+    用法::
+
+        async with PublishConfirmation(page, DOUYIN_PUBLISH_API) as publish:
+            while True:
+                if not publish.request_sent:
+                    await publish_button.click()
+                result = await publish.wait(timeout=3, fallback_url="https://.../manage**")
+                if result:
+                    break
+    """
+
+    def __init__(self, page: Page, api: PublishApi, response_timeout: float = 60):
+        self.page = page
+        self.api = api
+        # 请求发出后等待响应的最长时间
+        self.response_timeout = response_timeout
+        self.request_sent = False
+        self.result: Optional[PublishResult] = None
+        self._future: Optional[asyncio.Future] = None
+        self._tasks = set()
+
+    def _on_request(self, request):
+        if request.method != "GET" and self.api.matches(request.url):
+            self.request_sent = True
+
+    def _on_response(self, response):
+        if response.request.method == "GET" or not self.api.matches(response.url):
+            return
+        task = asyncio.ensure_future(self._handle_response(response))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _handle_response(self, response):
+        try:
+            data = await response.json()
+        except Exception:
+            data = None
+        result = parse_publish_response(self.api, response.status, data)
+        if not self._future.done():
+            self._future.set_result(result)
+
+    async def start(self):
+        self._future = asyncio.get_running_loop().create_future()
+        self.page.on("request", self._on_request)
+        self.page.on("response", self._on_response)
+        return self
+
+    async def stop(self):
+        self.page.remove_listener("request", self._on_request)
+        self.page.remove_listener("response", self._on_response)
+        for task in list(self._tasks):
+            task.cancel()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    async def wait(self, timeout: float, fallback_url: str = None,
+                   fallback: Callable = None) -> Optional[PublishResult]:
+        """
+        等待发布结果。
+
+        Args:
+            timeout: 发布请求还没发出时的等待时间，超时返回 None，由调用方重新点击发布
+            fallback_url: 页面跳转到这个地址也代表发布成功
+            fallback: 返回协程的函数，协程正常结束代表发布成功，抛出异常表示没有成功
+
+        Returns:
+            PublishResult，超时返回 None
+
+        Raises:
+            PublishFailedError: 发布接口返回失败
+        """
+        waiters = [asyncio.ensure_future(asyncio.shield(self._future))]
+        if fallback_url:
+            waiters.append(asyncio.ensure_future(self.page.wait_for_url(fallback_url, timeout=0)))
+        if fallback is not None:
+            waiters.append(asyncio.ensure_future(fallback()))
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            pending = set(waiters)
+            while pending:
+                # 请求已经发出时放宽到 response_timeout，避免接口慢时重复点击发布
+                limit = max(timeout, self.response_timeout) if self.request_sent else timeout
+                remaining = started + limit - loop.time()
+                if remaining <= 0:
+                    return None
+                done, pending = await asyncio.wait(pending, timeout=min(remaining, 0.5),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not any(not task.cancelled() and task.exception() is None for task in done):
+                    continue
+                if self._future.done():
+                    # 跳转和响应几乎同时到达时以响应为准，可以拿到作品 id
+                    self.result = self._future.result()
+                    if not self.result.success:
+                        raise PublishFailedError(self.result.message)
+                else:
+                    self.result = PublishResult(True, source="fallback")
+                return self.result
+            return None
+        finally:
+            for task in waiters:
+                task.cancel()
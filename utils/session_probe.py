@@ -0,0 +1,162 @@
+import asyncio
+import time
+from http.cookiejar import DefaultCookiePolicy
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from conf import SESSION_PROBE_TIMEOUT
+from utils.base_social_media import SOCIAL_MEDIA_DOUYIN, SOCIAL_MEDIA_TENCENT, SOCIAL_MEDIA_TIKTOK, \
+    SOCIAL_MEDIA_KUAISHOU, SOCIAL_MEDIA_ZHIHU
+from utils.cookie_precheck import load_storage_cookies
+
+# cookie 校验方式：browser 为无头浏览器打开创作者页面，http 为先用已登录接口探测，无法判断时再回退到浏览器
+AUTH_STRATEGY_BROWSER = "browser"
+AUTH_STRATEGY_HTTP = "http"
+
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) ' \
+             'Chrome/120.0.0.0 Safari/537.36'
+
+
+def _create_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({'user-agent': USER_AGENT})
+    # 各账号的 cookie 通过请求头单独传入，不让共享 session 记住任何响应里的 cookie
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    return session
+
+
+# 所有账号共用一个带连接池的 session，多次探测复用 TCP/TLS 连接
+_session = _create_session()
+
+
+def _json_body(body) -> Optional[dict]:
+    return body if isinstance(body, dict) else None
+
+
+def _check_douyin(status_code, body):
+    body = _json_body(body)
+    if body is None or "status_code" not in body:
+        return None
+    return body["status_code"] == 0 and bool(body.get("user"))
+
+
+def _check_tencent(status_code, body):
+    body = _json_body(body)
+    if body is None or "errCode" not in body:
+        return None
+    return body["errCode"] == 0
+
+
+def _check_kuaishou(status_code, body):
+    body = _json_body(body)
+    if body is None or "result" not in body:
+        return None
+    return body["result"] == 1
+
+
+def _check_tiktok(status_code, body):
+    body = _json_body(body)
+    if body is None or "message" not in body:
+        return None
+    return body["message"] == "success" and bool((body.get("data") or {}).get("user_id"))
+
+
+def _check_zhihu(status_code, body):
+    body = _json_body(body)
+    if status_code == 200 and body is not None:
+        return bool(body.get("id"))
+    return None
+
+
+class SessionProbe(object):
+    """
+    用 cookie 文件中的 cookie 请求一个需要登录的轻量接口，根据状态码和返回内容判断登录态。
+
+    Args:
+        url: 需要登录才能正常返回的接口
+        cookie_domain: 只携带域名包含该字符串的 cookie
+        check: (status_code, body) -> True/False/None，body 为解析后的 JSON，解析失败时为 None
+        method: 请求方法
+        json_data: POST 请求体
+    """
+
+    def __init__(self, url: str, cookie_domain: str, check, method: str = "GET", json_data: dict = None):
+        self.url = url
+        self.cookie_domain = cookie_domain
+        self.check = check
+        self.method = method
+        self.json_data = json_data
+
+    def build_cookie_header(self, account_file) -> str:
+        now = time.time()
+        pairs = []
+        for cookie in load_storage_cookies(account_file):
+            if self.cookie_domain not in cookie.get("domain", ""):
+                continue
+            if 0 < cookie.get("expires", -1) <= now:
+                continue
+            pairs.append(f"{cookie['name']}={cookie['value']}")
+        return "; ".join(pairs)
+
+    def probe(self, account_file, url: str = None, timeout: float = SESSION_PROBE_TIMEOUT) -> Optional[bool]:
+        """
+        Returns:
+            True: 已登录  False: 未登录  None: 无法判断（网络错误、接口变化等），应回退到浏览器检查
+        """
+        try:
+            cookie_header = self.build_cookie_header(account_file)
+        except (OSError, ValueError, KeyError):
+            return None
+        if not cookie_header:
+            return False
+        try:
+            response = _session.request(self.method, url or self.url, json=self.json_data, timeout=timeout,
+                                        headers={'cookie': cookie_header}, allow_redirects=False)
+        except requests.RequestException:
+            return None
+        if response.status_code in (401, 403):
+            return False
+        if response.is_redirect:
+            location = response.headers.get('location', '')
+            if any(word in location for word in ('login', 'signin', 'passport')):
+                return False
+            return None
+        if response.status_code >= 500:
+            return None
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        return self.check(response.status_code, body)
+
+
+SESSION_PROBES = {
+    SOCIAL_MEDIA_DOUYIN: SessionProbe("https://creator.douyin.com/web/api/media/user/info/", "douyin.com",
+                                      _check_douyin),
+    SOCIAL_MEDIA_TENCENT: SessionProbe(
+        "https://channels.weixin.qq.com/cgi-bin/mmfinderassistant-bin/auth/auth_data", "qq.com", _check_tencent,
+        method="POST", json_data={}),
+    SOCIAL_MEDIA_KUAISHOU: SessionProbe("https://cp.kuaishou.com/rest/v2/creator/pc/authority/account/current",
+                                        "kuaishou.com", _check_kuaishou, method="POST", json_data={}),
+    SOCIAL_MEDIA_TIKTOK: SessionProbe("https://www.tiktok.com/passport/web/account/info/", "tiktok.com",
+                                      _check_tiktok),
+    SOCIAL_MEDIA_ZHIHU: SessionProbe("https://www.zhihu.com/api/v4/me", "zhihu.com", _check_zhihu),
+}
+
+
+def probe_session(account_file, platform: str, url: str = None) -> Optional[bool]:
+    """用平台的 HTTP 探测接口判断 cookie 文件是否已登录，没有探测接口的平台返回 None"""
+    probe = SESSION_PROBES.get(platform)
+    if probe is None:
+        return None
+    return probe.probe(account_file, url=url)
+
+
+async def async_probe_session(account_file, platform: str, url: str = None) -> Optional[bool]:
+    """probe_session 的协程版本，在线程中执行请求，不阻塞事件循环"""
+    return await asyncio.to_thread(probe_session, account_file, platform, url)
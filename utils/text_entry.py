@@ -0,0 +1,81 @@
+from typing import Iterable, Optional
+
+from playwright.async_api import Page, TimeoutError as PlaywrightTimeoutError
+
+from conf import TEXT_SUGGESTION_TIMEOUT
+
+
+async def insert_text(page: Page, text: str, clear: bool = False):
+    """
+    一次性写入整段文字(一个 input 事件)，代替逐个按键的 keyboard.type。
+
+    Args:
+        page: 页面，焦点需要已经在输入框里
+        text: 要写入的文字
+        clear: 是否先清空输入框
+    """
+    if clear:
+        await page.keyboard.press("Control+KeyA")
+        await page.keyboard.press("Delete")
+    if text:
+        await page.keyboard.insert_text(text)
+
+
+async def type_with_suggestion(page: Page, text: str, suggestion: Optional[str] = None,
+                               timeout: float = TEXT_SUGGESTION_TIMEOUT, root=None) -> bool:
+    """
+    写入需要触发联想弹窗的文字：前面的部分一次性写入，最后一个字符用真实按键输入来触发弹窗，
+    然后等待弹窗出现，不再固定 sleep。
+
+    Args:
+        page: 页面，焦点需要已经在输入框里
+        text: 要写入的文字
+        suggestion: 联想弹窗的选择器，None 表示平台不需要弹窗，整段直接写入
+        timeout: 等待弹窗的最长时间(秒)，0 表示只用按键输入最后一个字符，不等待弹窗
+        root: 在哪里查找弹窗，表单在 iframe 里时传入对应的 Frame，默认是 page
+
+    Returns:
+        弹窗是否出现；suggestion 为 None 时返回 False
+    """
+    if not suggestion or not text:
+        await insert_text(page, text)
+        return False
+    await insert_text(page, text[:-1])
+    await page.keyboard.type(text[-1])
+    if timeout <= 0:
+        return False
+    try:
+        await (root or page).locator(suggestion).first.wait_for(state="visible", timeout=timeout * 1000)
+        return True
+    except PlaywrightTimeoutError:
+        return False
+
+
+async def add_hashtags(page: Page, tags: Iterable[str], suggestion: Optional[str] = None, commit_key: str = "Space",
+                       timeout: float = TEXT_SUGGESTION_TIMEOUT, root=None) -> int:
+    """
+    依次写入 #话题，每个话题写完后按 commit_key 让平台把它转换为话题。
+
+    某个话题等不到弹窗时(选择器不匹配或平台这次没有弹出)，后面的话题不再等待，
+    只按键输入后直接确认，最多多等一次 timeout。
+
+    Args:
+        page: 页面，焦点需要已经在输入框里
+        tags: 话题列表，不带 #
+        suggestion: 话题联想弹窗的选择器，需要弹窗才能识别话题的平台填写，弹窗出现后再按 commit_key
+        commit_key: 确认话题的按键，None 表示不按
+        timeout: 每个话题等待弹窗的最长时间(秒)
+        root: 在哪里查找弹窗，表单在 iframe 里时传入对应的 Frame，默认是 page
+
+    Returns:
+        写入的话题数
+    """
+    count = 0
+    for tag in tags:
+        shown = await type_with_suggestion(page, f"#{tag}", suggestion, timeout, root)
+        if suggestion and not shown:
+            timeout = 0
+        if commit_key:
+            await page.keyboard.press(commit_key)
+        count += 1
+    return count
@@ -0,0 +1,253 @@
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from conf import UPLOAD_LEDGER_DB
+from utils.log import logger
+
+STATUS_PENDING = "pending"
+STATUS_UPLOADING = "uploading"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS upload_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    file_path TEXT NOT NULL,
+    content_hash TEXT,
+    platform TEXT NOT NULL,
+    account TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    post_id TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    UNIQUE (platform, account, file_path)
+);
+CREATE INDEX IF NOT EXISTS idx_upload_jobs_hash ON upload_jobs (content_hash, platform, account);
+CREATE INDEX IF NOT EXISTS idx_upload_jobs_status ON upload_jobs (platform, account, status);
+CREATE TABLE IF NOT EXISTS published_hashes (
+    content_hash TEXT NOT NULL,
+    platform TEXT NOT NULL,
+    account TEXT NOT NULL,
+    job_id INTEGER NOT NULL,
+    published_at REAL NOT NULL,
+    PRIMARY KEY (content_hash, platform, account)
+);
+INSERT OR IGNORE INTO published_hashes (content_hash, platform, account, job_id, published_at)
+    SELECT content_hash, platform, account, id, updated_at FROM upload_jobs
+    WHERE status = 'done' AND content_hash IS NOT NULL;
+CREATE TABLE IF NOT EXISTS file_fingerprints (
+    file_path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    fingerprint TEXT NOT NULL,
+    computed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ledger_imports (
+    source TEXT PRIMARY KEY,
+    rows INTEGER NOT NULL,
+    imported_at REAL NOT NULL
+);
+"""
+
+
+class UploadLedger(object):
+    """
+    记录每个文件在各平台、各账号上的上传状态，替代 <目录名>_updone.txt。
+
+    一个 (platform, account, file_path) 对应一条任务记录，file_path 统一保存为绝对路径。
+    记录同时保存文件内容指纹(见 utils.content_fingerprint)，改名或复制到其他目录的同一个文件也能识别出来；
+    已发布过的指纹单独记在 published_hashes 中，同一路径换成新内容后，旧内容的副本仍能被识别。
+    数据库使用 WAL 模式，多个进程可以同时读写同一个账本。
+
+    Args:
+        db_path: 数据库文件路径，默认使用 conf.UPLOAD_LEDGER_DB
+    """
+
+    def __init__(self, db_path=UPLOAD_LEDGER_DB):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # 同一个连接可能被 asyncio.to_thread 的不同线程使用，由 _lock 串行化
+        self._conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=30000")
+        self._conn.executescript(_SCHEMA)
+
+    @staticmethod
+    def normalize_path(file_path) -> str:
+        return os.path.abspath(str(file_path))
+
+    def _execute(self, sql: str, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    def get_job(self, file_path, platform: str, account: str) -> Optional[dict]:
+        row = self._execute(
+            "SELECT * FROM upload_jobs WHERE platform = ? AND account = ? AND file_path = ?",
+            (platform, account, self.normalize_path(file_path))).fetchone()
+        return dict(row) if row else None
+
+    def is_done(self, file_path, platform: str, account: str) -> bool:
+        row = self._execute(
+            "SELECT 1 FROM upload_jobs WHERE platform = ? AND account = ? AND file_path = ? AND status = ?",
+            (platform, account, self.normalize_path(file_path), STATUS_DONE)).fetchone()
+        return row is not None
+
+    def find_done_by_hash(self, content_hash: str, platform: str, account: str) -> Optional[dict]:
+        """按内容哈希查找发布过这个内容的任务，用于识别改名或复制过的同一个文件"""
+        row = self._execute(
+            "SELECT upload_jobs.* FROM published_hashes JOIN upload_jobs ON upload_jobs.id = published_hashes.job_id "
+            "WHERE published_hashes.content_hash = ? AND published_hashes.platform = ? "
+            "AND published_hashes.account = ?", (content_hash, platform, account)).fetchone()
+        return dict(row) if row else None
+
+    def find_done(self, file_path, platform: str, account: str, content_hash: str = None) -> Optional[dict]:
+        """
+        查找已上传的任务：先按路径找，再按内容哈希找。
+
+        同一个视频复制到另一个目录或改名后路径不同，但内容哈希相同，也会被找到；
+        传入 content_hash 时，同一路径被写入了不同内容不算已上传(旧记录没有哈希时仍按路径判断)。
+        """
+        row = self._execute(
+            "SELECT * FROM upload_jobs WHERE platform = ? AND account = ? AND file_path = ? AND status = ?",
+            (platform, account, self.normalize_path(file_path), STATUS_DONE)).fetchone()
+        if row and (not content_hash or row["content_hash"] in (None, content_hash)):
+            return dict(row)
+        if content_hash:
+            return self.find_done_by_hash(content_hash, platform, account)
+        return None
+
+    def get_fingerprint(self, file_path, size: int, mtime_ns: int) -> Optional[str]:
+        """返回缓存的文件指纹，文件大小或修改时间变了就当作没有缓存"""
+        row = self._execute("SELECT fingerprint FROM file_fingerprints WHERE file_path = ? AND size = ? "
+                            "AND mtime_ns = ?", (self.normalize_path(file_path), size, mtime_ns)).fetchone()
+        return row["fingerprint"] if row else None
+
+    def save_fingerprints(self, rows):
+        """
+        Args:
+            rows: [(file_path, size, mtime_ns, fingerprint), ...]
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO file_fingerprints (file_path, size, mtime_ns, fingerprint, computed_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [(self.normalize_path(file_path), size, mtime_ns, fingerprint, now)
+                     for file_path, size, mtime_ns, fingerprint in rows])
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def start(self, file_path, platform: str, account: str, content_hash: str = None) -> int:
+        """开始一次上传：不存在则创建任务，存在则尝试次数加一，返回任务 id"""
+        now = time.time()
+        file_path = self.normalize_path(file_path)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO upload_jobs (file_path, content_hash, platform, account, status, attempts, "
+                "created_at, updated_at) VALUES (?, ?, ?, ?, ?, 1, ?, ?) "
+                "ON CONFLICT (platform, account, file_path) DO UPDATE SET status = excluded.status, "
+                "attempts = attempts + 1, content_hash = COALESCE(excluded.content_hash, content_hash), "
+                "error = NULL, updated_at = excluded.updated_at",
+                (file_path, content_hash, platform, account, STATUS_UPLOADING, now, now))
+            row = self._conn.execute(
+                "SELECT id FROM upload_jobs WHERE platform = ? AND account = ? AND file_path = ?",
+                (platform, account, file_path)).fetchone()
+        return row["id"]
+
+    def mark_done(self, job_id: int, post_id: str = None):
+        """标记任务完成，任务的内容哈希同时记入 published_hashes，之后这个路径换成其他内容也不会丢失"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("UPDATE upload_jobs SET status = ?, post_id = COALESCE(?, post_id), error = NULL, "
+                                   "updated_at = ? WHERE id = ?", (STATUS_DONE, post_id, now, job_id))
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO published_hashes (content_hash, platform, account, job_id, published_at) "
+                    "SELECT content_hash, platform, account, id, ? FROM upload_jobs "
+                    "WHERE id = ? AND content_hash IS NOT NULL", (now, job_id))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def mark_failed(self, job_id: int, error: str = None):
+        self._execute("UPDATE upload_jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                      (STATUS_FAILED, error, time.time(), job_id))
+
+    def record_done(self, file_path, platform: str, account: str, post_id: str = None,
+                    content_hash: str = None) -> int:
+        """同步上传流程的简便写法：一次调用记录一个已完成的上传"""
+        job_id = self.start(file_path, platform, account, content_hash)
+        self.mark_done(job_id, post_id)
+        return job_id
+
+    def count(self, platform: str = None, account: str = None, status: str = None) -> int:
+        conditions, params = [], []
+        for column, value in (("platform", platform), ("account", account), ("status", status)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        return self._execute(f"SELECT COUNT(*) FROM upload_jobs{where}", params).fetchone()[0]
+
+    def import_updone_file(self, updone_file, folder, platform: str, account: str) -> int:
+        """
+        把旧的 <目录名>_updone.txt 导入账本，每个源文件只导入一次。
+
+        Args:
+            updone_file: updone.txt 路径
+            folder: updone.txt 记录的文件所在目录，旧文件只记了文件名
+            platform: 平台名称
+            account: 账号名称
+
+        Returns:
+            本次导入的记录数，文件不存在或已经导入过时返回 0
+        """
+        source = self.normalize_path(updone_file)
+        if not os.path.exists(source):
+            return 0
+        if self._execute("SELECT 1 FROM ledger_imports WHERE source = ?", (source,)).fetchone():
+            return 0
+        rows = []
+        now = time.time()
+        with open(source, 'r', encoding='utf-8') as f:
+            for line in f:
+                filename = line.strip()
+                # 旧脚本创建文件时会写一行 "Doing task started at: ..."
+                if not filename or filename.startswith("Doing task started at:"):
+                    continue
+                rows.append((self.normalize_path(os.path.join(folder, filename)), platform, account, STATUS_DONE,
+                             now, now))
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO upload_jobs (file_path, platform, account, status, attempts, "
+                    "created_at, updated_at) VALUES (?, ?, ?, ?, 1, ?, ?)", rows)
+                self._conn.execute("INSERT INTO ledger_imports (source, rows, imported_at) VALUES (?, ?, ?)",
+                                   (source, len(rows), now))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        logger.info(f"已将 {source} 中的 {len(rows)} 条上传记录导入账本")
+        return len(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
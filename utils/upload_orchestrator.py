@@ -0,0 +1,158 @@
+import asyncio
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from conf import UPLOAD_MAX_CONCURRENCY, UPLOAD_PLATFORM_CONCURRENCY
+from utils.content_fingerprint import fingerprint_files
+from utils.log import logger
+from utils.upload_ledger import UploadLedger
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_SKIPPED = "skipped"
+
+
+class UploadJob(object):
+    """
+    一次上传任务。
+
+    Args:
+        platform: 平台名称，见 utils.base_social_media 中的 SOCIAL_MEDIA_*
+        app: 上传对象，例如 DouYinVideo、KSVideo、TencentVideo、TiktokVideo，需要有 account_file 属性和 main() 协程
+        account: 写入账本的账号名；不传时使用 cookie 文件的绝对路径，
+            cookies/<平台>_uploader/account.json 这样同名的 cookie 文件不会被当成同一个账号
+    """
+
+    def __init__(self, platform: str, app, account: str = None):
+        self.platform = platform
+        self.app = app
+        self.account_file = str(app.account_file)
+        self.account = account or str(Path(self.account_file).resolve())
+        self.file_path = str(getattr(app, "file_path", "") or "")
+        self.content_hash: Optional[str] = None
+        self.status = JOB_PENDING
+        self.error: Optional[BaseException] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def __repr__(self):
+        return f"<UploadJob {self.platform} {self.account} {self.file_path} {self.status}>"
+
+
+class UploadOrchestrator(object):
+    """
+    在同一个事件循环里并发执行多个账号、多个平台的上传任务。
+
+    - 全局并发数和每个平台的并发数分别受限
+    - 同一个 cookie 文件同一时间只有一个任务在用，避免两个浏览器上下文同时写同一份 storage_state
+    - 传入 ledger 时，已上传过的文件直接跳过，上传结果写入账本；
+      run() 会先计算所有文件的内容指纹，改名或复制过的同一个文件在打开浏览器之前就被跳过
+
+    Args:
+        max_concurrency: 全局最多同时进行的上传数
+        platform_limits: {平台: 并发数}，未配置的平台只受全局限制
+        ledger: 上传账本，None 表示不记录
+    """
+
+    def __init__(self, max_concurrency: int = UPLOAD_MAX_CONCURRENCY, platform_limits: dict = None,
+                 ledger: UploadLedger = None):
+        self.max_concurrency = max_concurrency
+        self.platform_limits = UPLOAD_PLATFORM_CONCURRENCY if platform_limits is None else platform_limits
+        self.ledger = ledger
+        self._global = asyncio.Semaphore(max_concurrency)
+        self._platforms = {}
+        self._accounts = {}
+
+    def _platform_semaphore(self, platform: str) -> Optional[asyncio.Semaphore]:
+        limit = self.platform_limits.get(platform)
+        if not limit:
+            return None
+        if platform not in self._platforms:
+            self._platforms[platform] = asyncio.Semaphore(limit)
+        return self._platforms[platform]
+
+    def _account_lock(self, account_file: str) -> asyncio.Lock:
+        key = str(Path(account_file).resolve())
+        if key not in self._accounts:
+            self._accounts[key] = asyncio.Lock()
+        return self._accounts[key]
+
+    async def run_job(self, job: UploadJob) -> UploadJob:
+        if job.status == JOB_SKIPPED:
+            return job
+        if self.ledger and job.file_path and await asyncio.to_thread(
+                self.ledger.find_done, job.file_path, job.platform, job.account, job.content_hash):
+            job.status = JOB_SKIPPED
+            logger.info(f"[orchestrator] 已上传过，跳过 {job}")
+            return job
+        # 先拿账号锁再占并发名额，等待同账号任务时不占用名额
+        async with self._account_lock(job.account_file):
+            platform_semaphore = self._platform_semaphore(job.platform)
+            if platform_semaphore is not None:
+                await platform_semaphore.acquire()
+            try:
+                async with self._global:
+                    await self._execute(job)
+            finally:
+                if platform_semaphore is not None:
+                    platform_semaphore.release()
+        return job
+
+    async def _execute(self, job: UploadJob):
+        job_id = None
+        if self.ledger and job.file_path:
+            job_id = await asyncio.to_thread(self.ledger.start, job.file_path, job.platform, job.account,
+                                             job.content_hash)
+        job.status = JOB_RUNNING
+        job.started_at = time.time()
+        logger.info(f"[orchestrator] 开始上传 {job}")
+        try:
+            await job.app.main()
+        except Exception as e:
+            job.status = JOB_FAILED
+            job.error = e
+            logger.error(f"[orchestrator] 上传失败 {job}: {e!r}")
+            if job_id is not None:
+                await asyncio.to_thread(self.ledger.mark_failed, job_id, repr(e))
+        else:
+            job.status = JOB_DONE
+            logger.success(f"[orchestrator] 上传完成 {job}")
+            if job_id is not None:
+                await asyncio.to_thread(self.ledger.mark_done, job_id, getattr(job.app, "post_id", None))
+        finally:
+            job.finished_at = time.time()
+
+    async def fingerprint(self, jobs: List[UploadJob]):
+        """
+        在进程池里计算所有任务文件的内容指纹，指纹缓存在账本中。
+
+        同一批里内容相同、平台和账号也相同的任务只保留第一个，其余直接标记为跳过。
+        """
+        paths = [job.file_path for job in jobs if job.file_path and job.status == JOB_PENDING]
+        if not self.ledger or not paths:
+            return
+        fingerprints = await asyncio.to_thread(fingerprint_files, paths, self.ledger)
+        seen = {}
+        for job in jobs:
+            job.content_hash = fingerprints.get(job.file_path, job.content_hash)
+            if job.content_hash is None or job.status != JOB_PENDING:
+                continue
+            key = (job.content_hash, job.platform, job.account)
+            if key in seen:
+                job.status = JOB_SKIPPED
+                logger.info(f"[orchestrator] 与 {seen[key].file_path} 内容相同，跳过 {job}")
+            else:
+                seen[key] = job
+
+    async def run(self, jobs: List[UploadJob]) -> List[UploadJob]:
+        """并发执行所有任务，单个任务失败不影响其他任务，返回带状态的任务列表"""
+        started = time.time()
+        await self.fingerprint(jobs)
+        await asyncio.gather(*(self.run_job(job) for job in jobs))
+        summary = {status: sum(1 for job in jobs if job.status == status)
+                   for status in (JOB_DONE, JOB_FAILED, JOB_SKIPPED)}
+        logger.info(f"[orchestrator] {len(jobs)} 个任务用时 {time.time() - started:.1f}s: {summary}")
+        return jobs
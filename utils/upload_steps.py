@@ -0,0 +1,106 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Sequence
+
+from utils.log import logger
+
+
+class UploadStep(object):
+    """
+    上传流程中的一个步骤。
+
+    Args:
+        name: 步骤名称
+        func: 无参数的协程函数
+        after: 依赖的步骤名称，这些步骤全部完成后才开始
+        exclusive: 是否需要操作页面(点击、键盘输入)。同一个页面上的 exclusive 步骤依次执行，
+            避免两个步骤同时抢焦点；只等待页面状态的步骤(例如等待视频传输完成)设为 False
+    """
+
+    def __init__(self, name: str, func: Callable[[], Awaitable], after: Sequence[str] = (), exclusive: bool = True):
+        self.name = name
+        self.func = func
+        self.after = tuple(after)
+        self.exclusive = exclusive
+
+
+class StepPipeline(object):
+    """
+    按声明的依赖并发执行上传步骤：视频传输的同时填写标题、话题、定时等表单，只有发布需要等传输完成。
+
+    用法::
+
+        pipeline = StepPipeline("douyin")
+        pipeline.add("transfer", wait_upload_done, exclusive=False)
+        pipeline.add("title", fill_title)
+        pipeline.add("publish", click_publish, after=("transfer", "title"))
+        await pipeline.run()
+
+    任意一个步骤失败时取消其余步骤并抛出该异常。
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.steps: Dict[str, UploadStep] = {}
+        # exclusive 步骤共用的页面输入锁，非 exclusive 步骤里需要临时操作页面时也可以获取它
+        self.input_lock = asyncio.Lock()
+        self.durations: Dict[str, float] = {}
+
+    def add(self, name: str, func: Callable[[], Awaitable], after: Sequence[str] = (),
+            exclusive: bool = True) -> "StepPipeline":
+        if name in self.steps:
+            raise ValueError(f"步骤 {name} 重复")
+        self.steps[name] = UploadStep(name, func, after, exclusive)
+        return self
+
+    def _ordered(self):
+        """按依赖排序，依赖不存在或存在环时抛出 ValueError"""
+        ordered, visiting, visited = [], set(), set()
+
+        def visit(step: UploadStep):
+            if step.name in visited:
+                return
+            if step.name in visiting:
+                raise ValueError(f"步骤 {step.name} 存在循环依赖")
+            visiting.add(step.name)
+            for dep in step.after:
+                if dep not in self.steps:
+                    raise ValueError(f"步骤 {step.name} 依赖的 {dep} 不存在")
+                visit(self.steps[dep])
+            visiting.discard(step.name)
+            visited.add(step.name)
+            ordered.append(step)
+
+        for step in self.steps.values():
+            visit(step)
+        return ordered
+
+    async def _run_step(self, step: UploadStep, tasks: Dict[str, asyncio.Task]):
+        if step.after:
+            await asyncio.gather(*(tasks[dep] for dep in step.after))
+        started = time.monotonic()
+        if step.exclusive:
+            async with self.input_lock:
+                await step.func()
+        else:
+            await step.func()
+        self.durations[step.name] = time.monotonic() - started
+
+    async def run(self) -> Dict[str, float]:
+        """执行所有步骤，返回 {步骤名: 耗时(秒)}"""
+        started = time.monotonic()
+        tasks: Dict[str, asyncio.Task] = {}
+        for step in self._ordered():
+            tasks[step.name] = asyncio.ensure_future(self._run_step(step, tasks))
+        try:
+            done, pending = await asyncio.wait(tasks.values(), return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if task.exception() is not None:
+                    raise task.exception()
+        finally:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+        timings = ", ".join(f"{name} {seconds:.1f}s" for name, seconds in self.durations.items())
+        logger.info(f"[pipeline] {self.name} 用时 {time.monotonic() - started:.1f}s: {timings}")
+        return self.durations